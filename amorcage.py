@@ -0,0 +1,87 @@
+import os
+import shutil
+import sys
+import time
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+
+from dettes import reconstruire as reconstruire_dettes
+from fixtures.cagnottes_fixtures import cagnottes
+from fixtures.contrats_fixtures import contrats
+from fixtures.copains_fixtures import copains
+from fixtures.liens_fixtures import liens
+from fixtures.parties_fixtures import parties
+from fixtures.reunions_fixtures import reunions
+from migrations import migrer, version_schema
+from models import Default
+from scores import reconstruire
+
+
+def copier_modele(chemin_base: str, chemin_modele: str) -> bool:
+    if not chemin_modele or not os.path.exists(chemin_modele):
+        return False
+    if os.path.exists(chemin_base) and os.path.getsize(chemin_base) > 0:
+        return False
+    shutil.copyfile(chemin_modele, chemin_base)
+    return True
+
+
+def creer_schema(engine: Engine):
+    SQLModel.metadata.create_all(engine)
+    migrer(engine)
+
+
+def semer(engine: Engine) -> bool:
+    with Session(engine) as session:
+        if session.get(Default, 1):
+            return False
+        # Copies : les fixtures restent détachées et peuvent semer une autre
+        # base du même processus (une par club).
+        session.add_all(
+            type(ligne)(**ligne.dict())
+            for ligne in copains + contrats + cagnottes + reunions + liens + parties
+        )
+        session.add(Default(id=1, reunion_id=3))
+        session.flush()
+        reconstruire(session)
+        reconstruire_dettes(session)
+        session.commit()
+        return True
+
+
+def amorcer(engine: Engine, chemin_base: str, chemin_modele: str = None):
+    etapes = {}
+    debut = time.perf_counter()
+    modele_copie = copier_modele(chemin_base, chemin_modele)
+    etapes["modele"] = time.perf_counter() - debut
+
+    with engine.connect() as connection:
+        version_initiale = version_schema(connection)
+    creer_schema(engine)
+    etapes["schema"] = time.perf_counter() - debut - etapes["modele"]
+
+    donnees_semees = semer(engine)
+    etapes["semis"] = time.perf_counter() - debut - etapes["modele"] - etapes["schema"]
+    with engine.connect() as connection:
+        version = version_schema(connection)
+    return {
+        "duree": time.perf_counter() - debut,
+        "etapes": etapes,
+        "modele_copie": modele_copie,
+        "donnees_semees": donnees_semees,
+        "version_schema_initiale": version_initiale,
+        "version_schema": version,
+    }
+
+
+if __name__ == "__main__":
+    from moteurs import creer_moteur
+
+    chemin = sys.argv[1] if len(sys.argv) > 1 else "modele.db"
+    if os.path.exists(chemin):
+        sys.exit(f"{chemin} existe déjà")
+    engine = creer_moteur(f"sqlite:///{chemin}")
+    rapport = amorcer(engine, chemin)
+    engine.dispose()
+    print(f"Modèle {chemin} créé en {rapport['duree']:.3f} s")
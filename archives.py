@@ -0,0 +1,316 @@
+import json
+import mmap
+import os
+import struct
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import Boolean, Integer, delete, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from models import Joueur, Partie, Reunion, ScoreReunion
+from statistiques import colonnes
+
+# Fichier d'archive : SIGNATURE, taille de l'entête (uint64 petit-boutiste),
+# entête JSON, puis les colonnes alignées sur ALIGNEMENT octets. L'entête
+# donne pour chaque colonne son type et la position [début, taille] de ses
+# blocs, comptée depuis la première colonne. Un texte occupe deux blocs
+# (positions int64 et octets UTF-8), une colonne nullable un bloc de nuls.
+SIGNATURE = b"CAGNOTTE"
+VERSION = 1
+ALIGNEMENT = 64
+EXTENSION = ".colonnes"
+
+# Tables déplacées, dans l'ordre de réinsertion, avec leur tri dans le
+# fichier. La première clé est la réunion : une réunion est une tranche.
+TABLES = (
+    (Reunion, ("id",)),
+    (Joueur, ("reunion_id", "copain_id")),
+    (Partie, ("reunion_id", "id")),
+    (ScoreReunion, ("reunion_id", "copain_id")),
+)
+
+
+def aligner(position: int) -> int:
+    return -(-position // ALIGNEMENT) * ALIGNEMENT
+
+
+def type_colonne(colonne) -> str:
+    if isinstance(colonne.type, Boolean):
+        return "|b1"
+    if isinstance(colonne.type, Integer):
+        return "<i8"
+    return "texte"
+
+
+def extraire(session: Session, cagnotte_id: int) -> Dict[str, list]:
+    reunions = select(Reunion.id).where(Reunion.cagnotte_id == cagnotte_id)
+    donnees = {}
+    for modele, tri in TABLES:
+        table = modele.__table__
+        filtre = (
+            table.c.cagnotte_id == cagnotte_id
+            if modele is Reunion
+            else table.c.reunion_id.in_(reunions)
+        )
+        donnees[table.name] = session.execute(
+            select(table).where(filtre).order_by(*(table.c[cle] for cle in tri))
+        ).all()
+    return donnees
+
+
+def ecrire(chemin: str, cagnotte_id: int, donnees: Dict[str, list]):
+    blocs, position = [], 0
+
+    def ajouter(octets: bytes) -> list:
+        nonlocal position
+        position = aligner(position)
+        blocs.append((position, octets))
+        position += len(octets)
+        return [blocs[-1][0], len(octets)]
+
+    tables = {}
+    for modele, _ in TABLES:
+        table = modele.__table__
+        lignes = donnees[table.name]
+        descriptions = {}
+        for indice, colonne in enumerate(table.columns):
+            valeurs = [ligne[indice] for ligne in lignes]
+            description = {"type": type_colonne(colonne)}
+            if colonne.nullable:
+                nuls = np.array([v is None for v in valeurs], dtype="|b1")
+                description["nuls"] = ajouter(nuls.tobytes())
+                valeurs = [0 if v is None else v for v in valeurs]
+            if description["type"] == "texte":
+                octets = [valeur.encode() for valeur in valeurs]
+                positions = np.cumsum([0] + [len(o) for o in octets], dtype="<i8")
+                description["positions"] = ajouter(positions.tobytes())
+                description["donnees"] = ajouter(b"".join(octets))
+            else:
+                tableau = np.array(valeurs, dtype=description["type"])
+                description["donnees"] = ajouter(tableau.tobytes())
+            descriptions[colonne.name] = description
+        tables[table.name] = {"lignes": len(lignes), "colonnes": descriptions}
+
+    entete = json.dumps(
+        {"version": VERSION, "cagnotte_id": cagnotte_id, "tables": tables}
+    ).encode()
+    debut = aligner(len(SIGNATURE) + 8 + len(entete))
+    provisoire = f"{chemin}.tmp"
+    with open(provisoire, "wb") as fichier:
+        fichier.write(SIGNATURE + struct.pack("<Q", len(entete)) + entete)
+        for decalage, octets in blocs:
+            fichier.seek(debut + decalage)
+            fichier.write(octets)
+        fichier.truncate(debut + position)
+        fichier.flush()
+        os.fsync(fichier.fileno())
+    os.chmod(provisoire, 0o444)
+    os.replace(provisoire, chemin)
+
+
+class Archive:
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        with open(chemin, "rb") as fichier:
+            self.inode = os.fstat(fichier.fileno()).st_ino
+            self._carte = mmap.mmap(fichier.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._carte[: len(SIGNATURE)] != SIGNATURE:
+            raise ValueError(f"{chemin} n'est pas une archive de cagnotte")
+        (taille,) = struct.unpack_from("<Q", self._carte, len(SIGNATURE))
+        debut = len(SIGNATURE) + 8
+        self.entete = json.loads(self._carte[debut : debut + taille])
+        if self.entete["version"] != VERSION:
+            raise ValueError(f"{chemin} : version {self.entete['version']} inconnue")
+        self.cagnotte_id = self.entete["cagnotte_id"]
+        self._debut = aligner(debut + taille)
+        self._colonnes = {}
+
+    def bloc(self, position: list, type_: str) -> np.ndarray:
+        debut, taille = position
+        if not taille:
+            return np.empty(0, dtype=type_)
+        return np.frombuffer(
+            self._carte,
+            dtype=type_,
+            count=taille // np.dtype(type_).itemsize,
+            offset=self._debut + debut,
+        )
+
+    def colonne(self, table: str, nom: str) -> np.ndarray:
+        cle = (table, nom)
+        if cle not in self._colonnes:
+            description = self.entete["tables"][table]["colonnes"][nom]
+            type_ = "u1" if description["type"] == "texte" else description["type"]
+            self._colonnes[cle] = self.bloc(description["donnees"], type_)
+        return self._colonnes[cle]
+
+    def valeurs(self, table: str, nom: str, debut: int, fin: int) -> list:
+        description = self.entete["tables"][table]["colonnes"][nom]
+        if description["type"] == "texte":
+            positions = self.bloc(description["positions"], "<i8")
+            positions = positions[debut : fin + 1].tolist()
+            octets = self.colonne(table, nom)
+            valeurs = [
+                bytes(octets[a:b]).decode() for a, b in zip(positions, positions[1:])
+            ]
+        else:
+            valeurs = self.colonne(table, nom)[debut:fin].tolist()
+        if "nuls" in description:
+            nuls = self.bloc(description["nuls"], "|b1")[debut:fin].tolist()
+            valeurs = [None if nul else v for v, nul in zip(valeurs, nuls)]
+        return valeurs
+
+    def lignes(
+        self, table: str, champs: List[str], debut: int = 0, fin: Optional[int] = None
+    ) -> List[dict]:
+        if fin is None:
+            fin = self.entete["tables"][table]["lignes"]
+        colonnes = [self.valeurs(table, champ, debut, fin) for champ in champs]
+        return [dict(zip(champs, ligne)) for ligne in zip(*colonnes)]
+
+    # Colonnes du modèle présentes dans l'archive : une colonne ajoutée depuis
+    # son écriture y manque et garde sa valeur par défaut.
+    def champs(self, table) -> List[str]:
+        archivees = self.entete["tables"][table.name]["colonnes"]
+        return [c.name for c in table.columns if c.name in archivees]
+
+    def tranche(self, table: str, reunion_id: int):
+        cle = "id" if table == Reunion.__tablename__ else "reunion_id"
+        colonne = self.colonne(table, cle)
+        return (
+            int(np.searchsorted(colonne, reunion_id, side="left")),
+            int(np.searchsorted(colonne, reunion_id, side="right")),
+        )
+
+    def parties(self) -> Dict[str, np.ndarray]:
+        return {nom: self.colonne(Partie.__tablename__, nom) for nom in colonnes}
+
+
+# Archives froides du dossier, ouvertes une fois et partagées. Même interface
+# que Cache pour la coordination entre processus : un changement de cagnotte
+# ailleurs fait relire le dossier.
+class Archives:
+    def __init__(self, dossier: str):
+        self.dossier = dossier
+        self._archives = {}
+        self._reunions = {}
+        self._verrou = Lock()
+
+    def chemin(self, cagnotte_id: int) -> str:
+        return os.path.join(self.dossier, f"cagnotte_{cagnotte_id:05d}{EXTENSION}")
+
+    def charger(self):
+        ouvertes = {archive.chemin: archive for archive in self._archives.values()}
+        archives = {}
+        if os.path.isdir(self.dossier):
+            for nom in sorted(os.listdir(self.dossier)):
+                if not (nom.startswith("cagnotte_") and nom.endswith(EXTENSION)):
+                    continue
+                chemin = os.path.join(self.dossier, nom)
+                archive = ouvertes.get(chemin)
+                if archive is None or archive.inode != os.stat(chemin).st_ino:
+                    archive = Archive(chemin)
+                archives[archive.cagnotte_id] = archive
+        reunions = {
+            reunion_id: archive
+            for archive in archives.values()
+            for reunion_id in archive.colonne(Reunion.__tablename__, "id").tolist()
+        }
+        with self._verrou:
+            self._archives, self._reunions = archives, reunions
+
+    def archive(self, cagnotte_id: int) -> Optional[Archive]:
+        return self._archives.get(cagnotte_id)
+
+    def toutes(self) -> List[Archive]:
+        return list(self._archives.values())
+
+    def archive_reunion(self, reunion_id: int) -> Optional[Archive]:
+        return self._reunions.get(reunion_id)
+
+    def archiver(self, session: Session, cagnotte_id: int):
+        os.makedirs(self.dossier, exist_ok=True)
+        chemin = self.chemin(cagnotte_id)
+        ecrire(chemin, cagnotte_id, extraire(session, cagnotte_id))
+        try:
+            reunions = select(Reunion.id).where(Reunion.cagnotte_id == cagnotte_id)
+            for modele, _ in reversed(TABLES):
+                table = modele.__table__
+                session.execute(
+                    delete(table).where(
+                        table.c.cagnotte_id == cagnotte_id
+                        if modele is Reunion
+                        else table.c.reunion_id.in_(reunions)
+                    )
+                )
+            session.commit()
+        except Exception:
+            os.remove(chemin)
+            raise
+        finally:
+            self.charger()
+
+    # Les ids archivés restent réservés (AUTOINCREMENT) : une ligne déjà en
+    # base sous le même id est un conflit, pas une ligne à remplacer.
+    def restaurer(self, session: Session, cagnotte_id: int):
+        archive = self.archive(cagnotte_id)
+        try:
+            for modele, _ in TABLES:
+                table = modele.__table__
+                lignes = archive.lignes(table.name, archive.champs(table))
+                if lignes:
+                    session.execute(insert(table), lignes)
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            raise HTTPException(
+                status_code=409, detail="L'archive recouvre des lignes de la base"
+            )
+        os.remove(archive.chemin)
+        self.charger()
+
+    # Une archive écrite avant le passage en AUTOINCREMENT a libéré des ids
+    # que sqlite_sequence ne connaît pas : ils sont réservés au démarrage.
+    def reserver(self, session: Session):
+        for modele in (Reunion, Partie):
+            nom = modele.__tablename__
+            plus_grand = max(
+                (
+                    int(ids.max())
+                    for ids in (
+                        archive.colonne(nom, "id")
+                        for archive in self._archives.values()
+                    )
+                    if len(ids)
+                ),
+                default=0,
+            )
+            if not plus_grand:
+                continue
+            parametres = {"nom": nom, "seq": plus_grand}
+            session.execute(
+                text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT :nom, :seq "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :nom)"
+                ),
+                parametres,
+            )
+            session.execute(
+                text(
+                    "UPDATE sqlite_sequence SET seq = :seq "
+                    "WHERE name = :nom AND seq < :seq"
+                ),
+                parametres,
+            )
+        session.commit()
+
+    def invalider(self, entite: str):
+        if entite == "cagnottes":
+            self.charger()
+
+    def vider(self):
+        self.charger()
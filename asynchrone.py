@@ -0,0 +1,673 @@
+import asyncio
+from functools import partial
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.sql.expression import SelectOfScalar
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from main import (
+    archives,
+    cache,
+    classements,
+    ecritures,
+    instantanes,
+    mesures,
+    projections,
+    simulateur,
+    versions,
+    construire_joueurs,
+    construire_reunion_active,
+    inserer_joueur,
+    inserer_partie,
+    journaliser_parties,
+    modifier_joueur,
+    preparer_reunion,
+    publier_preparation,
+    lire_classement,
+    lire_scores_archives,
+    lire_dettes_copain,
+    modele_projection,
+    publier_dettes,
+    publier_joueurs,
+    publier_partie,
+    publier_reunion_active,
+    sqlite_file_name,
+    VERSIONS_ACTIVE,
+    VERSIONS_PROJECTIONS,
+    verifier_modifiable,
+    verifier_stockage_froid,
+    verifier_projection,
+    verifier_voisinage,
+    version_projection,
+)
+from clubs import club_courant
+from configuration import parametre
+from importation import importer
+from moteurs import creer_moteur_async
+from reponses import (
+    ReponseJSON,
+    compacter_reunion_active,
+    en_dict,
+    ligne_ndjson,
+    projection,
+)
+from pagination import (
+    ENTETE_SUIVANT,
+    TAILLE_FLUX,
+    TYPE_NDJSON,
+    lire_page,
+    lister_lignes,
+    ordonner,
+    reponse_page,
+    sonder_suivant,
+    verifier_limite,
+)
+from models import (
+    Copain,
+    Reunion,
+    Default,
+    Cagnotte,
+    Contrat,
+    CopainCreation,
+    CagnotteCreation,
+    ReunionCreation,
+    ReunionPreparation,
+    Partie,
+    PartieCreation,
+    JoueurAjout,
+    JoueurUpdate,
+    ScoreCagnotte,
+    ScoreReunion,
+    DettesCopain,
+    CopainLecture,
+    CagnotteLecture,
+    ContratLecture,
+    ReunionLecture,
+    PartieLecture,
+    ReunionActive,
+    ReunionActiveCompacte,
+    ScoreLecture,
+    PlaceClassement,
+    StatistiquesCagnotte,
+    ProjectionsCagnotte,
+    Message,
+)
+from statistiques import resumer, statistiques
+
+async_engine = creer_moteur_async(f"sqlite+aiosqlite:///{sqlite_file_name}")
+if parametre("instrumentation", False):
+    mesures.ecouter(async_engine.sync_engine)
+reunion_router = APIRouter(tags=["Reunions"])
+partie_router = APIRouter(tags=["Parties"])
+cagnotte_router = APIRouter(tags=["Cagnottes"])
+copain_router = APIRouter(tags=["Copains"])
+contrat_router = APIRouter(tags=["Contrats"])
+
+
+async def fermer():
+    await async_engine.dispose()
+
+
+def moteur_async():
+    club = club_courant.get()
+    return async_engine if club is None else club.moteur_async
+
+
+def ouvrir_session():
+    return AsyncSession(moteur_async(), expire_on_commit=False)
+
+
+async def lister(
+    requete,
+    cles: List,
+    apres: Optional[str],
+    limite: Optional[int],
+    format: str,
+    descendant: bool = False,
+):
+    verifier_limite(limite)
+    requete = ordonner(requete, cles, apres, descendant)
+    if format == "ndjson":
+        async with ouvrir_session() as session:
+            suivant = await session.run_sync(sonder_suivant, requete, cles, limite)
+        if limite is not None:
+            requete = requete.limit(limite)
+        entetes = {ENTETE_SUIVANT: suivant} if suivant else {}
+        return StreamingResponse(
+            diffuser_ndjson(requete), media_type=TYPE_NDJSON, headers=entetes
+        )
+    async with ouvrir_session() as session:
+        lignes, suivant = await session.run_sync(lire_page, requete, cles, limite)
+    return reponse_page(lignes, suivant)
+
+
+async def diffuser_ndjson(requete):
+    async with ouvrir_session() as session:
+        resultat = await session.stream(
+            requete.execution_options(yield_per=TAILLE_FLUX)
+        )
+        if isinstance(requete, SelectOfScalar):
+            resultat = resultat.scalars()
+        async for ligne in resultat:
+            yield ligne_ndjson(en_dict(ligne))
+
+
+@reunion_router.get("/active/", response_model=ReunionActive)
+@versions.suivre(*VERSIONS_ACTIVE)
+async def reunion_active():
+    return ReponseJSON(await instantane_reunion_active())
+
+
+@reunion_router.get("/active/compact", response_model=ReunionActiveCompacte)
+@versions.suivre(*VERSIONS_ACTIVE)
+async def reunion_active_compacte():
+    return ReponseJSON(compacter_reunion_active(await instantane_reunion_active()))
+
+
+async def instantane_reunion_active():
+    if not parametre("instantanes_actifs", True):
+        return await calculer_reunion_active()
+    return await instantanes.lire_async(
+        "active", versions.etag(VERSIONS_ACTIVE), calculer_reunion_active
+    )
+
+
+async def calculer_reunion_active():
+    async with ouvrir_session() as session:
+        return await session.run_sync(construire_reunion_active)
+
+
+async def activer_reunion(session: AsyncSession, reunion_id: int):
+    default_db = await session.get(Default, 1)
+    if not default_db:
+        raise HTTPException(
+            status_code=404, detail="Pas de paramètres par défault définis."
+        )
+    reunion = await session.get(Reunion, reunion_id)
+    if not reunion:
+        raise HTTPException(status_code=404, detail="Réunion introuvable")
+    default_db.reunion_id = reunion_id
+    session.add(default_db)
+    versions.journaliser(session, "default")
+    await session.commit()
+    versions.incrementer("default")
+    await session.run_sync(publier_reunion_active)
+
+
+@reunion_router.post("/active/{reunion_id}", response_model=Message)
+async def definir_reunion_active(reunion_id: int):
+    async with ouvrir_session() as session:
+        await activer_reunion(session, reunion_id)
+        return {"message": "Réunion activée"}
+
+
+@reunion_router.get("/reunions/{cagnotte_id}", response_model=List[ReunionLecture])
+@versions.suivre(("reunions", "{cagnotte_id}"))
+async def liste_reunions(
+    cagnotte_id: int,
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    async with ouvrir_session() as session:
+        cagnotte = await session.get(Cagnotte, cagnotte_id)
+        if not cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    archive = archives.archive(cagnotte_id)
+    if archive is not None:
+        return lister_lignes(
+            archive.lignes(Reunion.__tablename__, list(ReunionLecture.__fields__)),
+            [Reunion.nom, Reunion.id],
+            apres,
+            limit,
+            format,
+            descendant=True,
+        )
+    return await lister(
+        projection(Reunion, ReunionLecture).where(Reunion.cagnotte_id == cagnotte_id),
+        [Reunion.nom, Reunion.id],
+        apres,
+        limit,
+        format,
+        descendant=True,
+    )
+
+
+@reunion_router.post("/reunions/{cagnotte_id}", response_model=Message)
+async def ajout_reunion(cagnotte_id: int, reunion: ReunionCreation):
+    verifier_modifiable(cagnotte_id)
+    async with ouvrir_session() as session:
+        cagnotte = await session.get(Cagnotte, cagnotte_id)
+        if not cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+        reunion_db = Reunion.from_orm(reunion)
+        reunion_db.cagnotte_id = cagnotte.id
+        session.add(reunion_db)
+        versions.journaliser(session, "reunions", cagnotte.id)
+        await session.commit()
+        versions.incrementer("reunions", cagnotte.id)
+
+        await activer_reunion(session, reunion_db.id)
+
+        return {"message": "Réunion créée"}
+
+
+@reunion_router.post("/reunions/{cagnotte_id}/setup", response_model=ReunionActive)
+async def preparation_reunion(cagnotte_id: int, preparation: ReunionPreparation):
+    async with ouvrir_session() as session:
+        payload = await session.run_sync(preparer_reunion, cagnotte_id, preparation)
+        await session.commit()
+    publier_preparation(cagnotte_id, payload)
+    return ReponseJSON(payload)
+
+
+async def ecrire(operation, *args):
+    if parametre("ecritures_groupees", False):
+        return await asyncio.wrap_future(ecritures.deposer(operation, *args))
+    async with ouvrir_session() as session:
+        resultat = await session.run_sync(operation, *args)
+        await session.commit()
+        return resultat
+
+
+@reunion_router.post("/reunions/{reunion_id}/joueurs/", response_model=Message)
+async def ajout_joueur(reunion_id: int, joueur: JoueurAjout):
+    await ecrire(inserer_joueur, reunion_id, joueur)
+    versions.incrementer("joueurs", reunion_id)
+    async with ouvrir_session() as session:
+        await session.run_sync(publier_joueurs, reunion_id)
+    return {"message": "Joueur ajouté"}
+
+
+@reunion_router.patch(
+    "/reunions/{reunion_id}/joueurs/{copain_id}", response_model=Message
+)
+async def mise_a_jour_joueur(reunion_id: int, copain_id: int, joueur: JoueurUpdate):
+    await ecrire(modifier_joueur, reunion_id, copain_id, joueur)
+    versions.incrementer("joueurs", reunion_id)
+    async with ouvrir_session() as session:
+        await session.run_sync(publier_dettes)
+    return {"message": "Joueur mis à jour"}
+
+
+@copain_router.get("/copains/", response_model=List[CopainLecture])
+@versions.suivre(("copains",))
+async def liste_copains(
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    if limit is None and apres is None and format == "json":
+        return await lire_copains()
+    return await lister(
+        projection(Copain, CopainLecture), [Copain.id], apres, limit, format
+    )
+
+
+@cache.memoriser("copains")
+async def lire_copains():
+    async with ouvrir_session() as session:
+        copains_db = await session.exec(
+            projection(Copain, CopainLecture).order_by(Copain.id)
+        )
+        return [en_dict(copain) for copain in copains_db.all()]
+
+
+@copain_router.get("/copains/{copain_id}/dettes", response_model=DettesCopain)
+@versions.suivre(("joueurs",))
+async def dettes_copain(copain_id: int):
+    async with ouvrir_session() as session:
+        return await session.run_sync(lire_dettes_copain, copain_id)
+
+
+@copain_router.post("/copains/", response_model=CopainLecture)
+async def creation_copain(copain: CopainCreation):
+    async with ouvrir_session() as session:
+        copain_db = Copain.from_orm(copain)
+        session.add(copain_db)
+        versions.journaliser(session, "copains")
+        await session.commit()
+        cache.invalider("copains")
+        versions.incrementer("copains")
+        await session.refresh(copain_db)
+        return copain_db
+
+
+@copain_router.patch("/copains/{copain_id}", response_model=Message)
+async def mise_a_jour_copain(copain_id: int, copain: CopainCreation):
+    async with ouvrir_session() as session:
+        db_copain = await session.get(Copain, copain_id)
+        if not db_copain:
+            raise HTTPException(status_code=404, detail="Copain introuvable")
+        copain_data = copain.dict(exclude_unset=True)
+        for key, value in copain_data.items():
+            setattr(db_copain, key, value)
+        session.add(db_copain)
+        versions.journaliser(session, "copains")
+        await session.commit()
+        cache.invalider("copains")
+        versions.incrementer("copains")
+        return {"message": "Copain mis à jour"}
+
+
+@cagnotte_router.get("/cagnottes/", response_model=List[CagnotteLecture])
+@versions.suivre(("cagnottes",))
+async def liste_cagnottes(
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    return await lister_cagnottes(True, limit, apres, format)
+
+
+@cagnotte_router.get("/cagnottes/archives/", response_model=List[CagnotteLecture])
+@versions.suivre(("cagnottes",))
+async def liste_cagnottes_archivees(
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    return await lister_cagnottes(False, limit, apres, format)
+
+
+async def lister_cagnottes(est_favori: bool, limit, apres, format):
+    if limit is None and apres is None and format == "json":
+        return await lire_cagnottes(est_favori)
+    return await lister(
+        projection(Cagnotte, CagnotteLecture).where(Cagnotte.est_favori == est_favori),
+        [Cagnotte.nom, Cagnotte.id],
+        apres,
+        limit,
+        format,
+        descendant=True,
+    )
+
+
+@cache.memoriser("cagnottes")
+async def lire_cagnottes(est_favori: bool):
+    async with ouvrir_session() as session:
+        cagnottes_db = await session.exec(
+            projection(Cagnotte, CagnotteLecture)
+            .where(Cagnotte.est_favori == est_favori)
+            .order_by(Cagnotte.nom.desc(), Cagnotte.id.desc())
+        )
+        return [en_dict(cagnotte) for cagnotte in cagnottes_db.all()]
+
+
+@cagnotte_router.post("/cagnottes/", response_model=CagnotteLecture)
+async def creation_cagnotte(cagnotte: CagnotteCreation):
+    async with ouvrir_session() as session:
+        cagnotte_db = Cagnotte.from_orm(cagnotte)
+        session.add(cagnotte_db)
+        versions.journaliser(session, "cagnottes")
+        await session.commit()
+        cache.invalider("cagnottes")
+        versions.incrementer("cagnottes")
+        await session.refresh(cagnotte_db)
+        return cagnotte_db
+
+
+@cagnotte_router.patch("/cagnottes/{cagnotte_id}", response_model=Message)
+async def mise_a_jour_cagnotte(cagnotte_id: int, cagnotte: CagnotteCreation):
+    async with ouvrir_session() as session:
+        db_cagnotte = await session.get(Cagnotte, cagnotte_id)
+        if not db_cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+        cagnotte_data = cagnotte.dict(exclude_unset=True)
+        for key, value in cagnotte_data.items():
+            setattr(db_cagnotte, key, value)
+        session.add(db_cagnotte)
+        versions.journaliser(session, "cagnottes")
+        await session.commit()
+        cache.invalider("cagnottes")
+        versions.incrementer("cagnottes")
+        return {"message": "Cagnotte mise à jour"}
+
+
+async def changer_favori(
+    cagnotte_id: int, est_favori: bool, stockage_froid: bool = False
+):
+    async with ouvrir_session() as session:
+        db_cagnotte = await session.get(Cagnotte, cagnotte_id)
+        if not db_cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+        db_cagnotte.est_favori = est_favori
+        session.add(db_cagnotte)
+        versions.journaliser(session, "cagnottes")
+        archive = archives.archive(cagnotte_id)
+        if stockage_froid and archive is None:
+            await session.run_sync(verifier_stockage_froid, cagnotte_id)
+            await session.run_sync(archives.archiver, cagnotte_id)
+        elif est_favori and archive is not None:
+            await session.run_sync(archives.restaurer, cagnotte_id)
+        else:
+            await session.commit()
+        cache.invalider("cagnottes")
+        versions.incrementer("cagnottes")
+
+
+@cagnotte_router.post("/cagnottes/{cagnotte_id}/archive", response_model=Message)
+async def archive_cagnotte(cagnotte_id: int, stockage_froid: bool = False):
+    await changer_favori(cagnotte_id, False, stockage_froid)
+    return {"message": "Cagnotte archivée"}
+
+
+@cagnotte_router.post("/cagnottes/{cagnotte_id}/active", response_model=Message)
+async def active_cagnotte(cagnotte_id: int):
+    await changer_favori(cagnotte_id, True)
+    return {"message": "Cagnotte activée"}
+
+
+@cagnotte_router.get(
+    "/cagnottes/{cagnotte_id}/stats", response_model=StatistiquesCagnotte
+)
+async def statistiques_cagnotte(cagnotte_id: int):
+    async with ouvrir_session() as session:
+        cagnotte = await session.get(Cagnotte, cagnotte_id)
+        if not cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    archive = archives.archive(cagnotte_id)
+    if archive is not None:
+        return resumer(archive.parties())
+    async with moteur_async().connect() as connection:
+        return await connection.run_sync(statistiques, cagnotte_id)
+
+
+@cagnotte_router.get(
+    "/cagnottes/{cagnotte_id}/projections", response_model=ProjectionsCagnotte
+)
+@versions.suivre(*VERSIONS_PROJECTIONS)
+async def projections_cagnotte(
+    cagnotte_id: int, reunions: int = 10, simulations: int = 20000, graine: int = 0
+):
+    verifier_projection(reunions, simulations, graine)
+    return await projections.lire_async(
+        cagnotte_id,
+        (version_projection(cagnotte_id), reunions, simulations, graine),
+        lambda: projeter(cagnotte_id, reunions, simulations, graine),
+    )
+
+
+async def projeter(cagnotte_id: int, reunions: int, simulations: int, graine: int):
+    async with ouvrir_session() as session:
+        if not await session.get(Cagnotte, cagnotte_id):
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    async with moteur_async().connect() as connection:
+        modele = await connection.run_sync(modele_projection, cagnotte_id)
+    return await simulateur.projeter(modele, reunions, simulations, graine)
+
+
+@contrat_router.get("/contrats/", response_model=List[ContratLecture])
+@versions.suivre(("contrats",))
+@cache.memoriser("contrats")
+async def liste_contrats():
+    async with ouvrir_session() as session:
+        contrats_db = await session.exec(projection(Contrat, ContratLecture))
+        return [en_dict(contrat) for contrat in contrats_db.all()]
+
+
+@partie_router.get("/parties/{reunion_id}", response_model=List[PartieLecture])
+@versions.suivre(("parties", "{reunion_id}"))
+async def liste_parties_par_reunion(
+    reunion_id: int,
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    archive = archives.archive_reunion(reunion_id)
+    if archive is not None:
+        return lister_lignes(
+            archive.lignes(
+                Partie.__tablename__,
+                list(PartieLecture.__fields__),
+                *archive.tranche(Partie.__tablename__, reunion_id),
+            ),
+            [Partie.id],
+            apres,
+            limit,
+            format,
+        )
+    return await lister(
+        projection(Partie, PartieLecture).where(Partie.reunion_id == reunion_id),
+        [Partie.id],
+        apres,
+        limit,
+        format,
+    )
+
+
+@partie_router.post("/parties/{reunion_id}", response_model=Message)
+async def ajout_partie(reunion_id: int, partie: PartieCreation):
+    partie_db, cagnotte_id, gains = await ecrire(inserer_partie, reunion_id, partie)
+    async with ouvrir_session() as session:
+        await session.run_sync(classements.actualiser, cagnotte_id, gains)
+        versions.incrementer("parties", reunion_id)
+        versions.incrementer("parties_cagnotte", cagnotte_id)
+        await session.run_sync(publier_partie, partie_db)
+    return {"message": "Partie ajoutée"}
+
+
+@partie_router.post("/parties/{reunion_id}/bulk")
+async def ajout_parties(reunion_id: int, parties: List[PartieCreation]):
+    async with ouvrir_session() as session:
+        reunion = await session.get(Reunion, reunion_id)
+        if not reunion:
+            raise HTTPException(status_code=404, detail="Réunion introuvable")
+    async with moteur_async().connect() as connection:
+        rapport = await connection.run_sync(
+            importer,
+            enumerate(parties),
+            reunion_id,
+            journal=partial(journaliser_parties, reunion),
+        )
+    if rapport["importees"]:
+        versions.incrementer("parties", reunion_id)
+        versions.incrementer("parties_cagnotte", reunion.cagnotte_id)
+        async with ouvrir_session() as session:
+            await session.run_sync(classements.actualiser, reunion.cagnotte_id)
+            await session.run_sync(publier_reunion_active)
+    return rapport
+
+
+async def lire_scores(modele, colonne, valeur: int):
+    async with ouvrir_session() as session:
+        scores_db = await session.exec(
+            select(
+                modele.copain_id,
+                Copain.nom.label("copain_nom"),
+                modele.total,
+                modele.nombre_parties,
+            )
+            .join(Copain)
+            .where(colonne == valeur)
+            .order_by(modele.total.desc(), Copain.nom)
+        )
+        return [en_dict(score) for score in scores_db.all()]
+
+
+@partie_router.get("/reunions/{reunion_id}/scores", response_model=List[ScoreLecture])
+@versions.suivre(("parties", "{reunion_id}"), ("copains",))
+async def scores_reunion(reunion_id: int):
+    archive = archives.archive_reunion(reunion_id)
+    async with ouvrir_session() as session:
+        if archive is not None:
+            return await session.run_sync(lire_scores_archives, archive, reunion_id)
+        reunion = await session.get(Reunion, reunion_id)
+        if not reunion:
+            raise HTTPException(status_code=404, detail="Réunion introuvable")
+    return await lire_scores(ScoreReunion, ScoreReunion.reunion_id, reunion_id)
+
+
+@partie_router.get("/cagnottes/{cagnotte_id}/scores", response_model=List[ScoreLecture])
+@versions.suivre(("parties",), ("copains",))
+async def scores_cagnotte(cagnotte_id: int):
+    async with ouvrir_session() as session:
+        cagnotte = await session.get(Cagnotte, cagnotte_id)
+        if not cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    return await lire_scores(ScoreCagnotte, ScoreCagnotte.cagnotte_id, cagnotte_id)
+
+
+@partie_router.get(
+    "/cagnottes/{cagnotte_id}/classement", response_model=List[PlaceClassement]
+)
+@versions.suivre(("parties",), ("copains",))
+async def classement_cagnotte(cagnotte_id: int, limit: int = 10):
+    verifier_limite(limit)
+    async with ouvrir_session() as session:
+        places = await session.run_sync(
+            lire_classement, cagnotte_id, lambda c: c.premiers(limit)
+        )
+    return ReponseJSON(places)
+
+
+@partie_router.get(
+    "/cagnottes/{cagnotte_id}/classement/voisins",
+    response_model=List[PlaceClassement],
+)
+@versions.suivre(("parties",), ("copains",))
+async def voisins_classement(cagnotte_id: int, rang: int, rayon: int = 2):
+    verifier_voisinage(rang, rayon)
+    async with ouvrir_session() as session:
+        places = await session.run_sync(
+            lire_classement, cagnotte_id, lambda c: c.voisins(rang, rayon)
+        )
+    return ReponseJSON(places)
+
+
+@partie_router.get(
+    "/cagnottes/{cagnotte_id}/classement/{copain_id}", response_model=PlaceClassement
+)
+@versions.suivre(("parties",), ("copains",))
+async def place_classement(cagnotte_id: int, copain_id: int):
+    async with ouvrir_session() as session:
+        places = await session.run_sync(
+            lire_classement, cagnotte_id, lambda c: c.place(copain_id)
+        )
+    if not places:
+        raise HTTPException(status_code=404, detail="Copain absent du classement")
+    return ReponseJSON(places[0])
+
+
+@partie_router.post(
+    "/cagnottes/{cagnotte_id}/classement/reconstruire", response_model=Message
+)
+async def reconstruction_classement(cagnotte_id: int):
+    async with ouvrir_session() as session:
+        cagnotte = await session.get(Cagnotte, cagnotte_id)
+        if not cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+        await session.run_sync(classements.reconstruire, cagnotte_id)
+    return {"message": "Classement reconstruit"}
+
+
+routers = [
+    copain_router,
+    cagnotte_router,
+    reunion_router,
+    partie_router,
+    contrat_router,
+]
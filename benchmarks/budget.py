@@ -0,0 +1,65 @@
+import gzip
+import json
+import os
+import sys
+import tempfile
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.generateur import generer
+from compression import encodages_disponibles
+from moteurs import creer_moteur
+
+# Taille maximale, en octets, de /active/compact compressé pour une réunion de
+# 200 parties à 10 joueurs : c'est ce que reçoit une tablette à chaque relève.
+BUDGET = 2000
+PARTIES = 200
+
+
+def taille(client: TestClient, url: str, encodage: str) -> int:
+    reponse = client.get(url, headers={"Accept-Encoding": encodage}, stream=True)
+    assert reponse.status_code == 200, reponse.text
+    assert reponse.headers.get("content-encoding", "identity") == encodage
+    return len(reponse.raw.read(decode_content=False))
+
+
+def lancer():
+    with tempfile.TemporaryDirectory() as dossier:
+        main.engine = creer_moteur(f"sqlite:///{os.path.join(dossier, 'budget.db')}")
+        generer(
+            main.engine,
+            reunions_par_cagnotte=20,
+            joueurs_par_reunion=10,
+            parties_par_reunion=PARTIES,
+            ratio_dettes=0.3,
+        )
+        encodages = ["identity", *encodages_disponibles(("gzip", "br"))]
+        tailles = {}
+        with TestClient(main.app) as client:
+            complet = client.get("/active/").json()
+            compact = client.get("/active/compact").json()
+            assert len(compact["parties"]["contrat"]) == complet["nombre_parties"]
+            assert compact["parties"]["points"] == [
+                partie["points"] for partie in complet["parties"]
+            ]
+            for url in ("/active/", "/active/compact"):
+                for encodage in encodages:
+                    tailles[url, encodage] = taille(client, url, encodage)
+                    print(f"{url:<16} {encodage:<9} {tailles[url, encodage]:>8} octets")
+        main.engine.dispose()
+
+    brut = json.dumps(compact, separators=(",", ":")).encode()
+    assert tailles["/active/compact", "gzip"] <= len(gzip.compress(brut)) * 1.1
+    meilleure = min(tailles["/active/compact", e] for e in encodages)
+    if meilleure > BUDGET:
+        print(
+            f"/active/compact : {meilleure} octets > budget {BUDGET}", file=sys.stderr
+        )
+        return 1
+    print(f"/active/compact : {meilleure} octets ≤ budget {BUDGET}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(lancer())
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from fastapi import FastAPI
+from sqlmodel import create_engine
+
+from benchmarks.serveur import servir
+
+CLIENTS = 200
+DUREE = 10
+PORT = 8765
+CHEMINS = ["/active/", "/parties/42", "/reunions/1", "/copains/"]
+
+
+def application(mode: str):
+    app = FastAPI()
+    if mode == "async":
+        from asynchrone import fermer, routers
+
+        app.add_event_handler("shutdown", fermer)
+    else:
+        import main
+
+        routers = main.routers
+    for router in routers:
+        app.include_router(router)
+    return app
+
+
+if "TDC_MODE_BASE" in os.environ:
+    app = application(os.environ["TDC_MODE_BASE"])
+
+
+async def client(numero: int, fin: float, latences: list):
+    lecteur, ecrivain = await asyncio.open_connection("127.0.0.1", PORT)
+    requete = 0
+    while time.perf_counter() < fin:
+        chemin = CHEMINS[(numero + requete) % len(CHEMINS)]
+        requete += 1
+        debut = time.perf_counter()
+        ecrivain.write(f"GET {chemin} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+        await ecrivain.drain()
+        entetes = await lecteur.readuntil(b"\r\n\r\n")
+        longueur = 0
+        for ligne in entetes.decode("latin-1").split("\r\n"):
+            if ligne.lower().startswith("content-length:"):
+                longueur = int(ligne.split(":")[1])
+        await lecteur.readexactly(longueur)
+        latences.append(time.perf_counter() - debut)
+    ecrivain.close()
+
+
+async def charger():
+    latences = []
+    fin = time.perf_counter() + DUREE
+    await asyncio.gather(*(client(i, fin, latences) for i in range(CLIENTS)))
+    return latences
+
+
+def lancer():
+    with tempfile.TemporaryDirectory() as dossier:
+        from benchmarks.generateur import generer
+
+        engine = create_engine(f"sqlite:///{os.path.join(dossier, 'database.db')}")
+        generer(engine, reunions_par_cagnotte=100)
+        engine.dispose()
+        for mode in ("sync", "async"):
+            with servir(
+                dossier,
+                PORT,
+                application="benchmarks.charge:app",
+                env={"TDC_MODE_BASE": mode},
+            ):
+                latences = sorted(asyncio.run(charger()))
+            p50 = statistics.median(latences) * 1000
+            p99 = latences[int(len(latences) * 0.99)] * 1000
+            print(
+                f"{mode:<6} {len(latences) / DUREE:>8.1f} req/s"
+                f"  p50 {p50:>8.1f} ms  p99 {p99:>8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    lancer()
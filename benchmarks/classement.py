@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+
+from sqlmodel import Session
+
+import main
+from benchmarks.generateur import generer
+from moteurs import creer_moteur
+from scores import calculer
+
+REPETITIONS = 200
+TAILLES = (50, 200, 800, 3200)
+
+
+def historique():
+    with Session(main.engine) as session:
+        _, par_cagnotte = calculer(session)
+    return sorted(
+        (-total, copain_id) for (_, copain_id), (total, _) in par_cagnotte.items()
+    )
+
+
+def mesurer(fonction, repetitions: int = REPETITIONS) -> float:
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        fonction()
+    return (time.perf_counter() - debut) / repetitions * 1000
+
+
+def lancer():
+    print(
+        f"{'réunions':>9} {'parties':>8} {'historique':>11}"
+        f" {'top 10':>8} {'rang':>8} {'voisins':>8}"
+    )
+    for reunions in TAILLES:
+        with tempfile.TemporaryDirectory() as dossier:
+            main.engine = creer_moteur(
+                f"sqlite:///{os.path.join(dossier, 'classement.db')}"
+            )
+            generer(main.engine, reunions_par_cagnotte=reunions)
+            with Session(main.engine) as session:
+                main.classements.reconstruire(session)
+            assert main.classement_cagnotte(1, 10).body != b"[]"
+            print(
+                f"{reunions:>9} {reunions * 20:>8}"
+                f" {mesurer(historique, 5):>8.2f} ms"
+                f" {mesurer(lambda: main.classement_cagnotte(1, 10)):>5.2f} ms"
+                f" {mesurer(lambda: main.place_classement(1, 1)):>5.2f} ms"
+                f" {mesurer(lambda: main.voisins_classement(1, 15, 2)):>5.2f} ms"
+            )
+            main.engine.dispose()
+
+
+if __name__ == "__main__":
+    lancer()
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import requests
+
+from benchmarks.serveur import servir
+
+PORT = 8768
+URL = f"http://127.0.0.1:{PORT}"
+PARTIES = 30
+CONFIG = (
+    "clubs_separes = True\n"
+    'clubs = ("nord", "sud", "ouest")\n'
+    "clubs_ouverts_max = 2\n"
+    "intervalle_coordination = 0.2\n"
+)
+# Réunion active voulue dans chaque club : la graine la met à 3 partout.
+ACTIVES = {"nord": 3, "sud": 2, "ouest": 1}
+
+
+def verifier(condition: bool, message: str, echecs: list):
+    print(f"{'OK ' if condition else 'KO '} {message}")
+    if not condition:
+        echecs.append(message)
+
+
+def jouer(club: str, avant: dict, constats: dict):
+    client = requests.Session()
+    client.headers["X-Club"] = club
+    vues = set()
+    partie = {
+        "contrat_id": 1,
+        "preneur_id": avant["joueurs"][0]["copain_id"],
+        "appel_id": avant["joueurs"][1]["copain_id"],
+        "est_fait": True,
+        "points": 10,
+        "chelem_realise": False,
+        "petit_au_bout": None,
+    }
+    statuts = set()
+    for _ in range(PARTIES):
+        statuts.add(
+            client.post(f"{URL}/parties/{avant['reunion_id']}", json=partie).status_code
+        )
+        vues.add(client.get(f"{URL}/active/").json()["reunion_id"])
+    constats[club] = {
+        "statuts": statuts,
+        "vues": vues,
+        "apres": client.get(f"{URL}/active/").json(),
+    }
+    client.close()
+
+
+def lancer():
+    echecs = []
+    with tempfile.TemporaryDirectory() as dossier:
+        with servir(dossier, PORT, config=CONFIG):
+            verifier(
+                requests.get(URL + "/active/").status_code == 400,
+                "requête sans club refusée",
+                echecs,
+            )
+            verifier(
+                requests.get(URL + "/active/", headers={"X-Club": "est"}).status_code
+                == 404,
+                "club inconnu refusé",
+                echecs,
+            )
+            verifier(
+                requests.get(URL + "/active/", params={"club": "../x"}).status_code
+                == 400,
+                "nom de club invalide refusé",
+                echecs,
+            )
+
+            nord = {"X-Club": "nord"}
+            etag = requests.get(URL + "/copains/", headers=nord).headers["etag"]
+            requests.post(
+                URL + "/copains/",
+                json={"nom": "Sudiste", "image": "base.jpg"},
+                headers={"X-Club": "sud"},
+            )
+            verifier(
+                requests.get(
+                    URL + "/copains/", headers={**nord, "If-None-Match": etag}
+                ).status_code
+                == 304,
+                "une écriture dans un club ne périme pas l'ETag de l'autre",
+                echecs,
+            )
+            verifier(
+                "Sudiste"
+                not in {
+                    c["nom"]
+                    for c in requests.get(URL + "/copains/", headers=nord).json()
+                },
+                "les copains d'un club restent dans son cache",
+                echecs,
+            )
+
+            for club, reunion_id in ACTIVES.items():
+                reponse = requests.post(
+                    f"{URL}/active/{reunion_id}", headers={"X-Club": club}
+                )
+                assert reponse.status_code == 200, reponse.text
+            avants = {
+                club: requests.get(URL + "/active/", headers={"X-Club": club}).json()
+                for club in ACTIVES
+            }
+            verifier(
+                all(avants[club]["reunion_id"] == ACTIVES[club] for club in ACTIVES),
+                "chaque club a sa réunion active",
+                echecs,
+            )
+
+            constats = {}
+            fils = [
+                threading.Thread(target=jouer, args=(club, avants[club], constats))
+                for club in ACTIVES
+            ]
+            for fil in fils:
+                fil.start()
+            for fil in fils:
+                fil.join()
+            for club in ACTIVES:
+                constat = constats[club]
+                verifier(
+                    constat["statuts"] == {200} and constat["vues"] == {ACTIVES[club]},
+                    f"{club} : {PARTIES} parties en parallèle, réunion active inchangée",
+                    echecs,
+                )
+                verifier(
+                    constat["apres"]["nombre_parties"]
+                    == avants[club]["nombre_parties"] + PARTIES,
+                    f"{club} : ne voit que ses propres parties",
+                    echecs,
+                )
+            etat = requests.get(URL + "/clubs/").json()
+            verifier(
+                etat["fermetures"] > 0 and len(etat["ouverts"]) <= etat["ouverts_max"],
+                f"clubs inactifs fermés ({etat['ouvertures']} ouvertures,"
+                f" {etat['fermetures']} fermetures)",
+                echecs,
+            )
+
+        verifier(
+            not os.path.exists(os.path.join(dossier, "database.db")),
+            "aucune base commune créée",
+            echecs,
+        )
+        for club, reunion_id in ACTIVES.items():
+            base = sqlite3.connect(os.path.join(dossier, "clubs", f"{club}.db"))
+            defauts = base.execute('SELECT reunion_id FROM "default"').fetchall()
+            base.close()
+            verifier(
+                defauts == [(reunion_id,)],
+                f"{club}.db : une seule ligne default, réunion {reunion_id}",
+                echecs,
+            )
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(lancer())
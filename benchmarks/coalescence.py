@@ -0,0 +1,182 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks.generateur import generer
+from benchmarks.serveur import servir
+from migrations import migrer
+from moteurs import creer_moteur
+
+PORT = 8769
+URL = f"http://127.0.0.1:{PORT}"
+MODES = {
+    "sans": "instantanes_actifs = False\n",
+    "avec": "instantanes_actifs = True\n",
+}
+SQL_ACTIVE = 'tdc_requete_sql_sum{methode="GET",route="/active/"}'
+CALCULS = "tdc_instantanes_calculs_total"
+PARTAGES = "tdc_instantanes_partages_total"
+
+
+def preparer(dossier: str, options: argparse.Namespace) -> tuple:
+    chemin = os.path.join(dossier, "database.db")
+    engine = creer_moteur(f"sqlite:///{chemin}")
+    generer(
+        engine,
+        reunions_par_cagnotte=options.reunions,
+        parties_par_reunion=options.parties,
+    )
+    migrer(engine)
+    engine.dispose()
+    base = sqlite3.connect(chemin)
+    reunion_id = base.execute('SELECT reunion_id FROM "default"').fetchone()[0]
+    joueurs = [
+        ligne[0]
+        for ligne in base.execute(
+            "SELECT copain_id FROM joueur WHERE reunion_id = ? ORDER BY copain_id",
+            (reunion_id,),
+        )
+    ]
+    base.close()
+    return reunion_id, joueurs
+
+
+def compteurs() -> dict:
+    valeurs = {}
+    for ligne in requests.get(URL + "/metrics").text.splitlines():
+        if ligne.startswith((SQL_ACTIVE, CALCULS, PARTAGES)):
+            nom, valeur = ligne.rsplit(" ", 1)
+            valeurs[nom] = float(valeur)
+    return valeurs
+
+
+def lecteur(depart, arrivee, vagues: int, durees: list, vues: list, erreurs: list):
+    client = requests.Session()
+    for vague in range(vagues):
+        depart.wait()
+        debut = time.perf_counter()
+        try:
+            reponse = client.get(URL + "/active/")
+            durees.append(time.perf_counter() - debut)
+            vues.append((vague, reponse.json()["nombre_parties"]))
+        except (requests.RequestException, ValueError, KeyError):
+            erreurs.append("lecture")
+            vues.append((vague, None))
+        arrivee.wait()
+    client.close()
+
+
+def mesurer(mode: str, options: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as dossier:
+        reunion_id, joueurs = preparer(dossier, options)
+        config = (
+            f"instrumentation = True\nmode_base = {options.mode_base!r}\n" + MODES[mode]
+        )
+        durees, vues, erreurs, attendus = [], [], [], []
+        with servir(dossier, PORT, config=config):
+            client = requests.Session()
+            initial = client.get(URL + "/active/").json()["nombre_parties"]
+            avant = compteurs()
+            depart = threading.Barrier(options.lecteurs + 1)
+            arrivee = threading.Barrier(options.lecteurs + 1)
+            fils = [
+                threading.Thread(
+                    target=lecteur,
+                    args=(depart, arrivee, options.vagues, durees, vues, erreurs),
+                )
+                for _ in range(options.lecteurs)
+            ]
+            for fil in fils:
+                fil.start()
+            for indice in range(options.vagues):
+                # Chaque vague suit une écriture : l'instantané précédent est
+                # périmé et les lecteurs arrivent tous sur une vue à refaire.
+                reponse = client.post(
+                    f"{URL}/parties/{reunion_id}",
+                    json={
+                        "contrat_id": 1,
+                        "preneur_id": joueurs[indice % len(joueurs)],
+                        "appel_id": joueurs[(indice + 1) % len(joueurs)],
+                        "est_fait": True,
+                        "points": 10,
+                        "chelem_realise": False,
+                        "petit_au_bout": None,
+                    },
+                )
+                assert reponse.status_code == 200, reponse.text
+                attendus.append(initial + indice + 1)
+                depart.wait()
+                arrivee.wait()
+            for fil in fils:
+                fil.join()
+            apres = compteurs()
+            client.close()
+
+    durees.sort()
+    sql = apres.get(SQL_ACTIVE, 0) - avant.get(SQL_ACTIVE, 0)
+    return {
+        "sql": sql / options.vagues,
+        "sql_lecture": sql / (options.vagues * options.lecteurs),
+        "calculs": (apres.get(CALCULS, 0) - avant.get(CALCULS, 0)) / options.vagues,
+        "partages": (apres.get(PARTAGES, 0) - avant.get(PARTAGES, 0)) / options.vagues,
+        "p50": statistics.median(durees) * 1000,
+        "p99": durees[int(len(durees) * 0.99) - 1] * 1000,
+        "max": durees[-1] * 1000,
+        "erreurs": len(erreurs),
+        "perimees": sum(
+            vue is not None and vue != attendus[vague] for vague, vue in vues
+        ),
+    }
+
+
+def lancer(options: argparse.Namespace) -> int:
+    resultats = {mode: mesurer(mode, options) for mode in MODES}
+    print(
+        f"{options.vagues} vagues de {options.lecteurs} GET /active/ simultanés,"
+        f" chacune après un POST /parties/ ({options.parties} parties par réunion,"
+        f" mode_base = {options.mode_base})"
+    )
+    print(
+        f"{'instantanés':<12} {'SQL/vague':>10} {'SQL/GET':>8} {'calculs':>8}"
+        f" {'partagés':>9}"
+        f" {'p50':>10} {'p99':>10} {'max':>10} {'erreurs':>8} {'périmées':>9}"
+    )
+    echecs = []
+    for mode, resultat in resultats.items():
+        calculs = f"{resultat['calculs']:.1f}" if mode == "avec" else "-"
+        partages = f"{resultat['partages']:.1f}" if mode == "avec" else "-"
+        print(
+            f"{mode:<12} {resultat['sql']:>10.0f} {resultat['sql_lecture']:>8.2f}"
+            f" {calculs:>8} {partages:>9} {resultat['p50']:>7.1f} ms {resultat['p99']:>7.1f} ms"
+            f" {resultat['max']:>7.1f} ms {resultat['erreurs']:>8}"
+            f" {resultat['perimees']:>9}"
+        )
+        if resultat["erreurs"]:
+            echecs.append(f"{mode} : des lectures ont échoué")
+        if resultat["perimees"]:
+            echecs.append(f"{mode} : des lectures ont vu une réunion périmée")
+    if resultats["avec"]["sql"] >= resultats["sans"]["sql"]:
+        echecs.append("les instantanés n'ont pas réduit les requêtes SQL")
+    for echec in echecs:
+        print(f"ÉCHEC {echec}", file=sys.stderr)
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(
+        description="Mesure une ruée de lectures simultanées de GET /active/"
+        " juste après une écriture, avec et sans instantané partagé."
+    )
+    arguments.add_argument("--lecteurs", type=int, default=100)
+    arguments.add_argument("--vagues", type=int, default=10)
+    arguments.add_argument("--reunions", type=int, default=20, help="par cagnotte")
+    arguments.add_argument("--parties", type=int, default=200, help="par réunion")
+    arguments.add_argument("--mode-base", choices=("sync", "async"), default="sync")
+    sys.exit(lancer(arguments.parse_args()))
@@ -0,0 +1,173 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from sqlmodel import Session
+
+from benchmarks.generateur import generer
+from benchmarks.serveur import servir
+from migrations import migrer
+from moteurs import creer_moteur
+from scores import verifier
+
+PORT = 8767
+URL = f"http://127.0.0.1:{PORT}"
+MODES = {
+    "directes": "instrumentation = True\necritures_groupees = False\n",
+    "groupées": "instrumentation = True\necritures_groupees = True\n",
+}
+
+
+def preparer(dossier: str, options: argparse.Namespace) -> dict:
+    chemin = os.path.join(dossier, "database.db")
+    engine = creer_moteur(f"sqlite:///{chemin}")
+    generer(
+        engine,
+        reunions_par_cagnotte=options.ecrivains,
+        parties_par_reunion=2,
+        ratio_dettes=0.0,
+    )
+    migrer(engine)
+    engine.dispose()
+    base = sqlite3.connect(chemin)
+    joueurs = {}
+    for reunion_id, copain_id in base.execute(
+        "SELECT reunion_id, copain_id FROM joueur ORDER BY reunion_id, copain_id"
+    ):
+        joueurs.setdefault(reunion_id, []).append(copain_id)
+    base.close()
+    return joueurs
+
+
+def compteurs() -> dict:
+    valeurs = {}
+    for ligne in requests.get(URL + "/metrics").text.splitlines():
+        if ligne.startswith("tdc_ecritures"):
+            nom, valeur = ligne.split()
+            valeurs[nom] = float(valeur)
+    return valeurs
+
+
+def envoyer(client: requests.Session, methode: str, url: str, corps: dict) -> bool:
+    try:
+        return client.request(methode, url, json=corps).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def ecrivain(reunion_id: int, joueurs: list, nombre: int, durees: list, erreurs: list):
+    client = requests.Session()
+    for indice in range(nombre):
+        partie = {
+            "contrat_id": 1 + indice % 4,
+            "preneur_id": joueurs[indice % len(joueurs)],
+            "appel_id": joueurs[(indice + 1) % len(joueurs)],
+            "est_fait": indice % 3 != 0,
+            "points": 10 * (indice % 7),
+            "chelem_realise": False,
+            "petit_au_bout": None,
+        }
+        debut = time.perf_counter()
+        if envoyer(client, "POST", f"{URL}/parties/{reunion_id}", partie):
+            durees.append(time.perf_counter() - debut)
+        else:
+            erreurs.append("partie")
+        if indice % 10 == 9 and not envoyer(
+            client,
+            "PATCH",
+            f"{URL}/reunions/{reunion_id}/joueurs/{joueurs[0]}",
+            {"dette_active": False, "dette": indice},
+        ):
+            erreurs.append("joueur")
+    client.close()
+
+
+def mesurer(mode: str, options: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as dossier:
+        joueurs = preparer(dossier, options)
+        durees, erreurs = [], []
+        with servir(dossier, PORT, config=MODES[mode]):
+            fils = [
+                threading.Thread(
+                    target=ecrivain,
+                    args=(reunion_id, copains, options.parties, durees, erreurs),
+                )
+                for reunion_id, copains in sorted(joueurs.items())
+            ]
+            debut = time.perf_counter()
+            for fil in fils:
+                fil.start()
+            for fil in fils:
+                fil.join()
+            duree = time.perf_counter() - debut
+            ecritures = compteurs()
+
+        engine = creer_moteur(f"sqlite:///{os.path.join(dossier, 'database.db')}")
+        with Session(engine) as session:
+            ecarts = verifier(session)
+        engine.dispose()
+        base = sqlite3.connect(os.path.join(dossier, "database.db"))
+        parties = base.execute("SELECT count(*) FROM partie").fetchone()[0]
+        base.close()
+
+    durees.sort()
+    return {
+        "debit": len(durees) / duree,
+        "p50": statistics.median(durees) * 1000,
+        "p99": durees[int(len(durees) * 0.99) - 1] * 1000,
+        "erreurs": len(erreurs),
+        "ecarts": len(ecarts),
+        "parties": parties - 2 * len(joueurs),
+        "acceptees": len(durees),
+        "lot": ecritures.get("tdc_ecritures_total", 0)
+        / max(ecritures.get("tdc_ecritures_lots_total", 0), 1),
+    }
+
+
+def lancer(options: argparse.Namespace) -> int:
+    resultats = {mode: mesurer(mode, options) for mode in MODES}
+    print(
+        f"{options.ecrivains} écrivains × {options.parties} parties"
+        f" (+ 1 PATCH joueur toutes les 10)"
+    )
+    print(
+        f"{'écritures':<10} {'parties/s':>10} {'p50':>10} {'p99':>10}"
+        f" {'erreurs':>8} {'écarts':>7} {'lot moyen':>10}"
+    )
+    echecs = []
+    for mode, resultat in resultats.items():
+        lot = f"{resultat['lot']:.1f}" if resultat["lot"] else "-"
+        print(
+            f"{mode:<10} {resultat['debit']:>10.0f}"
+            f" {resultat['p50']:>7.1f} ms {resultat['p99']:>7.1f} ms"
+            f" {resultat['erreurs']:>8} {resultat['ecarts']:>7}"
+            f" {lot:>10}"
+        )
+        if resultat["parties"] != resultat["acceptees"]:
+            echecs.append(
+                f"{mode} : {resultat['parties']} parties enregistrées"
+                f" pour {resultat['acceptees']} acceptées"
+            )
+        if resultat["ecarts"]:
+            echecs.append(f"{mode} : registre des scores incohérent")
+    if resultats["groupées"]["erreurs"]:
+        echecs.append("des écritures groupées ont échoué")
+    for echec in echecs:
+        print(f"ÉCHEC {echec}", file=sys.stderr)
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(
+        description="Compare les écritures directes et groupées par un seul fil"
+        " écrivain sous des POST concurrents d'un uvicorn à un worker."
+    )
+    arguments.add_argument("--ecrivains", type=int, default=50)
+    arguments.add_argument("--parties", type=int, default=40, help="par écrivain")
+    sys.exit(lancer(arguments.parse_args()))
@@ -0,0 +1,138 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+from sqlmodel import Session, SQLModel
+
+from dettes import reconstruire as reconstruire_dettes
+from fixtures.contrats_fixtures import contrats
+from models import Cagnotte, Contrat, Copain, Default, Joueur, Partie, Reunion
+from scores import reconstruire
+
+
+def generer(
+    engine,
+    nombre_copains: int = 30,
+    nombre_cagnottes: int = 1,
+    reunions_par_cagnotte: int = 500,
+    joueurs_par_reunion: int = 6,
+    parties_par_reunion: int = 20,
+    ratio_dettes: float = 0.1,
+    ratio_invites: float = 0.0,
+    graine: int = 1,
+):
+    hasard = random.Random(graine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            [Contrat(nom=c.nom, initiale=c.initiale, points=c.points) for c in contrats]
+        )
+        session.add_all(
+            [
+                Copain(id=i, nom=f"Copain {i:03d}", image="base.jpg")
+                for i in range(1, nombre_copains + 1)
+            ]
+        )
+        session.add_all(
+            [
+                Cagnotte(
+                    id=i, nom=f"Cagnotte {i:03d}", est_favori=i == nombre_cagnottes
+                )
+                for i in range(1, nombre_cagnottes + 1)
+            ]
+        )
+        session.commit()
+
+        reunion_id = 0
+        for cagnotte_id in range(1, nombre_cagnottes + 1):
+            for _ in range(reunions_par_cagnotte):
+                reunion_id += 1
+                session.add(
+                    Reunion(
+                        id=reunion_id,
+                        nom=f"Réunion {reunion_id:05d}",
+                        cagnotte_id=cagnotte_id,
+                    )
+                )
+                presents = hasard.sample(
+                    range(1, nombre_copains + 1), joueurs_par_reunion
+                )
+                for copain_id in presents:
+                    dette_active = hasard.random() < ratio_dettes
+                    session.add(
+                        Joueur(
+                            reunion_id=reunion_id,
+                            copain_id=copain_id,
+                            est_guest=hasard.random() < ratio_invites,
+                            dette_active=dette_active,
+                            dette=hasard.randrange(10, 300, 10) if dette_active else 0,
+                        )
+                    )
+                for _ in range(parties_par_reunion):
+                    preneur_id, appel_id, petit_id = hasard.sample(presents, 3)
+                    session.add(
+                        Partie(
+                            reunion_id=reunion_id,
+                            contrat_id=hasard.randint(1, len(contrats)),
+                            preneur_id=preneur_id,
+                            appel_id=appel_id if len(presents) >= 5 else None,
+                            est_fait=hasard.random() < 0.6,
+                            points=hasard.randrange(0, 60, 10),
+                            chelem_realise=hasard.random() < 0.01,
+                            petit_au_bout=petit_id if hasard.random() < 0.1 else None,
+                        )
+                    )
+            session.commit()
+        session.add(Default(id=1, reunion_id=reunion_id))
+        session.commit()
+        reconstruire(session)
+        reconstruire_dettes(session)
+        session.commit()
+
+
+def ajouter_arguments(arguments: argparse.ArgumentParser):
+    arguments.add_argument("--copains", type=int, default=30)
+    arguments.add_argument("--cagnottes", type=int, default=1)
+    arguments.add_argument("--reunions", type=int, default=500, help="par cagnotte")
+    arguments.add_argument("--joueurs", type=int, default=6, help="par réunion")
+    arguments.add_argument("--parties", type=int, default=20, help="par réunion")
+    arguments.add_argument("--dettes", type=float, default=0.1)
+    arguments.add_argument("--invites", type=float, default=0.0)
+    arguments.add_argument("--graine", type=int, default=1)
+
+
+def generer_selon(engine, options: argparse.Namespace):
+    generer(
+        engine,
+        nombre_copains=options.copains,
+        nombre_cagnottes=options.cagnottes,
+        reunions_par_cagnotte=options.reunions,
+        joueurs_par_reunion=options.joueurs,
+        parties_par_reunion=options.parties,
+        ratio_dettes=options.dettes,
+        ratio_invites=options.invites,
+        graine=options.graine,
+    )
+
+
+if __name__ == "__main__":
+    from migrations import migrer
+    from moteurs import creer_moteur
+
+    arguments = argparse.ArgumentParser(
+        description="Crée une base SQLite synthétique et reproductible."
+    )
+    arguments.add_argument("chemin")
+    ajouter_arguments(arguments)
+    options = arguments.parse_args()
+    if os.path.exists(options.chemin):
+        sys.exit(f"{options.chemin} existe déjà")
+
+    debut = time.perf_counter()
+    engine = creer_moteur(f"sqlite:///{options.chemin}")
+    generer_selon(engine, options)
+    migrer(engine)
+    engine.dispose()
+    print(f"Base {options.chemin} générée en {time.perf_counter() - debut:.1f} s")
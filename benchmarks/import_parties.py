@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+import main
+from benchmarks.generateur import generer
+from importation import importer
+from models import PartieCreation
+from moteurs import creer_moteur
+
+BOUCLE = 2000
+
+
+def parties(nombre: int, nombre_reunions: int, graine: int = 1):
+    hasard = random.Random(graine)
+    for numero in range(1, nombre + 1):
+        preneur_id, appel_id = hasard.sample(range(1, 31), 2)
+        yield numero, {
+            "reunion_id": hasard.randint(1, nombre_reunions),
+            "contrat_id": hasard.randint(1, 6),
+            "preneur_id": preneur_id,
+            "appel_id": appel_id,
+            "est_fait": hasard.random() < 0.6,
+            "points": hasard.randrange(0, 60, 10),
+            "chelem_realise": False,
+            "petit_au_bout": None,
+        }
+
+
+def lancer(nombre: int):
+    with tempfile.TemporaryDirectory() as dossier:
+        main.engine = creer_moteur(f"sqlite:///{os.path.join(dossier, 'import.db')}")
+        generer(main.engine, reunions_par_cagnotte=100, parties_par_reunion=0)
+
+        debut = time.perf_counter()
+        for _, donnees in parties(BOUCLE, 100):
+            reunion_id = donnees.pop("reunion_id")
+            main.ajout_partie(reunion_id, PartieCreation(**donnees))
+        duree = time.perf_counter() - debut
+        print(f"ajout_partie {BOUCLE:>8} parties {BOUCLE / duree:>10.0f} parties/s")
+
+        debut = time.perf_counter()
+        with main.engine.connect() as connection:
+            rapport = importer(connection, parties(nombre, 100, graine=2))
+        duree = time.perf_counter() - debut
+        print(
+            f"importer     {rapport['importees']:>8} parties"
+            f" {rapport['importees'] / duree:>10.0f} parties/s"
+        )
+        main.engine.dispose()
+
+
+if __name__ == "__main__":
+    lancer(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import threading
+import time
+
+from sqlmodel import Session, create_engine
+
+import main
+from benchmarks.generateur import generer
+from models import Partie
+from moteurs import creer_moteur
+
+LECTEURS = 8
+DUREE = 10
+
+
+def ecrire(fin: float, compteurs: dict):
+    while time.perf_counter() < fin:
+        with Session(main.engine) as session:
+            session.add(
+                Partie(
+                    reunion_id=1,
+                    contrat_id=2,
+                    preneur_id=1,
+                    appel_id=2,
+                    est_fait=True,
+                    points=10,
+                    chelem_realise=False,
+                    petit_au_bout=None,
+                )
+            )
+            session.commit()
+        compteurs["ecritures"] += 1
+
+
+def lire(fin: float, compteurs: dict, verrou: threading.Lock):
+    while time.perf_counter() < fin:
+        try:
+            main.calculer_reunion_active()
+            cle = "lectures"
+        except Exception:
+            cle = "erreurs"
+        with verrou:
+            compteurs[cle] += 1
+
+
+def mesurer(nom: str, fabrique, dossier: str):
+    url = f"sqlite:///{os.path.join(dossier, nom + '.db')}"
+    main.engine = fabrique(url)
+    generer(main.engine, reunions_par_cagnotte=200, parties_par_reunion=50)
+    compteurs = {"lectures": 0, "ecritures": 0, "erreurs": 0}
+    verrou = threading.Lock()
+    fin = time.perf_counter() + DUREE
+    fils = [threading.Thread(target=ecrire, args=(fin, compteurs))] + [
+        threading.Thread(target=lire, args=(fin, compteurs, verrou))
+        for _ in range(LECTEURS)
+    ]
+    for fil in fils:
+        fil.start()
+    for fil in fils:
+        fil.join()
+    main.engine.dispose()
+    print(
+        f"{nom:<8} lectures {compteurs['lectures'] / DUREE:>8.1f}/s"
+        f"  écritures {compteurs['ecritures'] / DUREE:>8.1f}/s"
+        f"  erreurs {compteurs['erreurs']}"
+    )
+
+
+def lancer():
+    with tempfile.TemporaryDirectory() as dossier:
+        mesurer("defaut", create_engine, dossier)
+        mesurer("optimise", creer_moteur, dossier)
+
+
+if __name__ == "__main__":
+    lancer()
@@ -0,0 +1,279 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.generateur import generer
+from benchmarks.serveur import servir
+from migrations import migrer
+from models import Contrat, Partie
+from moteurs import creer_moteur
+from projections import simuler_lot
+from scores import repartition
+
+PORT = 8770
+URL = f"http://127.0.0.1:{PORT}"
+
+
+def verifier(condition: bool, message: str, echecs: list):
+    print(f"{'OK ' if condition else 'KO '} {message}")
+    if not condition:
+        echecs.append(message)
+
+
+def preparer(chemin: str, options: argparse.Namespace) -> dict:
+    engine = creer_moteur(f"sqlite:///{chemin}")
+    generer(
+        engine,
+        nombre_cagnottes=2,
+        reunions_par_cagnotte=options.reunions,
+        parties_par_reunion=options.parties,
+    )
+    migrer(engine)
+    engine.dispose()
+    base = sqlite3.connect(chemin)
+    reunions = {}
+    for cagnotte_id in (1, 2):
+        reunion_id = base.execute(
+            "SELECT max(id) FROM reunion WHERE cagnotte_id = ?", (cagnotte_id,)
+        ).fetchone()[0]
+        joueurs = [
+            ligne[0]
+            for ligne in base.execute(
+                "SELECT copain_id FROM joueur WHERE reunion_id = ? ORDER BY copain_id",
+                (reunion_id,),
+            )
+        ]
+        reunions[cagnotte_id] = (reunion_id, joueurs)
+    base.close()
+    return reunions
+
+
+def projeter(url: str, **parametres):
+    debut = time.perf_counter()
+    reponse = requests.get(url, params=parametres)
+    return reponse, time.perf_counter() - debut
+
+
+def ajouter_partie(reunion_id: int, joueurs: list):
+    reponse = requests.post(
+        f"{URL}/parties/{reunion_id}",
+        json={
+            "contrat_id": 2,
+            "preneur_id": joueurs[0],
+            "appel_id": joueurs[1],
+            "est_fait": True,
+            "points": 20,
+            "chelem_realise": False,
+            "petit_au_bout": None,
+        },
+    )
+    assert reponse.status_code == 200, reponse.text
+
+
+def sonder(arret: threading.Event, durees: list):
+    client = requests.Session()
+    while not arret.is_set():
+        debut = time.perf_counter()
+        client.get(URL + "/copains/", headers={"If-None-Match": "aucun"})
+        durees.append(time.perf_counter() - debut)
+        time.sleep(0.01)
+    client.close()
+
+
+def verifier_serveur(reunions: dict, options: argparse.Namespace, echecs: list):
+    url = f"{URL}/cagnottes/1/projections"
+    simulations = {"simulations": options.simulations, "reunions": 10}
+
+    # Pendant une projection froide, les autres requêtes restent servies.
+    arret, durees = threading.Event(), []
+    sonde = threading.Thread(target=sonder, args=(arret, durees))
+    sonde.start()
+    reponse, froide = projeter(url, **simulations)
+    arret.set()
+    sonde.join()
+    premiere = reponse.json()
+    verifier(reponse.status_code == 200, f"projection froide en {froide:.2f} s", echecs)
+    durees.sort()
+    verifier(
+        len(durees) > 5 and durees[-1] < froide / 2,
+        f"{len(durees)} GET /copains/ pendant le calcul, p50"
+        f" {statistics.median(durees) * 1000:.1f} ms, max {durees[-1] * 1000:.1f} ms",
+        echecs,
+    )
+
+    reponse, chaude = projeter(url, **simulations)
+    verifier(
+        reponse.json() == premiere and chaude < froide / 10,
+        f"projection en cache en {chaude * 1000:.1f} ms, résultat identique",
+        echecs,
+    )
+    etag = reponse.headers["etag"]
+    verifier(
+        requests.get(
+            url, params=simulations, headers={"If-None-Match": etag}
+        ).status_code
+        == 304,
+        "ETag de la projection honoré",
+        echecs,
+    )
+    ajouter_partie(*reunions[2])
+    reponse, apres_autre = projeter(url, **simulations)
+    verifier(
+        reponse.headers["etag"] == etag and apres_autre < froide / 10,
+        "une partie dans une autre cagnotte garde la projection",
+        echecs,
+    )
+    ajouter_partie(*reunions[1])
+    reponse, apres = projeter(url, **simulations)
+    verifier(
+        reponse.headers["etag"] != etag and apres > froide / 4,
+        f"une partie dans la cagnotte relance le calcul ({apres:.2f} s)",
+        echecs,
+    )
+
+    # Requêtes identiques simultanées : un seul calcul.
+    graine = {**simulations, "graine": 7}
+    fils, resultats = [], []
+    debut = time.perf_counter()
+    for _ in range(5):
+        fil = threading.Thread(
+            target=lambda: resultats.append(projeter(url, **graine)[0].json())
+        )
+        fil.start()
+        fils.append(fil)
+    for fil in fils:
+        fil.join()
+    ensemble = time.perf_counter() - debut
+    verifier(
+        all(r == resultats[0] for r in resultats) and ensemble < 2 * apres,
+        f"5 projections simultanées en {ensemble:.2f} s, un seul calcul",
+        echecs,
+    )
+    verifier(
+        requests.get(url, params={"simulations": 0}).status_code == 422
+        and requests.get(f"{URL}/cagnottes/99/projections").status_code == 404,
+        "paramètres et cagnotte vérifiés",
+        echecs,
+    )
+    return premiere
+
+
+def convergence(echecs: list):
+    print(f"{'simulations':>12} {'durée':>8} {'demi-largeur max':>17} {'favori':>20}")
+    largeurs = []
+    for simulations in (2500, 10000, 40000):
+        reponse, duree = projeter(
+            f"{URL}/cagnottes/1/projections", simulations=simulations, reunions=10
+        )
+        resultat = reponse.json()
+        favori = resultat["copains"][0]
+        largeurs.append(resultat["demi_largeur_max"])
+        print(
+            f"{simulations:>12} {duree:>6.2f} s {resultat['demi_largeur_max']:>17.4f}"
+            f" {favori['copain_nom']:>10} {favori['probabilite_premier']:>8.1%}"
+        )
+    verifier(
+        largeurs[2] < largeurs[1] < largeurs[0],
+        "l'intervalle se resserre avec le nombre de simulations",
+        echecs,
+    )
+
+
+# Modèle sans hasard sur le jeu : tout le monde est là, le copain 1 prend
+# toujours, appelle dès qu'il le peut et réussit. Les totaux simulés doivent
+# suivre scores.repartition, appelé compris ou non selon la table.
+def repartition_simulee(echecs: list):
+    contrat = Contrat(id=1, nom="Garde", points=50)
+    for table in (4, 5):
+        ids = np.arange(1, table + 1)
+        modele = {
+            "ids": ids,
+            "totaux": np.zeros(table, dtype=np.int64),
+            "presence": np.ones(table),
+            "parties_par_reunion": 3,
+            "taux_prise": np.array([1.0] + [0.0] * (table - 1)),
+            "contrats_cumules": np.ones((table, 1)),
+            "reussite": np.ones((table, 1)),
+            "valeur_contrat": np.array([contrat.points]),
+            "taux_chelem": np.zeros(1),
+            "taux_appel": 1.0,
+            "points": np.array([10]),
+            "debuts": np.zeros(1, dtype=np.int64),
+            "comptes": np.ones(1),
+        }
+        _, sommes = simuler_lot(modele, 1, 100, 2)
+        gains = repartition(
+            Partie(
+                contrat_id=1,
+                preneur_id=1,
+                appel_id=2 if table >= 5 else None,
+                est_fait=True,
+                points=10,
+                chelem_realise=False,
+            ),
+            contrat,
+            ids.tolist(),
+        )
+        # L'appelé change d'une simulation à l'autre : seuls la part du
+        # preneur et le total de ses adversaires sont fixés.
+        attendu = np.array([gains[1], sum(gains.values()) - gains[1]]) * 100 * 2 * 3
+        verifier(
+            np.array_equal([sommes[0], sommes[1:].sum()], attendu),
+            f"totaux projetés à {table} conformes à scores.repartition",
+            echecs,
+        )
+
+
+def lancer(options: argparse.Namespace) -> int:
+    echecs = []
+    resultats = {}
+    repartition_simulee(echecs)
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "database.db")
+        reunions = preparer(chemin, options)
+        modele = os.path.join(dossier, "modele.db")
+        os.replace(chemin, modele)
+        for mode_base in ("sync", "async"):
+            for processus in (1, 2):
+                print(f"mode_base = {mode_base}, projections_processus = {processus}")
+                with open(modele, "rb") as source, open(chemin, "wb") as copie:
+                    copie.write(source.read())
+                with servir(
+                    dossier,
+                    PORT,
+                    config=f"mode_base = {mode_base!r}\n"
+                    f"projections_processus = {processus}\n",
+                ):
+                    resultats[(mode_base, processus)] = verifier_serveur(
+                        reunions, options, echecs
+                    )
+                    if (mode_base, processus) == ("sync", 2):
+                        convergence(echecs)
+    verifier(
+        all(r == resultats[("sync", 1)] for r in resultats.values()),
+        "même graine, même projection quel que soit le pool ou le mode",
+        echecs,
+    )
+    for echec in echecs:
+        print(f"ÉCHEC {echec}", file=sys.stderr)
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(
+        description="Vérifie GET /cagnottes/{id}/projections servi par uvicorn :"
+        " boucle libre pendant le calcul, cache par cagnotte, graines"
+        " déterministes et convergence des intervalles."
+    )
+    arguments.add_argument("--reunions", type=int, default=40, help="par cagnotte")
+    arguments.add_argument("--parties", type=int, default=20, help="par réunion")
+    arguments.add_argument("--simulations", type=int, default=20000)
+    sys.exit(lancer(arguments.parse_args()))
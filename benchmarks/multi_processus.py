@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import requests
+
+from benchmarks.serveur import servir
+
+WORKERS = 3
+PORT = 8766
+ESSAIS = 40
+URL = f"http://127.0.0.1:{PORT}"
+CONFIG = "multi_processus = True\nintervalle_coordination = 0.2\n"
+
+
+def obtenir(chemin: str, **entetes):
+    return requests.get(URL + chemin, headers={"Connection": "close", **entetes})
+
+
+def verifier(condition: bool, message: str, echecs: list):
+    print(f"{'OK ' if condition else 'KO '} {message}")
+    if not condition:
+        echecs.append(message)
+
+
+def lancer():
+    echecs = []
+    with tempfile.TemporaryDirectory() as dossier:
+        with servir(dossier, PORT, config=CONFIG, workers=WORKERS):
+            demarrages = {}
+            for _ in range(ESSAIS):
+                demarrage = obtenir("/demarrage/").json()
+                demarrages[demarrage["processus"]] = demarrage["donnees_semees"]
+            verifier(
+                len(demarrages) == WORKERS,
+                f"{len(demarrages)} worker(s) sur {WORKERS} ont démarré",
+                echecs,
+            )
+            verifier(
+                sum(demarrages.values()) <= 1,
+                "un seul worker a semé la base",
+                echecs,
+            )
+
+            etags = {obtenir("/copains/").headers["etag"] for _ in range(ESSAIS)}
+            reponse = requests.post(
+                URL + "/copains/", json={"nom": "Nouveau", "image": "base.jpg"}
+            )
+            verifier(reponse.status_code == 200, "copain créé", echecs)
+            reponses = [
+                obtenir("/copains/", **{"If-None-Match": ", ".join(etags)})
+                for _ in range(ESSAIS)
+            ]
+            verifier(
+                all(r.status_code == 200 for r in reponses),
+                "aucun worker ne répond 304 avec un ETag périmé",
+                echecs,
+            )
+            verifier(
+                all("Nouveau" in {c["nom"] for c in r.json()} for r in reponses),
+                "aucun worker ne sert la liste de copains en cache périmée",
+                echecs,
+            )
+
+            avant = obtenir("/active/").json()
+            partie = {
+                "contrat_id": 1,
+                "preneur_id": avant["joueurs"][0]["copain_id"],
+                "appel_id": avant["joueurs"][1]["copain_id"],
+                "est_fait": True,
+                "points": 10,
+                "chelem_realise": False,
+                "petit_au_bout": None,
+            }
+            classement = (
+                f"/cagnottes/{avant['cagnotte_id']}/classement/{partie['preneur_id']}"
+            )
+            places = [obtenir(classement) for _ in range(ESSAIS)]
+            parties_preneur = max(
+                r.json()["nombre_parties"] if r.status_code == 200 else 0
+                for r in places
+            )
+            requests.post(URL + f"/parties/{avant['reunion_id']}", json=partie)
+            verifier(
+                all(
+                    obtenir("/active/").json()["nombre_parties"]
+                    == avant["nombre_parties"] + 1
+                    for _ in range(ESSAIS)
+                ),
+                "tous les workers voient la nouvelle partie",
+                echecs,
+            )
+            verifier(
+                all(
+                    obtenir(classement).json()["nombre_parties"] == parties_preneur + 1
+                    for _ in range(ESSAIS)
+                ),
+                "tous les workers voient le classement à jour",
+                echecs,
+            )
+
+        base = sqlite3.connect(os.path.join(dossier, "database.db"))
+        defauts = base.execute('SELECT count(*) FROM "default"').fetchone()[0]
+        copains = base.execute("SELECT count(*) FROM copain").fetchone()[0]
+        base.close()
+        verifier(defauts == 1, "une seule ligne default", echecs)
+        verifier(copains == 6, "fixtures semées une seule fois", echecs)
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(lancer())
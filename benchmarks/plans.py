@@ -0,0 +1,55 @@
+import os
+import re
+import tempfile
+
+from sqlalchemy import event
+from sqlmodel import create_engine
+
+import main
+from pagination import encoder
+from benchmarks.generateur import generer
+
+# Un « SCAN table » sans index signifie un parcours complet de la table.
+parcours_complet = re.compile(r"^SCAN \w+$")
+
+
+def lancer():
+    with tempfile.TemporaryDirectory() as dossier:
+        main.engine = create_engine(
+            f"sqlite:///{os.path.join(dossier, 'plans.db')}", echo=False
+        )
+        generer(main.engine, reunions_par_cagnotte=50)
+        main.create_db_and_tables()
+        requetes = []
+
+        @event.listens_for(main.engine, "before_cursor_execute")
+        def capturer(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT") and "WHERE" in statement.split():
+                requetes.append((statement, parameters))
+
+        main.calculer_reunion_active()
+        main.liste_reunions(1)
+        main.liste_parties_par_reunion(1)
+        main.liste_cagnottes()
+        main.liste_cagnottes_archivees()
+        main.liste_reunions(1, limit=10, apres=encoder(["Réunion 00020", 20]))
+        main.liste_parties_par_reunion(1, limit=10, apres=encoder([5]))
+        event.remove(main.engine, "before_cursor_execute", capturer)
+
+        echecs = 0
+        with main.engine.connect() as connection:
+            for statement, parameters in requetes:
+                plan = connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                ).all()
+                details = [ligne[-1] for ligne in plan]
+                sans_index = [d for d in details if parcours_complet.match(d)]
+                echecs += bool(sans_index)
+                print("KO" if sans_index else "OK", " | ".join(details))
+        main.engine.dispose()
+        assert requetes, "aucune requête capturée"
+        assert not echecs, f"{echecs} requête(s) sans index"
+
+
+if __name__ == "__main__":
+    lancer()
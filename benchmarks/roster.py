@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+from operator import itemgetter
+
+from sqlalchemy import event
+from sqlmodel import Session, create_engine, select
+
+import main
+from benchmarks.generateur import generer
+from models import Copain, Joueur, Reunion
+
+REPETITIONS = 20
+
+
+def joueurs_par_reunion_avant(reunion_id: int):
+    with Session(main.engine) as session:
+        joueurs = session.exec(
+            select(Joueur).where(Joueur.reunion_id == reunion_id)
+        ).all()
+        if not joueurs:
+            return []
+        joueur_db = []
+        nombre_joueurs = 0
+        for joueur in joueurs:
+            copain = session.get(Copain, joueur.copain_id)
+            nombre_joueurs += 1
+            dettes = session.exec(
+                select(Joueur)
+                .where(Joueur.dette_active)
+                .where(Joueur.copain_id == joueur.copain_id)
+            )
+            dettes_result = []
+            for dette in dettes:
+                reunion = session.get(Reunion, dette.reunion_id)
+                reunion_db = {
+                    "reunion_id": reunion.id,
+                    "nom": reunion.nom,
+                    "dette": dette.dette,
+                }
+                if reunion.id != reunion_id:
+                    dettes_result.append(reunion_db)
+            joueur_db.append(
+                {
+                    "copain_id": joueur.copain_id,
+                    "copain_nom": copain.nom,
+                    "copain_image": copain.image,
+                    "est_guest": joueur.est_guest,
+                    "dette": joueur.dette,
+                    "dette_active": joueur.dette_active,
+                    "dettes": dettes_result,
+                }
+            )
+            joueurs_tries = sorted(joueur_db, key=itemgetter("copain_nom"))
+        return {"nombre_joueurs": nombre_joueurs, "joueurs": joueurs_tries}
+
+
+def mesurer(nom, fonction, reunion_id, compteur):
+    compteur["requetes"] = 0
+    debut = time.perf_counter()
+    for _ in range(REPETITIONS):
+        resultat = fonction(reunion_id)
+    duree = (time.perf_counter() - debut) / REPETITIONS
+    requetes = compteur["requetes"] // REPETITIONS
+    print(f"{nom:<8} {requetes:>6} requêtes {duree * 1000:>10.2f} ms")
+    return resultat
+
+
+def lancer():
+    with tempfile.TemporaryDirectory() as dossier:
+        main.engine = create_engine(
+            f"sqlite:///{os.path.join(dossier, 'roster.db')}", echo=False
+        )
+        generer(main.engine, reunions_par_cagnotte=500, ratio_dettes=0.2)
+        compteur = {"requetes": 0}
+
+        @event.listens_for(main.engine, "before_cursor_execute")
+        def compter(*args):
+            compteur["requetes"] += 1
+
+        avant = mesurer("avant", joueurs_par_reunion_avant, 500, compteur)
+        apres = mesurer("après", main.joueurs_par_reunion, 500, compteur)
+        assert avant == apres
+        main.engine.dispose()
+
+
+if __name__ == "__main__":
+    lancer()
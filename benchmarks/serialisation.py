@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlmodel import Session, create_engine, select
+
+import main
+from benchmarks.generateur import generer
+from models import Cagnotte, Default, Partie, Reunion
+
+REPETITIONS = 200
+REUNION = 50
+
+
+def reunion_active_avant():
+    with Session(main.engine) as session:
+        default = session.get(Default, 1)
+        reunion_db = session.get(Reunion, default.reunion_id)
+        cagnotte = session.get(Cagnotte, reunion_db.cagnotte_id)
+        informations = main.construire_joueurs(session, reunion_db.id)
+        parties_db = session.exec(
+            select(Partie).where(Partie.reunion_id == reunion_db.id)
+        ).all()
+        parties_result = [
+            main.decrire_partie(partie, rang)
+            for rang, partie in enumerate(parties_db, start=1)
+        ]
+        payload = {
+            "reunion_id": reunion_db.id,
+            "reunion_nom": reunion_db.nom,
+            "cagnotte_id": cagnotte.id,
+            "cagnotte_nom": cagnotte.nom,
+            "nombre_joueurs": informations["nombre_joueurs"],
+            "joueurs": informations["joueurs"],
+            "nombre_parties": len(parties_result),
+            "parties": parties_result,
+        }
+    return JSONResponse(jsonable_encoder(payload))
+
+
+def reunion_active_apres():
+    return main.ReponseJSON(main.calculer_reunion_active())
+
+
+def parties_avant():
+    with Session(main.engine) as session:
+        parties_db = session.exec(
+            select(Partie).where(Partie.reunion_id == REUNION).order_by(Partie.id)
+        ).all()
+    return JSONResponse(jsonable_encoder(parties_db))
+
+
+def parties_apres():
+    return main.liste_parties_par_reunion(REUNION)
+
+
+def mesurer(nom, fonction):
+    debut = time.perf_counter()
+    for _ in range(REPETITIONS):
+        reponse = fonction()
+    duree = (time.perf_counter() - debut) / REPETITIONS
+    print(f"{nom:<16} {duree * 1000:>8.3f} ms {len(reponse.body):>8} octets")
+    return json.loads(reponse.body)
+
+
+def lancer():
+    with tempfile.TemporaryDirectory() as dossier:
+        main.engine = create_engine(
+            f"sqlite:///{os.path.join(dossier, 'serialisation.db')}", echo=False
+        )
+        generer(
+            main.engine,
+            reunions_par_cagnotte=REUNION,
+            joueurs_par_reunion=10,
+            parties_par_reunion=200,
+        )
+        print(f"réponse : {main.ReponseJSON.__name__}")
+        avant = mesurer("/active/ avant", reunion_active_avant)
+        apres = mesurer("/active/ après", reunion_active_apres)
+        assert avant == apres
+        avant = mesurer("/parties/ avant", parties_avant)
+        apres = mesurer("/parties/ après", parties_apres)
+        assert avant == apres
+        main.engine.dispose()
+
+
+if __name__ == "__main__":
+    lancer()
@@ -0,0 +1,53 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Attend qu'uvicorn accepte les connexions sur le port (30 s au plus).
+def attendre_port(port: int):
+    for _ in range(300):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("le serveur ne répond pas")
+
+
+# Sert l'application avec uvicorn depuis le dossier (sa base et, si donné, son
+# config.py) le temps du bloc, puis arrête le serveur quoi qu'il arrive.
+@contextmanager
+def servir(
+    dossier: str,
+    port: int,
+    config: str = None,
+    application: str = "main:app",
+    workers: int = 1,
+    env: dict = None,
+):
+    if config is not None:
+        with open(os.path.join(dossier, "config.py"), "w") as fichier:
+            fichier.write(config)
+    serveur = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", application, "--port", str(port)]
+        + ["--workers", str(workers), "--log-level", "warning"],
+        cwd=dossier,
+        env={
+            **os.environ,
+            "PYTHONPATH": RACINE,
+            "PYTHONWARNINGS": "ignore",
+            **(env or {}),
+        },
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        attendre_port(port)
+        yield serveur
+    finally:
+        serveur.terminate()
+        serveur.wait()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from models import Partie, Reunion
+from statistiques import statistiques
+
+
+def remplir(engine, nombre_parties: int, graine: int = 1):
+    hasard = np.random.default_rng(graine)
+    SQLModel.metadata.create_all(engine)
+    nombre_reunions = max(nombre_parties // 20, 1)
+    preneur = hasard.integers(1, 31, nombre_parties)
+    appel = np.where(hasard.random(nombre_parties) < 0.8, (preneur % 30) + 1, 0)
+    petit = np.where(hasard.random(nombre_parties) < 0.1, preneur, 0)
+    lignes = zip(
+        (np.arange(nombre_parties) % nombre_reunions + 1).tolist(),
+        hasard.integers(1, 7, nombre_parties).tolist(),
+        preneur.tolist(),
+        [a or None for a in appel.tolist()],
+        (hasard.random(nombre_parties) < 0.6).tolist(),
+        hasard.integers(0, 6, nombre_parties).__mul__(10).tolist(),
+        (hasard.random(nombre_parties) < 0.01).tolist(),
+        [p or None for p in petit.tolist()],
+    )
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO cagnotte (id, nom, est_favori) VALUES (1, 'Bench', 1)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO reunion (id, nom, cagnotte_id) VALUES (?, ?, 1)",
+            [(i, f"R{i:06d}") for i in range(1, nombre_reunions + 1)],
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO partie (reunion_id, contrat_id, preneur_id, appel_id,"
+            " est_fait, points, chelem_realise, petit_au_bout)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            list(lignes),
+        )
+
+
+def statistiques_orm(engine, cagnotte_id: int):
+    contrats = defaultdict(lambda: [0, 0])
+    preneurs = defaultdict(list)
+    with Session(engine) as session:
+        parties = session.exec(
+            select(Partie).join(Reunion).where(Reunion.cagnotte_id == cagnotte_id)
+        )
+        for partie in parties:
+            contrats[partie.contrat_id][0] += 1
+            contrats[partie.contrat_id][1] += partie.est_fait
+            preneurs[partie.preneur_id].append(partie.points)
+    return contrats, {c: sum(p) / len(p) for c, p in preneurs.items()}
+
+
+def chronometrer(nom, fonction, *args):
+    debut = time.perf_counter()
+    fonction(*args)
+    print(f"{nom:<12} {time.perf_counter() - debut:>8.2f} s")
+
+
+def lancer(nombre_parties: int):
+    with tempfile.TemporaryDirectory() as dossier:
+        engine = create_engine(f"sqlite:///{os.path.join(dossier, 'stats.db')}")
+        remplir(engine, nombre_parties)
+        print(f"{nombre_parties} parties")
+        with engine.connect() as connection:
+            chronometrer("vectorisé", statistiques, connection, 1)
+        chronometrer("orm", statistiques_orm, engine, 1)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    lancer(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,180 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session
+
+import main
+import scores
+from benchmarks.generateur import generer
+from moteurs import creer_moteur
+
+TABLES = ("reunion", "joueur", "partie", "scorereunion", "scorecagnotte")
+REPETITIONS = 30
+
+
+def lire_tables(chemin: str) -> dict:
+    base = sqlite3.connect(chemin)
+    try:
+        return {
+            table: sorted(base.execute(f"SELECT * FROM {table}").fetchall())
+            for table in TABLES
+        }
+    finally:
+        base.close()
+
+
+def parcourir(client: TestClient, url: str, limite: int) -> list:
+    pages, curseur = [], None
+    while True:
+        parametres = {"limit": limite, **({"apres": curseur} if curseur else {})}
+        reponse = client.get(url, params=parametres)
+        pages.append(reponse.json())
+        curseur = reponse.headers.get("x-curseur-suivant")
+        if not curseur:
+            return pages
+
+
+def photographier(client: TestClient, cagnottes, reunions) -> dict:
+    photo = {}
+    for cagnotte_id in cagnottes:
+        url = f"/reunions/{cagnotte_id}"
+        photo[url] = client.get(url).json()
+        photo[url, "pages"] = parcourir(client, url, 7)
+        ndjson = client.get(url, params={"format": "ndjson", "limit": 50})
+        photo[url, "ndjson"] = (ndjson.text, ndjson.headers.get("x-curseur-suivant"))
+        for suffixe in ("stats", "scores", "classement"):
+            url = f"/cagnottes/{cagnotte_id}/{suffixe}"
+            photo[url] = client.get(url).json()
+    for reunion_id in reunions:
+        url = f"/parties/{reunion_id}"
+        photo[url] = client.get(url).json()
+        photo[url, "pages"] = parcourir(client, url, 3)
+        photo[url, "ndjson"] = client.get(url, params={"format": "ndjson"}).text
+        url = f"/reunions/{reunion_id}/scores"
+        photo[url] = client.get(url).json()
+    return photo
+
+
+def chronometrer(client: TestClient, reunion_active: int) -> dict:
+    requetes = {
+        "GET /active/": lambda: client.get("/active/"),
+        "GET /parties/{active}": lambda: client.get(f"/parties/{reunion_active}"),
+        "GET /reunions/4?limit=50": lambda: client.get("/reunions/4?limit=50"),
+        "GET /cagnottes/4/stats": lambda: client.get("/cagnottes/4/stats"),
+        "SQL parcours de partie": lambda: scanner(),
+    }
+    mesures = {}
+    for nom, requete in requetes.items():
+        durees = []
+        for _ in range(REPETITIONS):
+            debut = time.perf_counter()
+            requete()
+            durees.append(time.perf_counter() - debut)
+        mesures[nom] = statistics.median(durees) * 1000
+    return mesures
+
+
+def scanner():
+    with main.engine.connect() as connection:
+        return connection.execute(
+            text("SELECT count(*), sum(points) FROM partie WHERE est_fait")
+        ).one()
+
+
+def lancer(options: argparse.Namespace) -> int:
+    echecs = []
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, "froid.db")
+        main.engine = creer_moteur(f"sqlite:///{chemin}")
+        main.archives.dossier = os.path.join(dossier, "archives")
+        generer(
+            main.engine,
+            nombre_cagnottes=4,
+            reunions_par_cagnotte=options.reunions,
+            parties_par_reunion=options.parties,
+            ratio_dettes=0.0,
+        )
+        archivees = (1, 2, 3)
+        reunions = [1, options.reunions // 2, options.reunions * 2 + 1]
+        avant = lire_tables(chemin)
+
+        with TestClient(main.app) as client:
+            reunion_active = client.get("/active/").json()["reunion_id"]
+            photo = photographier(client, archivees, reunions)
+            chaud = chronometrer(client, reunion_active)
+
+            refus = client.post("/cagnottes/4/archive?stockage_froid=true")
+            if refus.status_code != 409:
+                echecs.append(f"réunion active archivée : {refus.status_code}")
+
+            debut = time.perf_counter()
+            for cagnotte_id in archivees:
+                reponse = client.post(
+                    f"/cagnottes/{cagnotte_id}/archive?stockage_froid=true"
+                )
+                assert reponse.status_code == 200, reponse.text
+            duree_archivage = time.perf_counter() - debut
+            restantes = lire_tables(chemin)
+            if len(restantes["partie"]) * 4 != len(avant["partie"]):
+                echecs.append("les parties archivées sont restées dans la base")
+            if client.post("/reunions/1", json={"nom": "Après"}).status_code != 409:
+                echecs.append("réunion ajoutée à une cagnotte archivée")
+
+            photo_froide = photographier(client, archivees, reunions)
+            for cle, valeur in photo.items():
+                if photo_froide[cle] != valeur:
+                    echecs.append(f"réponse différente depuis l'archive : {cle}")
+            froid = chronometrer(client, reunion_active)
+
+            # L'outil de réparation voit les parties archivées : ni écart, ni
+            # total de cagnotte effacé par une reconstruction.
+            with Session(main.engine) as session:
+                ecarts = scores.verifier(session, main.archives.toutes())
+                if ecarts:
+                    echecs.append(f"{len(ecarts)} écart(s) avec les archives")
+                scores.reconstruire(session, main.archives.toutes())
+                session.commit()
+            if lire_tables(chemin) != restantes:
+                echecs.append("scores modifiés par la reconstruction")
+
+            debut = time.perf_counter()
+            for cagnotte_id in archivees:
+                reponse = client.post(f"/cagnottes/{cagnotte_id}/active")
+                assert reponse.status_code == 200, reponse.text
+            duree_restauration = time.perf_counter() - debut
+            if photographier(client, archivees, reunions) != photo:
+                echecs.append("réponses différentes après restauration")
+        main.engine.dispose()
+
+        if lire_tables(chemin) != avant:
+            echecs.append("tables différentes après restauration")
+        if os.listdir(main.archives.dossier):
+            echecs.append("archives restantes après restauration")
+
+    print(f"{'requête chaude':<28} {'tout chaud':>11} {'3/4 archivé':>12}")
+    for nom in chaud:
+        print(f"{nom:<28} {chaud[nom]:>8.2f} ms {froid[nom]:>9.2f} ms")
+    print(f"archivage de 3 cagnottes : {duree_archivage:.2f} s")
+    print(f"restauration : {duree_restauration:.2f} s")
+    for echec in echecs:
+        print(f"ÉCHEC {echec}", file=sys.stderr)
+    if not echecs:
+        print(f"aller-retour fidèle : {len(photo)} réponses, {len(TABLES)} tables")
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(
+        description="Vérifie l'aller-retour des archives froides et mesure"
+        " les requêtes sur les tables chaudes avec et sans historique."
+    )
+    arguments.add_argument("--reunions", type=int, default=500, help="par cagnotte")
+    arguments.add_argument("--parties", type=int, default=20, help="par réunion")
+    sys.exit(lancer(arguments.parse_args()))
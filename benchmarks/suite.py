@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fastapi.routing import APIRoute, APIWebSocketRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+import main
+from benchmarks.generateur import ajouter_arguments, generer_selon
+from moteurs import creer_moteur
+from models import Default, Joueur, Reunion
+
+TOLERANCE = 0.25
+
+
+class Contexte:
+    def __init__(self, session: Session):
+        self.reunion_active = session.get(Default, 1).reunion_id
+        self.presents = session.exec(
+            select(Joueur.copain_id)
+            .where(Joueur.reunion_id == self.reunion_active)
+            .order_by(Joueur.copain_id)
+        ).all()
+        banc = Reunion(nom="Réunion banc d'essai", cagnotte_id=1)
+        session.add(banc)
+        session.commit()
+        self.reunion_banc = banc.id
+
+    def partie(self, numero: int):
+        preneur, appel = self.presents[numero % 2], self.presents[2]
+        return {
+            "contrat_id": 1 + numero % 4,
+            "preneur_id": preneur,
+            "appel_id": appel if len(self.presents) >= 5 else None,
+            "est_fait": numero % 3 != 0,
+            "points": 10 * (numero % 6),
+            "chelem_realise": False,
+            "petit_au_bout": None,
+        }
+
+
+# (méthode, chemin de la route, requête pour l'itération i). L'ordre compte :
+# les écritures passent après les lectures et la dernière remet la réunion
+# active en place.
+def scenarios(c: Contexte):
+    r, p = c.reunion_active, c.presents[0]
+    return [
+        ("GET", "/active/", lambda i: ("/active/", None)),
+        ("GET", "/active/compact", lambda i: ("/active/compact", None)),
+        ("GET", "/reunions/{cagnotte_id}", lambda i: ("/reunions/1", None)),
+        ("GET", "/parties/{reunion_id}", lambda i: (f"/parties/{r}", None)),
+        ("GET", "/copains/", lambda i: ("/copains/", None)),
+        (
+            "GET",
+            "/copains/{copain_id}/dettes",
+            lambda i: (f"/copains/{p}/dettes", None),
+        ),
+        ("GET", "/cagnottes/", lambda i: ("/cagnottes/", None)),
+        ("GET", "/cagnottes/archives/", lambda i: ("/cagnottes/archives/", None)),
+        (
+            "GET",
+            "/cagnottes/{cagnotte_id}/stats",
+            lambda i: ("/cagnottes/1/stats", None),
+        ),
+        (
+            "GET",
+            "/cagnottes/{cagnotte_id}/projections",
+            lambda i: (
+                f"/cagnottes/1/projections?reunions=5&simulations=2000&graine={i}",
+                None,
+            ),
+        ),
+        ("GET", "/contrats/", lambda i: ("/contrats/", None)),
+        (
+            "GET",
+            "/reunions/{reunion_id}/scores",
+            lambda i: (f"/reunions/{r}/scores", None),
+        ),
+        (
+            "GET",
+            "/cagnottes/{cagnotte_id}/scores",
+            lambda i: ("/cagnottes/1/scores", None),
+        ),
+        (
+            "GET",
+            "/cagnottes/{cagnotte_id}/classement",
+            lambda i: ("/cagnottes/1/classement", None),
+        ),
+        (
+            "GET",
+            "/cagnottes/{cagnotte_id}/classement/voisins",
+            lambda i: ("/cagnottes/1/classement/voisins?rang=3", None),
+        ),
+        (
+            "GET",
+            "/cagnottes/{cagnotte_id}/classement/{copain_id}",
+            lambda i: (f"/cagnottes/1/classement/{p}", None),
+        ),
+        ("GET", "/cache/", lambda i: ("/cache/", None)),
+        ("GET", "/demarrage/", lambda i: ("/demarrage/", None)),
+        ("GET", "/metrics", lambda i: ("/metrics", None)),
+        ("WS", "/active/direct", lambda i: ("/active/direct", None)),
+        (
+            "POST",
+            "/copains/",
+            lambda i: ("/copains/", {"nom": f"Banc {i:04d}", "image": "base.jpg"}),
+        ),
+        (
+            "PATCH",
+            "/copains/{copain_id}",
+            lambda i: (
+                f"/copains/{p}",
+                {"nom": f"Copain {p:03d}", "image": "base.jpg"},
+            ),
+        ),
+        (
+            "POST",
+            "/cagnottes/",
+            lambda i: ("/cagnottes/", {"nom": f"Banc {i:04d}", "est_favori": False}),
+        ),
+        (
+            "PATCH",
+            "/cagnottes/{cagnotte_id}",
+            lambda i: ("/cagnottes/1", {"nom": "Cagnotte 001", "est_favori": True}),
+        ),
+        (
+            "POST",
+            "/cagnottes/{cagnotte_id}/archive",
+            lambda i: ("/cagnottes/1/archive", None),
+        ),
+        (
+            "POST",
+            "/cagnottes/{cagnotte_id}/active",
+            lambda i: ("/cagnottes/1/active", None),
+        ),
+        (
+            "POST",
+            "/cagnottes/{cagnotte_id}/classement/reconstruire",
+            lambda i: ("/cagnottes/1/classement/reconstruire", None),
+        ),
+        (
+            "POST",
+            "/reunions/{reunion_id}/joueurs/",
+            lambda i: (
+                f"/reunions/{c.reunion_banc}/joueurs/",
+                {"copain_id": i + 1, "est_guest": False},
+            ),
+        ),
+        (
+            "PATCH",
+            "/reunions/{reunion_id}/joueurs/{copain_id}",
+            lambda i: (
+                f"/reunions/{r}/joueurs/{p}",
+                {"dette_active": i % 2 == 0, "dette": 10 * i},
+            ),
+        ),
+        ("POST", "/parties/{reunion_id}", lambda i: (f"/parties/{r}", c.partie(i))),
+        (
+            "POST",
+            "/parties/{reunion_id}/bulk",
+            lambda i: (
+                f"/parties/{r}/bulk",
+                [c.partie(i * 100 + n) for n in range(100)],
+            ),
+        ),
+        (
+            "POST",
+            "/reunions/{cagnotte_id}",
+            lambda i: ("/reunions/1", {"nom": f"Réunion banc {i:04d}"}),
+        ),
+        (
+            "POST",
+            "/reunions/{cagnotte_id}/setup",
+            lambda i: (
+                "/reunions/1/setup",
+                {
+                    "nom": f"Soirée banc {i:04d}",
+                    "joueurs": [
+                        {"copain_id": copain_id, "est_guest": False}
+                        for copain_id in c.presents
+                    ],
+                },
+            ),
+        ),
+        ("POST", "/active/{reunion_id}", lambda i: (f"/active/{r}", None)),
+    ]
+
+
+def appeler(client: TestClient, methode: str, url: str, corps):
+    if methode == "WS":
+        with client.websocket_connect(url) as websocket:
+            websocket.receive_json()
+        return
+    reponse = client.request(methode, url, json=corps)
+    if reponse.status_code >= 400:
+        raise RuntimeError(f"{methode} {url} : {reponse.status_code} {reponse.text}")
+
+
+def routes_montees(app):
+    montees = set()
+    for route in app.routes:
+        if isinstance(route, APIWebSocketRoute):
+            montees.add(("WS", route.path))
+        elif isinstance(route, APIRoute):
+            montees.update((methode, route.path) for methode in route.methods)
+    return montees
+
+
+def mesurer(client, compteur, methode, requete, repetitions: int):
+    durees, requetes = [], []
+    for i in range(repetitions):
+        url, corps = requete(i)
+        compteur["requetes"] = 0
+        debut = time.perf_counter()
+        appeler(client, methode, url, corps)
+        durees.append(time.perf_counter() - debut)
+        requetes.append(compteur["requetes"])
+
+    url, corps = requete(repetitions)
+    tracemalloc.start()
+    appeler(client, methode, url, corps)
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durees.sort()
+    return {
+        "mediane_ms": statistics.median(durees) * 1000,
+        "p95_ms": durees[int(0.95 * (len(durees) - 1))] * 1000,
+        "requetes_sql": max(requetes),
+        "pic_memoire_kio": pic / 1024,
+    }
+
+
+def comparer(resultats: dict, reference: dict, tolerance: float):
+    regressions = []
+    for nom, mesure in resultats.items():
+        ancienne = reference.get(nom)
+        if ancienne is None:
+            continue
+        if mesure["mediane_ms"] > ancienne["mediane_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{nom} : {ancienne['mediane_ms']:.2f} → {mesure['mediane_ms']:.2f} ms"
+            )
+        if mesure["requetes_sql"] > ancienne["requetes_sql"]:
+            regressions.append(
+                f"{nom} : {ancienne['requetes_sql']} → {mesure['requetes_sql']}"
+                " requêtes SQL"
+            )
+    return regressions
+
+
+def lancer(options: argparse.Namespace):
+    if options.repetitions >= options.copains:
+        sys.exit("--repetitions doit rester inférieur à --copains")
+    with tempfile.TemporaryDirectory() as dossier:
+        main.engine = creer_moteur(f"sqlite:///{os.path.join(dossier, 'suite.db')}")
+        generer_selon(main.engine, options)
+        main.create_db_and_tables()
+        with Session(main.engine) as session:
+            contexte = Contexte(session)
+        compteur = {"requetes": 0}
+
+        @event.listens_for(main.engine, "before_cursor_execute")
+        def compter(*args):
+            compteur["requetes"] += 1
+
+        resultats = {}
+        with TestClient(main.app) as client:
+            montees = routes_montees(main.app)
+            couvertes = set()
+            for methode, chemin, requete in scenarios(contexte):
+                if (methode, chemin) not in montees:
+                    continue
+                couvertes.add((methode, chemin))
+                nom = f"{methode} {chemin}"
+                resultats[nom] = mesurer(
+                    client, compteur, methode, requete, options.repetitions
+                )
+                mesure = resultats[nom]
+                print(
+                    f"{nom:<50} {mesure['mediane_ms']:>8.2f} ms"
+                    f" p95 {mesure['p95_ms']:>8.2f} ms"
+                    f" {mesure['requetes_sql']:>4} SQL"
+                    f" {mesure['pic_memoire_kio']:>9.1f} Kio"
+                )
+        main.engine.dispose()
+
+    manquantes = sorted(montees - couvertes)
+    for methode, chemin in manquantes:
+        print(f"route sans scénario : {methode} {chemin}", file=sys.stderr)
+    if options.sortie:
+        with open(options.sortie, "w", encoding="utf-8") as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+    regressions = []
+    if options.reference:
+        with open(options.reference, encoding="utf-8") as fichier:
+            regressions = comparer(resultats, json.load(fichier), options.tolerance)
+        for regression in regressions:
+            print(f"régression {regression}", file=sys.stderr)
+    return 1 if manquantes or regressions else 0
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(
+        description="Mesure chaque route de main.py sur une base synthétique."
+    )
+    ajouter_arguments(arguments)
+    arguments.add_argument("--repetitions", type=int, default=20)
+    arguments.add_argument("--sortie", help="enregistre les mesures en JSON")
+    arguments.add_argument("--reference", help="mesures JSON à ne pas dépasser")
+    arguments.add_argument("--tolerance", type=float, default=TOLERANCE)
+    arguments.set_defaults(reunions=100)
+    sys.exit(lancer(arguments.parse_args()))
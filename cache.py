@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from threading import Lock
+
+
+# Une génération par entité, avancée par invalider (et toutes par vider) :
+# un résultat calculé avant une invalidation n'est pas mis en cache après
+# elle, il servirait l'état d'avant l'écriture sous le nouvel ETag.
+class Cache:
+    def __init__(self, duree_vie: float = 300, taille_max: int = 128):
+        self.duree_vie = duree_vie
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._generations = defaultdict(int)
+        self._generation_globale = 0
+        self._verrou = Lock()
+        self.succes = 0
+        self.echecs = 0
+        self.evictions = 0
+
+    def lire(self, cle: tuple):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None or entree[0] < time.monotonic():
+                if entree is not None:
+                    del self._entrees[cle]
+                self.echecs += 1
+                return None
+            self._entrees.move_to_end(cle)
+            self.succes += 1
+            return entree[1]
+
+    def generation(self, entite: str) -> tuple:
+        with self._verrou:
+            return self._generation_globale, self._generations[entite]
+
+    def ecrire(self, cle: tuple, valeur, generation: tuple = None):
+        with self._verrou:
+            if generation is not None and generation != (
+                self._generation_globale,
+                self._generations[cle[0]],
+            ):
+                return
+            self._entrees[cle] = (time.monotonic() + self.duree_vie, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+                self.evictions += 1
+
+    def invalider(self, entite: str):
+        with self._verrou:
+            self._generations[entite] += 1
+            for cle in [cle for cle in self._entrees if cle[0] == entite]:
+                del self._entrees[cle]
+
+    def vider(self):
+        with self._verrou:
+            self._generation_globale += 1
+            self._entrees.clear()
+
+    def memoriser(self, *cle):
+        def decorateur(fonction):
+            if asyncio.iscoroutinefunction(fonction):
+
+                @wraps(fonction)
+                async def enveloppe_async(*args, **kwargs):
+                    cle_complete = cle + args + tuple(sorted(kwargs.items()))
+                    generation = self.generation(cle_complete[0])
+                    valeur = self.lire(cle_complete)
+                    if valeur is None:
+                        valeur = await fonction(*args, **kwargs)
+                        self.ecrire(cle_complete, valeur, generation)
+                    return valeur
+
+                return enveloppe_async
+
+            @wraps(fonction)
+            def enveloppe(*args, **kwargs):
+                cle_complete = cle + args + tuple(sorted(kwargs.items()))
+                generation = self.generation(cle_complete[0])
+                valeur = self.lire(cle_complete)
+                if valeur is None:
+                    valeur = fonction(*args, **kwargs)
+                    self.ecrire(cle_complete, valeur, generation)
+                return valeur
+
+            return enveloppe
+
+        return decorateur
+
+    def statistiques(self):
+        with self._verrou:
+            lectures = self.succes + self.echecs
+            return {
+                "entrees": len(self._entrees),
+                "taille_max": self.taille_max,
+                "duree_vie": self.duree_vie,
+                "succes": self.succes,
+                "echecs": self.echecs,
+                "evictions": self.evictions,
+                "taux_succes": self.succes / lectures if lectures else 0.0,
+            }
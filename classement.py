@@ -0,0 +1,177 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from threading import Lock
+from typing import Iterable, List, Optional
+
+from sqlmodel import Session, select
+
+from models import Copain, ScoreCagnotte
+
+
+# Classement d'une cagnotte : liste triée de (-total, copain_id) pour l'ordre,
+# dictionnaire copain_id -> (total, nombre_parties) pour retrouver une clé.
+# Les ex æquo partagent le rang du premier d'entre eux (1, 2, 2, 4).
+class Classement:
+    def __init__(self, scores: Iterable = ()):
+        self._scores = {}
+        self._ordre = []
+        for copain_id, total, nombre_parties in scores:
+            self._scores[copain_id] = (total, nombre_parties)
+            self._ordre.append((-total, copain_id))
+        self._ordre.sort()
+
+    def __len__(self):
+        return len(self._ordre)
+
+    def noter(self, copain_id: int, total: int, nombre_parties: int):
+        ancien = self._scores.get(copain_id)
+        if ancien is not None:
+            del self._ordre[bisect_left(self._ordre, (-ancien[0], copain_id))]
+        self._scores[copain_id] = (total, nombre_parties)
+        insort(self._ordre, (-total, copain_id))
+
+    def nombre_parties(self, copain_id: int) -> int:
+        return self._scores.get(copain_id, (0, 0))[1]
+
+    def rang(self, copain_id: int) -> Optional[int]:
+        score = self._scores.get(copain_id)
+        if score is None:
+            return None
+        return bisect_left(self._ordre, (-score[0],)) + 1
+
+    def decrire(self, copain_id: int) -> dict:
+        total, nombre_parties = self._scores[copain_id]
+        return {
+            "rang": self.rang(copain_id),
+            "copain_id": copain_id,
+            "total": total,
+            "nombre_parties": nombre_parties,
+        }
+
+    def tranche(self, debut: int, fin: int) -> List[dict]:
+        return [
+            self.decrire(copain_id)
+            for _, copain_id in self._ordre[max(debut, 0) : max(fin, 0)]
+        ]
+
+    def premiers(self, nombre: int) -> List[dict]:
+        return self.tranche(0, nombre)
+
+    def place(self, copain_id: int) -> List[dict]:
+        if copain_id not in self._scores:
+            return []
+        return [self.decrire(copain_id)]
+
+    def voisins(self, rang: int, rayon: int) -> List[dict]:
+        return self.tranche(rang - 1 - rayon, rang + rayon)
+
+
+# Comme la jointure sur Copain des scores en base : une ligne sans copain
+# n'entre pas au classement plutôt que de le faire échouer en entier.
+def charger(session: Session, cagnotte_id: Optional[int] = None):
+    requete = select(
+        ScoreCagnotte.cagnotte_id,
+        ScoreCagnotte.copain_id,
+        ScoreCagnotte.total,
+        ScoreCagnotte.nombre_parties,
+    ).join(Copain)
+    if cagnotte_id is not None:
+        requete = requete.where(ScoreCagnotte.cagnotte_id == cagnotte_id)
+    scores = defaultdict(list)
+    for cagnotte, *score in session.exec(requete):
+        scores[cagnotte].append(score)
+    return scores
+
+
+def nommer(session: Session, places: List[dict]) -> List[dict]:
+    if not places:
+        return places
+    noms = dict(
+        session.exec(
+            select(Copain.id, Copain.nom).where(
+                Copain.id.in_([place["copain_id"] for place in places])
+            )
+        ).all()
+    )
+    return [
+        {
+            "rang": place["rang"],
+            "copain_id": place["copain_id"],
+            "copain_nom": noms[place["copain_id"]],
+            "total": place["total"],
+            "nombre_parties": place["nombre_parties"],
+        }
+        for place in places
+        if place["copain_id"] in noms
+    ]
+
+
+# Classements de toutes les cagnottes, tenus à jour à partir de ScoreCagnotte.
+# Chaque mise à jour relit les totaux enregistrés plutôt que d'ajouter un
+# écart, et un total plus ancien (moins de parties) que celui tenu est
+# ignoré : appliquée deux fois ou dans le désordre, elle reste juste. Les
+# lectures en base se font hors du verrou, qu'une session asynchrone ne
+# doit pas garder pendant qu'elle rend la main à la boucle.
+class Classements:
+    def __init__(self):
+        self._classements = {}
+        self._verrou = Lock()
+
+    def reconstruire(self, session: Session, cagnotte_id: Optional[int] = None):
+        scores = charger(session, cagnotte_id)
+        with self._verrou:
+            if cagnotte_id is None:
+                self._classements = {
+                    cagnotte: Classement(lignes) for cagnotte, lignes in scores.items()
+                }
+            else:
+                self._classements[cagnotte_id] = Classement(scores[cagnotte_id])
+
+    def actualiser(
+        self, session: Session, cagnotte_id: int, copains: Optional[List[int]] = None
+    ):
+        if cagnotte_id not in self._classements:
+            return
+        if copains is None:
+            scores = charger(session, cagnotte_id)[cagnotte_id]
+        else:
+            scores = session.exec(
+                select(
+                    ScoreCagnotte.copain_id,
+                    ScoreCagnotte.total,
+                    ScoreCagnotte.nombre_parties,
+                )
+                .join(Copain)
+                .where(
+                    ScoreCagnotte.cagnotte_id == cagnotte_id,
+                    ScoreCagnotte.copain_id.in_(copains),
+                )
+            ).all()
+        with self._verrou:
+            classement = self._classements.get(cagnotte_id)
+            if classement is None:
+                return
+            for copain_id, total, nombre_parties in scores:
+                if nombre_parties >= classement.nombre_parties(copain_id):
+                    classement.noter(copain_id, total, nombre_parties)
+
+    def lire(self, session: Session, cagnotte_id: int, lecture) -> List[dict]:
+        classement = self._classements.get(cagnotte_id)
+        if classement is None:
+            charge = Classement(charger(session, cagnotte_id)[cagnotte_id])
+            with self._verrou:
+                classement = self._classements.setdefault(cagnotte_id, charge)
+        with self._verrou:
+            places = lecture(classement)
+        return nommer(session, places)
+
+    # Même interface que Cache pour la coordination entre processus : une
+    # partie enregistrée ailleurs périme tous les classements, rechargés à la
+    # lecture suivante.
+    def invalider(self, entite: str):
+        if entite == "parties":
+            self.vider()
+
+    def vider(self):
+        with self._verrou:
+            self._classements.clear()
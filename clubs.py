@@ -0,0 +1,280 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlmodel import Session
+from starlette.datastructures import Headers, QueryParams
+
+from amorcage import amorcer
+from archives import Archives
+from cache import Cache
+from classement import Classements
+from configuration import parametre
+from coordination import Coordination, verrou_fichier
+from diffusion import Diffuseur
+from ecritures import FileEcritures
+from instantanes import Instantanes
+from moteurs import creer_moteur, creer_moteur_async
+from versions import Versions
+
+NOM_CLUB = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+ENTETE_CLUB = "x-club"
+# Chemins servis sans club : documentation, métriques du processus et état
+# du registre.
+SANS_CLUB = (
+    "/docs",
+    "/docs/oauth2-redirect",
+    "/openapi.json",
+    "/redoc",
+    "/metrics",
+    "/clubs/",
+)
+
+club_courant: ContextVar[Optional["Club"]] = ContextVar("club_courant", default=None)
+
+
+# Tout ce que main tient pour une base, en un exemplaire par club : moteur à
+# pool borné, caches, compteurs d'ETag, instantanés, classements, archives,
+# diffusion, file d'écriture et coordination entre processus.
+class Club:
+    def __init__(self, nom: str, chemin: str):
+        self.nom = nom
+        self.chemin = chemin
+        self.engine = creer_moteur(
+            f"sqlite:///{chemin}",
+            taille_pool=parametre("clubs_pool_size", 2),
+            debordement_max=parametre("clubs_max_overflow", 3),
+        )
+        self.moteur_async = None
+        if parametre("mode_base", "sync") == "async":
+            self.moteur_async = creer_moteur_async(
+                f"sqlite+aiosqlite:///{chemin}",
+                taille_pool=parametre("clubs_pool_size", 2),
+                debordement_max=parametre("clubs_max_overflow", 3),
+            )
+        self.cache = Cache(duree_vie=300, taille_max=128)
+        self.diffuseur = Diffuseur()
+        self.versions = Versions()
+        self.classements = Classements()
+        self.archives = Archives(
+            os.path.join(parametre("dossier_archives", "archives"), nom)
+        )
+        self.coordination = Coordination(
+            self.engine,
+            self.versions,
+            self.cache,
+            self.diffuseur,
+            parametre("intervalle_coordination", 0.5),
+        )
+        self.coordination.caches.append(self.classements)
+        self.coordination.caches.append(self.archives)
+        self.ecritures = FileEcritures(
+            parametre("ecritures_delai", 0.002), parametre("ecritures_lot", 64)
+        )
+        self.instantanes = Instantanes(parametre("instantanes_duree_vie", 1.0))
+        self.projections = Instantanes(float("inf"))
+        self.demarrage = None
+        self.en_cours = 0
+        self.dernier_acces = time.monotonic()
+
+    def ouvrir(self):
+        with verrou_fichier(f"{self.chemin}.lock"):
+            self.demarrage = amorcer(
+                self.engine, self.chemin, parametre("base_modele", None)
+            )
+        self.archives.charger()
+        with Session(self.engine) as session:
+            self.classements.reconstruire(session)
+            self.archives.reserver(session)
+        if parametre("multi_processus", False):
+            self.coordination.demarrer()
+        if parametre("ecritures_groupees", False):
+            self.ecritures.demarrer(self.engine)
+
+    async def fermer(self):
+        await run_in_threadpool(self.ecritures.arreter)
+        if self.moteur_async is not None:
+            await self.moteur_async.dispose()
+        self.engine.dispose()
+
+
+# Clubs ouverts, du moins au plus récemment servi. Un club s'ouvre à sa
+# première requête ; au-delà de ouverts_max, ou après inactivite secondes
+# sans requête, les plus anciens sans requête en cours sont fermés.
+class Registre:
+    def __init__(
+        self,
+        dossier: str,
+        connus=(),
+        ouverts_max: int = 16,
+        inactivite: float = 600,
+    ):
+        self.dossier = dossier
+        self.connus = set(connus)
+        self.ouverts_max = ouverts_max
+        self.inactivite = inactivite
+        self.ouvertures = 0
+        self.fermetures = 0
+        self.ecouteurs = []
+        self._clubs = OrderedDict()
+        self._verrou = asyncio.Lock()
+        self._veille = None
+
+    def chemin(self, nom: str) -> str:
+        return os.path.join(self.dossier, f"{nom}.db")
+
+    def verifier(self, nom: Optional[str]):
+        if not nom or not NOM_CLUB.match(nom):
+            raise HTTPException(status_code=400, detail="Club manquant ou invalide")
+        if nom not in self.connus and not os.path.exists(self.chemin(nom)):
+            raise HTTPException(status_code=404, detail="Club introuvable")
+
+    async def entrer(self, nom: Optional[str]) -> Club:
+        club = self._clubs.get(nom)
+        if club is None:
+            async with self._verrou:
+                club = self._clubs.get(nom)
+                if club is None:
+                    self.verifier(nom)
+                    os.makedirs(self.dossier, exist_ok=True)
+                    club = Club(nom, self.chemin(nom))
+                    await run_in_threadpool(club.ouvrir)
+                    for ecouteur in self.ecouteurs:
+                        ecouteur(club)
+                    self._clubs[nom] = club
+                    self.ouvertures += 1
+        self._clubs.move_to_end(nom)
+        club.en_cours += 1
+        club.dernier_acces = time.monotonic()
+        return club
+
+    async def sortir(self, club: Club):
+        club.en_cours -= 1
+        club.dernier_acces = time.monotonic()
+        await self.liberer()
+
+    async def liberer(self):
+        limite = time.monotonic() - self.inactivite
+        surplus = len(self._clubs) - self.ouverts_max
+        a_fermer = []
+        for nom, club in list(self._clubs.items()):
+            if club.en_cours:
+                continue
+            if surplus > 0 or club.dernier_acces < limite:
+                del self._clubs[nom]
+                surplus -= 1
+                a_fermer.append(club)
+        for club in a_fermer:
+            await club.fermer()
+            self.fermetures += 1
+
+    def ouverts(self) -> list:
+        return list(self._clubs.values())
+
+    def etat(self) -> dict:
+        return {
+            "ouverts": [
+                {"nom": club.nom, "requetes_en_cours": club.en_cours}
+                for club in self._clubs.values()
+            ],
+            "ouverts_max": self.ouverts_max,
+            "ouvertures": self.ouvertures,
+            "fermetures": self.fermetures,
+        }
+
+    async def veiller(self, intervalle: float):
+        while True:
+            await asyncio.sleep(intervalle)
+            if parametre("multi_processus", False):
+                for club in self.ouverts():
+                    await run_in_threadpool(club.coordination.synchroniser)
+            await self.liberer()
+
+    async def lancer_veille(self):
+        self._veille = asyncio.create_task(
+            self.veiller(parametre("intervalle_coordination", 0.5))
+        )
+
+    async def arreter(self):
+        if self._veille is not None:
+            self._veille.cancel()
+        clubs, self._clubs = self.ouverts(), OrderedDict()
+        for club in clubs:
+            await club.fermer()
+            self.fermetures += 1
+
+
+# Choisit le club de la requête (entête X-Club, ou ?club= pour un websocket
+# qui ne peut pas poser d'entête) avant tout autre middleware : l'ETag et
+# le 304 se calculent déjà sur les compteurs du club.
+class RoutageClubs:
+    def __init__(self, app, registre: Registre, sans_club=SANS_CLUB):
+        self.app = app
+        self.registre = registre
+        self.sans_club = sans_club
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or (
+            scope["path"] in self.sans_club
+        ):
+            await self.app(scope, receive, send)
+            return
+        nom = Headers(scope=scope).get(ENTETE_CLUB) or QueryParams(
+            scope["query_string"]
+        ).get("club")
+        try:
+            club = await self.registre.entrer(nom)
+        except HTTPException as exception:
+            await self.refuser(exception, scope, receive, send)
+            return
+        jeton = club_courant.set(club)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            club_courant.reset(jeton)
+            await self.registre.sortir(club)
+
+    async def refuser(self, exception: HTTPException, scope, receive, send):
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        reponse = JSONResponse(
+            {"detail": exception.detail}, status_code=exception.status_code
+        )
+        await reponse(scope, receive, send)
+
+
+# Objet de main vu depuis les routes : chaque accès est renvoyé à
+# l'exemplaire du club de la requête en cours, ou à celui d'origine hors du
+# mode multi-club.
+class ParClub:
+    def __init__(self, attribut: str, defaut):
+        self._attribut = attribut
+        self._defaut = defaut
+
+    def courant(self):
+        club = club_courant.get()
+        return self._defaut if club is None else getattr(club, self._attribut)
+
+    def __getattr__(self, nom: str):
+        return getattr(self.courant(), nom)
+
+    def __setattr__(self, nom: str, valeur):
+        if nom.startswith("_"):
+            super().__setattr__(nom, valeur)
+        else:
+            setattr(self.courant(), nom, valeur)
+
+
+class CacheParClub(ParClub):
+    # Le décorateur est posé à l'import : il doit retrouver le cache du club
+    # à chaque appel, pas celui d'origine.
+    def memoriser(self, *cle):
+        return Cache.memoriser(self, *cle)
@@ -0,0 +1,164 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Gzip:
+    def __init__(self, niveau: int):
+        self._compresseur = zlib.compressobj(niveau, zlib.DEFLATED, 31)
+
+    def compresser(self, donnees: bytes) -> bytes:
+        return self._compresseur.compress(donnees) + self._compresseur.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def terminer(self) -> bytes:
+        return self._compresseur.flush()
+
+
+class Brotli:
+    def __init__(self, qualite: int):
+        self._compresseur = brotli.Compressor(quality=qualite)
+
+    def compresser(self, donnees: bytes) -> bytes:
+        return self._compresseur.process(donnees) + self._compresseur.flush()
+
+    def terminer(self) -> bytes:
+        return self._compresseur.finish()
+
+
+def encodages_disponibles(encodages) -> tuple:
+    return tuple(e for e in encodages if e == "gzip" or (e == "br" and brotli))
+
+
+def choisir_encodage(accept_encoding: str, encodages) -> str:
+    poids = {}
+    for element in accept_encoding.split(","):
+        nom, _, parametres = element.strip().partition(";")
+        q = 1.0
+        parametres = parametres.strip()
+        if parametres.startswith("q="):
+            try:
+                q = float(parametres[2:])
+            except ValueError:
+                q = 0.0
+        poids[nom.strip().lower()] = q
+    candidats = [
+        (poids.get(encodage, poids.get("*", 0.0)), -rang, encodage)
+        for rang, encodage in enumerate(encodages)
+    ]
+    meilleur = max(candidats, default=(0.0, 0, None))
+    return meilleur[2] if meilleur[0] > 0 else None
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        taille_min: int = 500,
+        encodages=("br", "gzip"),
+        niveau_gzip: int = 6,
+        qualite_brotli: int = 4,
+    ):
+        self.app = app
+        self.taille_min = taille_min
+        self.encodages = encodages_disponibles(encodages)
+        self.niveau_gzip = niveau_gzip
+        self.qualite_brotli = qualite_brotli
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encodage = choisir_encodage(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodages
+        )
+        if encodage is None:
+            await self.app(scope, receive, send)
+            return
+        await Compresseur(self, encodage, send).repondre(self.app, scope, receive)
+
+    def compresseur(self, encodage: str):
+        if encodage == "br":
+            return Brotli(self.qualite_brotli)
+        return Gzip(self.niveau_gzip)
+
+
+class Compresseur:
+    def __init__(self, reglages: CompressionMiddleware, encodage: str, send):
+        self.reglages = reglages
+        self.encodage = encodage
+        self.send = send
+        self.debut = None
+        self.tampon = b""
+        self.compresseur = None
+        self.transparent = False
+
+    async def repondre(self, app, scope, receive):
+        await app(scope, receive, self.envoyer)
+
+    async def envoyer(self, message):
+        if message["type"] == "http.response.start":
+            entetes = MutableHeaders(raw=message["headers"])
+            self.transparent = "content-encoding" in entetes
+            if not self.transparent:
+                # Même validateur faible sur la 200, compressée ou trop petite
+                # pour l'être, et sur la 304 : tous dépendent d'Accept-Encoding.
+                entetes.add_vary_header("Accept-Encoding")
+                if "etag" in entetes and not entetes["etag"].startswith("W/"):
+                    entetes["ETag"] = "W/" + entetes["etag"]
+            # Sans corps (1xx, 204, 304) : ni compression ni Content-Length.
+            if message["status"] < 200 or message["status"] in (204, 304):
+                self.transparent = True
+                await self.send(message)
+                return
+            self.debut = message
+            return
+        if message["type"] != "http.response.body" or self.transparent:
+            await self.vider_debut()
+            await self.send(message)
+            return
+
+        suite = message.get("more_body", False)
+        if self.compresseur is None:
+            # Le corps arrive souvent en plusieurs morceaux (BaseHTTPMiddleware) :
+            # on attend d'avoir taille_min octets ou la fin pour décider.
+            self.tampon += message.get("body", b"")
+            if suite and len(self.tampon) < self.reglages.taille_min:
+                return
+            corps, self.tampon = self.tampon, b""
+            if not suite and len(corps) < self.reglages.taille_min:
+                self.transparent = True
+                await self.vider_debut(len(corps))
+                await self.send({**message, "body": corps})
+                return
+            self.compresseur = self.reglages.compresseur(self.encodage)
+            entetes = MutableHeaders(raw=self.debut["headers"])
+            entetes["Content-Encoding"] = self.encodage
+            corps = self.compresseur.compresser(corps)
+            if not suite:
+                corps += self.compresseur.terminer()
+            await self.vider_debut(None if suite else len(corps))
+            await self.send({**message, "body": corps})
+            return
+
+        corps = self.compresseur.compresser(message.get("body", b""))
+        if not suite:
+            corps += self.compresseur.terminer()
+        await self.send({**message, "body": corps})
+
+    async def vider_debut(self, longueur: int = None):
+        if self.debut is None:
+            return
+        debut, self.debut = self.debut, None
+        entetes = MutableHeaders(raw=debut["headers"])
+        if longueur is not None:
+            entetes["Content-Length"] = str(longueur)
+        elif self.compresseur is not None:
+            del entetes["Content-Length"]
+        await self.send(debut)
@@ -0,0 +1,8 @@
+try:
+    import config
+except ImportError:
+    config = None
+
+
+def parametre(nom: str, defaut=None):
+    return getattr(config, nom, defaut)
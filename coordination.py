@@ -0,0 +1,112 @@
+import asyncio
+import json
+from contextlib import contextmanager
+from threading import Lock
+from uuid import uuid4
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from diffusion import RESYNCHRONISER
+from models import Changement
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Nombre d'entrées gardées dans le journal des changements. Un processus qui
+# a pris plus de retard repart de zéro (cache vidé, nouvelle génération d'ETag).
+# Le journal est élagué toutes les ELAGAGE entrées.
+CONSERVATION = 10000
+ELAGAGE = 1000
+
+
+@contextmanager
+def verrou_fichier(chemin: str):
+    with open(chemin, "a") as fichier:
+        if fcntl is not None:
+            fcntl.flock(fichier, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fichier, fcntl.LOCK_UN)
+
+
+class Coordination:
+    def __init__(self, engine, versions, cache, diffuseur, intervalle: float = 0.5):
+        self.engine = engine
+        self.versions = versions
+        self.caches = [cache]
+        self.diffuseur = diffuseur
+        self.intervalle = intervalle
+        self.origine = uuid4().hex
+        self.dernier = 0
+        self._veille = None
+        self._verrou = Lock()
+
+    def demarrer(self):
+        with Session(self.engine) as session:
+            self.dernier = session.exec(select(func.max(Changement.id))).one() or 0
+        self.versions.ecouteurs.append(self.noter)
+
+    # Le changement entre dans la transaction de l'écriture qu'il décrit : pas
+    # de validation de plus, et pas de donnée validée dont les autres
+    # processus ne sauraient rien.
+    def noter(self, transaction, cle: tuple):
+        ligne = {"origine": self.origine, "cle": json.dumps(cle)}
+        if isinstance(transaction, Connection):
+            transaction.execute(insert(Changement.__table__).values(**ligne))
+        else:
+            transaction.add(Changement(**ligne))
+
+    def elaguer(self, dernier: int):
+        with Session(self.engine) as session:
+            session.execute(
+                delete(Changement).where(Changement.id <= dernier - CONSERVATION)
+            )
+            session.commit()
+
+    def synchroniser(self):
+        with self._verrou:
+            self._synchroniser()
+
+    def _synchroniser(self):
+        with Session(self.engine) as session:
+            changements = session.exec(
+                select(Changement)
+                .where(Changement.id > self.dernier)
+                .order_by(Changement.id)
+            ).all()
+        if not changements:
+            return
+        if changements[0].id > self.dernier + 1 and self.dernier:
+            self.versions.renouveler()
+            for cache in self.caches:
+                cache.vider()
+        distants = [c for c in changements if c.origine != self.origine]
+        for changement in distants:
+            cle = tuple(json.loads(changement.cle))
+            for cache in self.caches:
+                cache.invalider(cle[0])
+            self.versions.appliquer(cle)
+        if changements[-1].id // ELAGAGE > self.dernier // ELAGAGE:
+            self.elaguer(changements[-1].id)
+        self.dernier = changements[-1].id
+        if distants and self.diffuseur.abonnes:
+            self.diffuseur.publier(RESYNCHRONISER)
+
+    async def veiller(self):
+        while True:
+            await asyncio.sleep(self.intervalle)
+            await run_in_threadpool(self.synchroniser)
+
+    async def lancer_veille(self):
+        self._veille = asyncio.create_task(self.veiller())
+
+    async def arreter_veille(self):
+        if self._veille is not None:
+            self._veille.cancel()
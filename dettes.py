@@ -0,0 +1,78 @@
+import sys
+from collections import defaultdict
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from models import DetteCopain, Joueur, Reunion
+
+
+def lire_dettes(session: Session, copain_id=None):
+    requete = (
+        select(Joueur.copain_id, Joueur.reunion_id, Reunion.nom, Joueur.dette)
+        .join(Reunion, Reunion.id == Joueur.reunion_id)
+        .where(Joueur.dette_active)
+        .order_by(Joueur.copain_id, Joueur.reunion_id)
+    )
+    if copain_id is not None:
+        requete = requete.where(Joueur.copain_id == copain_id)
+    return session.exec(requete)
+
+
+def calculer(session: Session, copain_id=None):
+    resumes = defaultdict(lambda: {"total": 0, "reunions": []})
+    for dette_copain_id, reunion_id, nom, dette in lire_dettes(session, copain_id):
+        resume = resumes[dette_copain_id]
+        resume["total"] += dette or 0
+        resume["reunions"].append(
+            {"reunion_id": reunion_id, "nom": nom, "dette": dette}
+        )
+    return resumes
+
+
+def enregistrer_dettes(session: Session, copain_id: int):
+    resume = calculer(session, copain_id).get(copain_id, {"total": 0, "reunions": []})
+    dette = session.get(DetteCopain, copain_id)
+    if not dette:
+        dette = DetteCopain(copain_id=copain_id)
+    dette.total = resume["total"]
+    dette.reunions = resume["reunions"]
+    session.add(dette)
+
+
+def reconstruire(session: Session):
+    resumes = calculer(session)
+    session.execute(delete(DetteCopain))
+    session.add_all(
+        DetteCopain(copain_id=c, total=r["total"], reunions=r["reunions"])
+        for c, r in resumes.items()
+    )
+
+
+def verifier(session: Session):
+    attendus = calculer(session)
+    enregistres = {
+        d.copain_id: {"total": d.total, "reunions": d.reunions}
+        for d in session.exec(select(DetteCopain))
+        if d.total or d.reunions
+    }
+    return [
+        (copain_id, attendus.get(copain_id), enregistres.get(copain_id))
+        for copain_id in sorted(set(attendus) | set(enregistres))
+        if attendus.get(copain_id) != enregistres.get(copain_id)
+    ]
+
+
+if __name__ == "__main__":
+    from main import engine
+
+    commande = sys.argv[1] if len(sys.argv) > 1 else "verifier"
+    with Session(engine) as session:
+        if commande == "reconstruire":
+            reconstruire(session)
+            session.commit()
+        ecarts = verifier(session)
+    for ecart in ecarts:
+        print(*ecart)
+    print(f"{len(ecarts)} écart(s)")
+    sys.exit(1 if ecarts else 0)
@@ -0,0 +1,41 @@
+import asyncio
+from threading import Lock
+
+# Placé dans la file d'un abonné trop lent : ses deltas en attente ont été
+# abandonnés, il doit repartir d'un instantané complet.
+RESYNCHRONISER = {"type": "resynchroniser"}
+
+
+class Diffuseur:
+    def __init__(self, taille_file: int = 100):
+        self.taille_file = taille_file
+        self._abonnes = set()
+        self._verrou = Lock()
+
+    @property
+    def abonnes(self) -> int:
+        return len(self._abonnes)
+
+    def abonner(self) -> asyncio.Queue:
+        file = asyncio.Queue(maxsize=self.taille_file)
+        with self._verrou:
+            self._abonnes.add((asyncio.get_running_loop(), file))
+        return file
+
+    def desabonner(self, file: asyncio.Queue):
+        with self._verrou:
+            self._abonnes = {(b, f) for b, f in self._abonnes if f is not file}
+
+    def publier(self, message: dict):
+        with self._verrou:
+            abonnes = list(self._abonnes)
+        for boucle, file in abonnes:
+            boucle.call_soon_threadsafe(self._deposer, file, message)
+
+    @staticmethod
+    def _deposer(file: asyncio.Queue, message: dict):
+        if file.full():
+            while not file.empty():
+                file.get_nowait()
+            message = RESYNCHRONISER
+        file.put_nowait(message)
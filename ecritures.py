@@ -0,0 +1,111 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+
+from sqlmodel import Session
+
+ARRET = None
+
+
+# Un seul fil écrit dans la base : il prend les opérations déposées pendant
+# `delai` secondes (ou jusqu'à `taille_lot`) et les valide en une transaction.
+# Une opération reçoit la session et rend un résultat détaché de celle-ci ;
+# si elle échoue, seule sa future reçoit l'exception et le lot est rejoué
+# sans elle. Elle s'exécute dans le contexte de la requête qui l'a déposée
+# (club courant compris).
+class FileEcritures:
+    def __init__(self, delai: float = 0.002, taille_lot: int = 64):
+        self.delai = delai
+        self.taille_lot = taille_lot
+        self.engine = None
+        self.lots = 0
+        self.ecritures = 0
+        self._file = queue.SimpleQueue()
+        self._fil = None
+
+    def demarrer(self, engine):
+        self.engine = engine
+        self._fil = threading.Thread(target=self.boucle, daemon=True)
+        self._fil.start()
+
+    def arreter(self):
+        if self._fil is not None:
+            self._file.put(ARRET)
+            self._fil.join()
+            self._fil = None
+
+    def deposer(self, operation, *args) -> Future:
+        future = Future()
+        contexte = contextvars.copy_context()
+        self._file.put((future, partial(contexte.run, operation), args))
+        return future
+
+    def soumettre(self, operation, *args):
+        return self.deposer(operation, *args).result()
+
+    def boucle(self):
+        while True:
+            element = self._file.get()
+            if element is ARRET:
+                return
+            lot = [element]
+            limite = time.monotonic() + self.delai
+            while len(lot) < self.taille_lot:
+                reste = limite - time.monotonic()
+                try:
+                    if reste > 0:
+                        element = self._file.get(timeout=reste)
+                    else:
+                        element = self._file.get_nowait()
+                except queue.Empty:
+                    break
+                if element is ARRET:
+                    self._file.put(ARRET)
+                    break
+                lot.append(element)
+            lot = [e for e in lot if e[0].set_running_or_notify_cancel()]
+            if lot:
+                self.executer(lot)
+
+    def executer(self, lot: list):
+        while lot:
+            resultats = []
+            with Session(self.engine, expire_on_commit=False) as session:
+                try:
+                    for _, operation, args in lot:
+                        resultats.append(operation(session, *args))
+                except Exception as exception:
+                    session.rollback()
+                    future = lot.pop(len(resultats))[0]
+                    future.set_exception(exception)
+                    continue
+                try:
+                    session.commit()
+                except Exception as exception:
+                    session.rollback()
+                    if len(lot) == 1:
+                        lot[0][0].set_exception(exception)
+                        return
+                    for element in lot:
+                        self.executer([element])
+                    return
+            self.lots += 1
+            self.ecritures += len(lot)
+            for (future, _, _), resultat in zip(lot, resultats):
+                future.set_result(resultat)
+            return
+
+    def exposer(self) -> str:
+        lignes = [
+            "# HELP tdc_ecritures_lots_total Transactions validées par le fil"
+            " écrivain.",
+            "# TYPE tdc_ecritures_lots_total counter",
+            f"tdc_ecritures_lots_total {self.lots}",
+            "# HELP tdc_ecritures_total Opérations validées par le fil écrivain.",
+            "# TYPE tdc_ecritures_total counter",
+            f"tdc_ecritures_total {self.ecritures}",
+        ]
+        return "\n".join(lignes) + "\n"
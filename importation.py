@@ -0,0 +1,177 @@
+import argparse
+import csv
+import json
+import sys
+from collections import defaultdict
+from itertools import islice
+from typing import Optional
+
+from pydantic import ValidationError
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+
+from models import Contrat, Copain, Joueur, PartieCreation, Reunion
+from scores import cumul_score, repartition
+
+TAILLE_LOT = 5000
+
+insertion_partie = (
+    "INSERT INTO partie (reunion_id, contrat_id, preneur_id, appel_id, est_fait,"
+    " points, chelem_realise, petit_au_bout) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def charger_references(connection: Connection):
+    return {
+        "contrats": {c.id: c for c in connection.execute(select(Contrat)).all()},
+        "copains": set(connection.execute(select(Copain.id)).scalars()),
+        "cagnottes": dict(
+            connection.execute(select(Reunion.id, Reunion.cagnotte_id)).all()
+        ),
+    }
+
+
+def analyser(donnees, reunion_id: Optional[int] = None):
+    if isinstance(donnees, Exception):
+        raise donnees
+    if isinstance(donnees, PartieCreation):
+        return reunion_id, donnees
+    donnees = {cle: (None if v == "" else v) for cle, v in donnees.items()}
+    reunion_id = donnees.pop("reunion_id", None) or reunion_id
+    if reunion_id is None:
+        raise ValueError("reunion_id manquant")
+    return int(reunion_id), PartieCreation.parse_obj(donnees)
+
+
+def verifier(reunion_id: int, partie: PartieCreation, references) -> Optional[str]:
+    if reunion_id not in references["cagnottes"]:
+        return f"réunion {reunion_id} introuvable"
+    if partie.contrat_id not in references["contrats"]:
+        return f"contrat {partie.contrat_id} introuvable"
+    for copain_id in (partie.preneur_id, partie.appel_id, partie.petit_au_bout):
+        if copain_id is not None and copain_id not in references["copains"]:
+            return f"copain {copain_id} introuvable"
+    return None
+
+
+def inserer_lot(connection: Connection, lot, references):
+    reunion_ids = {reunion_id for _, reunion_id, _ in lot}
+    joueurs = defaultdict(list)
+    for reunion_id, copain_id in connection.execute(
+        select(Joueur.reunion_id, Joueur.copain_id).where(
+            Joueur.reunion_id.in_(reunion_ids)
+        )
+    ):
+        joueurs[reunion_id].append(copain_id)
+
+    par_reunion = defaultdict(lambda: [0, 0])
+    par_cagnotte = defaultdict(lambda: [0, 0])
+    for _, reunion_id, partie in lot:
+        contrat = references["contrats"][partie.contrat_id]
+        cagnotte_id = references["cagnottes"][reunion_id]
+        for copain_id, gain in repartition(
+            partie, contrat, joueurs[reunion_id]
+        ).items():
+            for cumul in (
+                par_reunion[(reunion_id, copain_id)],
+                par_cagnotte[(cagnotte_id, copain_id)],
+            ):
+                cumul[0] += gain
+                cumul[1] += 1
+
+    connection.exec_driver_sql(
+        insertion_partie,
+        [
+            (
+                reunion_id,
+                p.contrat_id,
+                p.preneur_id,
+                p.appel_id,
+                p.est_fait,
+                p.points,
+                p.chelem_realise,
+                p.petit_au_bout,
+            )
+            for _, reunion_id, p in lot
+        ],
+    )
+    for table, colonne, cumuls in (
+        ("scorereunion", "reunion_id", par_reunion),
+        ("scorecagnotte", "cagnotte_id", par_cagnotte),
+    ):
+        if cumuls:
+            connection.exec_driver_sql(
+                cumul_score.format(table=table, colonne=colonne),
+                [(cle, copain_id, t, n) for (cle, copain_id), (t, n) in cumuls.items()],
+            )
+
+
+def importer(
+    connection: Connection,
+    lignes,
+    reunion_id: Optional[int] = None,
+    taille_lot: int = TAILLE_LOT,
+    journal=None,
+):
+    references = None
+    importees = 0
+    erreurs = []
+    lignes = iter(lignes)
+    while True:
+        brut = list(islice(lignes, taille_lot))
+        if not brut:
+            break
+        with connection.begin():
+            if references is None:
+                references = charger_references(connection)
+            lot = []
+            for numero, donnees in brut:
+                try:
+                    ligne_reunion_id, partie = analyser(donnees, reunion_id)
+                except (ValidationError, ValueError) as exception:
+                    erreurs.append({"ligne": numero, "erreur": str(exception)})
+                    continue
+                erreur = verifier(ligne_reunion_id, partie, references)
+                if erreur:
+                    erreurs.append({"ligne": numero, "erreur": erreur})
+                    continue
+                lot.append((numero, ligne_reunion_id, partie))
+            if lot:
+                inserer_lot(connection, lot, references)
+                if journal is not None:
+                    journal(connection)
+                importees += len(lot)
+    return {"importees": importees, "erreurs": erreurs}
+
+
+def lire(fichier):
+    if fichier.name.endswith(".csv"):
+        yield from enumerate(csv.DictReader(fichier), start=2)
+    else:
+        for numero, ligne in enumerate(fichier, start=1):
+            if ligne.strip():
+                try:
+                    yield numero, json.loads(ligne)
+                except json.JSONDecodeError as exception:
+                    yield numero, ValueError(f"JSON invalide : {exception}")
+
+
+if __name__ == "__main__":
+    from main import engine
+
+    arguments = argparse.ArgumentParser(
+        description="Importe des parties depuis un fichier CSV ou NDJSON."
+    )
+    arguments.add_argument("fichier", type=argparse.FileType("r", encoding="utf-8"))
+    arguments.add_argument("--reunion", type=int, default=None)
+    arguments.add_argument("--taille-lot", type=int, default=TAILLE_LOT)
+    options = arguments.parse_args()
+
+    with engine.connect() as connection:
+        rapport = importer(
+            connection, lire(options.fichier), options.reunion, options.taille_lot
+        )
+    for erreur in rapport["erreurs"]:
+        print(f"ligne {erreur['ligne']} : {erreur['erreur']}", file=sys.stderr)
+    print(f"{rapport['importees']} partie(s) importée(s)")
+    sys.exit(1 if rapport["erreurs"] else 0)
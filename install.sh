@@ -3,6 +3,10 @@
 conda install -c conda-forge fastapi
 conda install -c conda-forge uvicorn
 conda install -c conda-forge sqlmodel
+conda install -c conda-forge numpy
+conda install -c conda-forge aiosqlite
+conda install -c conda-forge orjson
+conda install -c conda-forge brotli-python
 conda install -c anaconda black
 conda update --all
 
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from concurrent.futures import Future
+from threading import Lock
+
+
+# Instantanés de lectures coûteuses, rangés sous une clé et la version des
+# données lue avant le calcul (l'ETag de la route). Une écriture change la
+# version : l'instantané n'est plus servi. Les lectures simultanées d'une
+# même clé et version attendent le calcul déjà lancé au lieu d'en lancer un.
+class Instantanes:
+    def __init__(self, duree_vie: float = 1.0):
+        self.duree_vie = duree_vie
+        self._instantanes = {}
+        self._en_vol = {}
+        self._verrou = Lock()
+        self.calculs = 0
+        self.partages = 0
+        self.succes = 0
+
+    def _chercher(self, cle, version):
+        with self._verrou:
+            entree = self._instantanes.get(cle)
+            if (
+                entree is not None
+                and entree[0] == version
+                and entree[1] > time.monotonic()
+            ):
+                self.succes += 1
+                return entree[2], None, False
+            future = self._en_vol.get((cle, version))
+            if future is not None:
+                self.partages += 1
+                return None, future, False
+            future = Future()
+            self._en_vol[(cle, version)] = future
+            self.calculs += 1
+            return None, future, True
+
+    def _terminer(self, cle, version, future: Future, valeur, exception):
+        with self._verrou:
+            del self._en_vol[(cle, version)]
+            if exception is None:
+                self._instantanes[cle] = (
+                    version,
+                    time.monotonic() + self.duree_vie,
+                    valeur,
+                )
+        if exception is None:
+            future.set_result(valeur)
+        else:
+            future.set_exception(exception)
+
+    def lire(self, cle, version, calcul):
+        valeur, future, meneur = self._chercher(cle, version)
+        if future is None:
+            return valeur
+        if not meneur:
+            return future.result()
+        try:
+            valeur = calcul()
+        except Exception as exception:
+            self._terminer(cle, version, future, None, exception)
+            raise
+        self._terminer(cle, version, future, valeur, None)
+        return valeur
+
+    async def lire_async(self, cle, version, calcul):
+        valeur, future, meneur = self._chercher(cle, version)
+        if future is None:
+            return valeur
+        if not meneur:
+            return await asyncio.wrap_future(future)
+        try:
+            valeur = await calcul()
+        except BaseException as exception:
+            self._terminer(cle, version, future, None, exception)
+            raise
+        self._terminer(cle, version, future, valeur, None)
+        return valeur
+
+    def exposer(self) -> str:
+        lignes = [
+            "# HELP tdc_instantanes_calculs_total Instantanés recalculés depuis"
+            " la base.",
+            "# TYPE tdc_instantanes_calculs_total counter",
+            f"tdc_instantanes_calculs_total {self.calculs}",
+            "# HELP tdc_instantanes_partages_total Lectures qui ont attendu un"
+            " calcul déjà lancé.",
+            "# TYPE tdc_instantanes_partages_total counter",
+            f"tdc_instantanes_partages_total {self.partages}",
+            "# HELP tdc_instantanes_succes_total Lectures servies par un"
+            " instantané à jour.",
+            "# TYPE tdc_instantanes_succes_total counter",
+            f"tdc_instantanes_succes_total {self.succes}",
+        ]
+        return "\n".join(lignes) + "\n"
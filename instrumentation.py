@@ -0,0 +1,164 @@
+import logging
+import re
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from threading import Lock
+
+from fastapi import Request
+from sqlalchemy import event
+from starlette.routing import Match
+
+BORNES_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BORNES_SQL = (1, 2, 5, 10, 25, 50, 100)
+TYPE_PROMETHEUS = "text/plain; version=0.0.4"
+
+journal = logging.getLogger(__name__)
+mesure_courante = ContextVar("mesure_courante", default=None)
+
+
+def forme(instruction: str) -> str:
+    instruction = re.sub(r"\s+", " ", instruction).strip()
+    return re.sub(r"\(\?(?:, \?)*\)", "(?)", instruction)
+
+
+def echapper(valeur) -> str:
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def etiquettes(**valeurs) -> str:
+    paires = (f'{nom}="{echapper(valeur)}"' for nom, valeur in valeurs.items())
+    return "{" + ",".join(paires) + "}"
+
+
+class Histogramme:
+    def __init__(self, bornes):
+        self.bornes = bornes
+        self.compteurs = [0] * (len(bornes) + 1)
+        self.somme = 0
+        self.nombre = 0
+
+    def observer(self, valeur):
+        self.compteurs[bisect_left(self.bornes, valeur)] += 1
+        self.somme += valeur
+        self.nombre += 1
+
+    def exposer(self, nom: str, **valeurs):
+        cumul = 0
+        for borne, compteur in zip((*self.bornes, "+Inf"), self.compteurs):
+            cumul += compteur
+            yield f"{nom}_bucket{etiquettes(**valeurs, le=borne)} {cumul}"
+        yield f"{nom}_sum{etiquettes(**valeurs)} {self.somme}"
+        yield f"{nom}_count{etiquettes(**valeurs)} {self.nombre}"
+
+
+class Instrumentation:
+    def __init__(self, seuil_n_plus_un: int = 10):
+        self.seuil_n_plus_un = seuil_n_plus_un
+        self._verrou = Lock()
+        self._durees = defaultdict(lambda: Histogramme(BORNES_DUREE))
+        self._requetes_sql = defaultdict(lambda: Histogramme(BORNES_SQL))
+        self._durees_sql = defaultdict(float)
+        self._n_plus_un = Counter()
+
+    def ecouter(self, engine):
+        event.listen(engine, "before_cursor_execute", self._avant_execution)
+        event.listen(engine, "after_cursor_execute", self._apres_execution)
+
+    def _avant_execution(self, connection, curseur, instruction, *args):
+        connection.info.setdefault("debuts", []).append(time.perf_counter())
+
+    def _apres_execution(self, connection, curseur, instruction, *args):
+        duree = time.perf_counter() - connection.info["debuts"].pop()
+        mesure = mesure_courante.get()
+        if mesure is not None:
+            mesure["requetes_sql"] += 1
+            mesure["duree_sql"] += duree
+            mesure["formes"][forme(instruction)] += 1
+
+    async def mesurer(self, request: Request, call_next):
+        mesure = {"requetes_sql": 0, "duree_sql": 0.0, "formes": Counter()}
+        jeton = mesure_courante.set(mesure)
+        debut = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            mesure_courante.reset(jeton)
+        self.enregistrer(
+            request.method,
+            route_requete(request.app, request.scope),
+            time.perf_counter() - debut,
+            mesure,
+        )
+        return response
+
+    def enregistrer(self, methode: str, route: str, duree: float, mesure: dict):
+        cle = (methode, route)
+        repetees = [
+            (instruction, nombre)
+            for instruction, nombre in mesure["formes"].items()
+            if nombre > self.seuil_n_plus_un
+        ]
+        with self._verrou:
+            self._durees[cle].observer(duree)
+            self._requetes_sql[cle].observer(mesure["requetes_sql"])
+            self._durees_sql[cle] += mesure["duree_sql"]
+            for instruction, _ in repetees:
+                self._n_plus_un[(*cle, instruction)] += 1
+        for instruction, nombre in repetees:
+            journal.warning(
+                "N+1 possible sur %s %s : %d × %s", methode, route, nombre, instruction
+            )
+
+    def exposer(self) -> str:
+        lignes = [
+            "# HELP tdc_requete_duree_secondes Durée des requêtes HTTP par route.",
+            "# TYPE tdc_requete_duree_secondes histogram",
+        ]
+        with self._verrou:
+            for (methode, route), histogramme in sorted(self._durees.items()):
+                lignes.extend(
+                    histogramme.exposer(
+                        "tdc_requete_duree_secondes", methode=methode, route=route
+                    )
+                )
+            lignes += [
+                "# HELP tdc_requete_sql Instructions SQL exécutées par requête HTTP.",
+                "# TYPE tdc_requete_sql histogram",
+            ]
+            for (methode, route), histogramme in sorted(self._requetes_sql.items()):
+                lignes.extend(
+                    histogramme.exposer("tdc_requete_sql", methode=methode, route=route)
+                )
+            lignes += [
+                "# HELP tdc_requete_sql_duree_secondes_total Temps passé en base par route.",
+                "# TYPE tdc_requete_sql_duree_secondes_total counter",
+            ]
+            for (methode, route), duree in sorted(self._durees_sql.items()):
+                lignes.append(
+                    "tdc_requete_sql_duree_secondes_total"
+                    f"{etiquettes(methode=methode, route=route)} {duree}"
+                )
+            lignes += [
+                "# HELP tdc_n_plus_un_total Requêtes HTTP répétant une même instruction"
+                f" SQL plus de {self.seuil_n_plus_un} fois.",
+                "# TYPE tdc_n_plus_un_total counter",
+            ]
+            for (methode, route, instruction), nombre in sorted(
+                self._n_plus_un.items()
+            ):
+                lignes.append(
+                    "tdc_n_plus_un_total"
+                    f"{etiquettes(methode=methode, route=route, instruction=instruction)}"
+                    f" {nombre}"
+                )
+        return "\n".join(lignes) + "\n"
+
+
+def route_requete(app, scope) -> str:
+    for route in app.router.routes:
+        correspondance, _ = route.matches(scope)
+        if correspondance == Match.FULL:
+            return route.path
+    return "inconnue"
@@ -1,13 +1,36 @@
+from functools import partial
 from operator import itemgetter
+from typing import List, Literal, Optional
 
-from fastapi import FastAPI, APIRouter, HTTPException
-from sqlmodel import Session, SQLModel, create_engine, select
-from fixtures.cagnottes_fixtures import cagnottes
-from fixtures.contrats_fixtures import contrats
-from fixtures.copains_fixtures import copains
-from fixtures.liens_fixtures import liens
-from fixtures.parties_fixtures import parties
-from fixtures.reunions_fixtures import reunions
+import asyncio
+import os
+
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
+from sqlmodel import Session, select
+from amorcage import amorcer, creer_schema, semer
+from archives import Archives
+from cache import Cache
+from classement import Classements
+from clubs import CacheParClub, ParClub, Registre, RoutageClubs, club_courant
+from configuration import parametre
+from coordination import Coordination, verrou_fichier
+from dettes import enregistrer_dettes
+from ecritures import FileEcritures
+from diffusion import RESYNCHRONISER, Diffuseur
+from importation import importer
+from instantanes import Instantanes
+from instrumentation import TYPE_PROMETHEUS, Instrumentation
+from moteurs import creer_moteur
+from pagination import lister, lister_lignes, verifier_limite
+from projections import Simulateur, lire_modele
+from compression import CompressionMiddleware
+from reponses import ReponseJSON, compacter_reunion_active, en_dict, projection
+from scores import enregistrer_partie
+from statistiques import resumer, statistiques
+from versions import Versions, correspond
 from models import (
     Copain,
     Reunion,
@@ -17,152 +40,313 @@ from models import (
     CopainCreation,
     CagnotteCreation,
     ReunionCreation,
+    ReunionPreparation,
     Joueur,
     Partie,
     PartieCreation,
     JoueurAjout,
     JoueurUpdate,
+    ScoreCagnotte,
+    ScoreReunion,
+    DetteCopain,
+    DettesCopain,
+    CopainLecture,
+    CagnotteLecture,
+    ContratLecture,
+    ReunionLecture,
+    PartieLecture,
+    ReunionActive,
+    ReunionActiveCompacte,
+    ScoreLecture,
+    PlaceClassement,
+    StatistiquesCagnotte,
+    ProjectionsCagnotte,
+    Message,
 )
 
 sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
-engine = create_engine(sqlite_url, echo=False)
-app = FastAPI()
+engine = creer_moteur(sqlite_url)
+app = FastAPI(default_response_class=ReponseJSON)
 reunion_router = APIRouter(tags=["Reunions"])
 partie_router = APIRouter(tags=["Parties"])
 cagnotte_router = APIRouter(tags=["Cagnottes"])
 copain_router = APIRouter(tags=["Copains"])
 contrat_router = APIRouter(tags=["Contrats"])
+cache_router = APIRouter(tags=["Cache"])
+cache = CacheParClub("cache", Cache(duree_vie=300, taille_max=128))
+direct_router = APIRouter(tags=["Direct"])
+diffuseur = ParClub("diffuseur", Diffuseur())
+versions = ParClub("versions", Versions())
+classements = ParClub("classements", Classements())
+archives = ParClub("archives", Archives(parametre("dossier_archives", "archives")))
+coordination = ParClub(
+    "coordination",
+    Coordination(
+        engine, versions, cache, diffuseur, parametre("intervalle_coordination", 0.5)
+    ),
+)
+coordination.caches.append(classements)
+coordination.caches.append(archives)
+metriques_router = APIRouter(tags=["Métriques"])
+mesures = Instrumentation(parametre("seuil_n_plus_un", 10))
+ecritures = ParClub(
+    "ecritures",
+    FileEcritures(parametre("ecritures_delai", 0.002), parametre("ecritures_lot", 64)),
+)
+instantanes = ParClub(
+    "instantanes", Instantanes(parametre("instantanes_duree_vie", 1.0))
+)
+projections = ParClub("projections", Instantanes(float("inf")))
+simulateur = Simulateur(
+    parametre("projections_processus", None), parametre("projections_lot", 4096)
+)
+clubs_router = APIRouter(tags=["Clubs"])
+registre = Registre(
+    parametre("dossier_clubs", "clubs"),
+    parametre("clubs", ()),
+    parametre("clubs_ouverts_max", 16),
+    parametre("clubs_inactivite", 600),
+)
+
+
+# Moteur de la requête en cours : celui de son club avec clubs_separes,
+# sinon la base unique.
+def moteur():
+    club = club_courant.get()
+    return engine if club is None else club.engine
+
+
+@app.middleware("http")
+async def requete_conditionnelle(request: Request, call_next):
+    if request.method != "GET":
+        return await call_next(request)
+    if parametre("multi_processus", False) and (
+        club_courant.get() is not None or not parametre("clubs_separes", False)
+    ):
+        await run_in_threadpool(coordination.synchroniser)
+    etag = versions.etag_requete(request.app, request.scope)
+    if etag is None:
+        return await call_next(request)
+    if correspond(etag, request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers={"ETag": etag})
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+    return response
+
+
+if parametre("instrumentation", False):
+    mesures.ecouter(engine)
+    app.middleware("http")(mesures.mesurer)
+if parametre("compression", True):
+    app.add_middleware(
+        CompressionMiddleware,
+        taille_min=parametre("compression_taille_min", 500),
+        encodages=parametre("compression_encodages", ("br", "gzip")),
+        niveau_gzip=parametre("compression_niveau_gzip", 6),
+        qualite_brotli=parametre("compression_qualite_brotli", 4),
+    )
+if parametre("clubs_separes", False):
+    app.add_middleware(RoutageClubs, registre=registre)
 
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    creer_schema(moteur())
 
 
 def fixtures():
-    with Session(engine) as session:
-        session.add_all(copains)
-        session.commit()
-        session.add_all(contrats)
-        session.commit()
-        session.add_all(cagnottes)
-        session.commit()
-        session.add_all(reunions)
-        session.commit()
-        session.add_all(liens)
-        session.commit()
-        session.add_all(parties)
-        session.commit()
-
-        default_value = Default(reunion_id=3)
-        session.add(default_value)
-        session.commit()
+    semer(moteur())
 
 
 def joueurs_par_reunion(reunion_id: int):
-    with Session(engine) as session:
-        joueurs = session.exec(
-            select(Joueur).where(Joueur.reunion_id == reunion_id)
-        ).all()
-        if not joueurs:
-            return []
-        joueur_db = []
-        nombre_joueurs = 0
-        for joueur in joueurs:
-            copain = session.get(Copain, joueur.copain_id)
-            if not copain:
-                raise HTTPException(
-                    status_code=404, detail="Copain lié au joueur introuvable."
-                )
-            nombre_joueurs += 1
-            dettes = session.exec(
-                select(Joueur)
-                .where(Joueur.dette_active)
-                .where(Joueur.copain_id == joueur.copain_id)
-            )
-            dettes_result = []
-            for dette in dettes:
-                reunion = session.get(Reunion, dette.reunion_id)
-                reunion_db = {
-                    "reunion_id": reunion.id,
-                    "nom": reunion.nom,
-                    "dette": dette.dette,
-                }
-                if reunion.id != reunion_id:
-                    dettes_result.append(reunion_db)
-
-            payload = {
-                "copain_id": joueur.copain_id,
-                "copain_nom": copain.nom,
-                "copain_image": copain.image,
-                "est_guest": joueur.est_guest,
-                "dette": joueur.dette,
-                "dette_active": joueur.dette_active,
-                "dettes": dettes_result,
-            }
-            joueur_db.append(payload)
-            joueurs_tries = sorted(
-                joueur_db, key=itemgetter("copain_nom"), reverse=False
-            )
+    with Session(moteur()) as session:
+        return construire_joueurs(session, reunion_id)
 
-        return {"nombre_joueurs": nombre_joueurs, "joueurs": joueurs_tries}
 
+def construire_joueurs(session: Session, reunion_id: int):
+    joueurs = session.exec(
+        select(
+            Joueur.copain_id,
+            Joueur.est_guest,
+            Joueur.dette,
+            Joueur.dette_active,
+            Copain.nom,
+            Copain.image,
+        )
+        .outerjoin(Copain, Copain.id == Joueur.copain_id)
+        .where(Joueur.reunion_id == reunion_id)
+    ).all()
+    if not joueurs:
+        return []
+    copain_ids = [joueur.copain_id for joueur in joueurs]
+    dettes = session.exec(
+        select(DetteCopain.copain_id, DetteCopain.reunions).where(
+            DetteCopain.copain_id.in_(copain_ids)
+        )
+    ).all()
+    dettes_par_copain = {copain_id: [] for copain_id in copain_ids}
+    for copain_id, reunions in dettes:
+        dettes_par_copain[copain_id] = [
+            dette for dette in reunions if dette["reunion_id"] != reunion_id
+        ]
 
-@reunion_router.get("/active/")
-def reunion_active():
-    with Session(engine) as session:
-        default = session.get(Default, 1)
-        if not default:
-            raise HTTPException(
-                status_code=404, detail="Pas de réunion par défault définie."
-            )
-        reunion_db = session.get(Reunion, default.reunion_id)
-        if not reunion_db:
+    joueur_db = []
+    for joueur in joueurs:
+        if joueur.nom is None:
             raise HTTPException(
-                status_code=404, detail="Pas de réunion par défault définie."
+                status_code=404, detail="Copain lié au joueur introuvable."
             )
-        cagnotte = session.get(Cagnotte, reunion_db.cagnotte_id)
-        if not cagnotte:
-            raise HTTPException(status_code=404, detail="Cagnotte introuvable.")
-        informations = joueurs_par_reunion(reunion_db.id)
-        nombre_joueurs = 0
-        joueurs = []
-        if informations:
-            nombre_joueurs = informations["nombre_joueurs"]
-            joueurs = informations["joueurs"]
-        parties_db = liste_parties_par_reunion(reunion_db.id)
-        parties_result = []
-        nombre_parties = 0
-        for partie in parties_db:
-            nombre_parties += 1
-            partie_db = {
-                "rang": nombre_parties,
-                "contrat_id": partie.contrat_id,
-                "preneur_id": partie.preneur_id,
-                "appel_id": partie.appel_id,
-                "est_fait": partie.est_fait,
-                "points": partie.points,
-                "chelem_realise": partie.chelem_realise,
-                "petit_au_bout": partie.petit_au_bout,
-            }
-            parties_result.append(partie_db)
-
         payload = {
-            "reunion_id": reunion_db.id,
-            "reunion_nom": reunion_db.nom,
-            "cagnotte_id": cagnotte.id,
-            "cagnotte_nom": cagnotte.nom,
-            "nombre_joueurs": nombre_joueurs,
-            "joueurs": joueurs,
-            "nombre_parties": nombre_parties,
-            "parties": parties_result,
+            "copain_id": joueur.copain_id,
+            "copain_nom": joueur.nom,
+            "copain_image": joueur.image,
+            "est_guest": joueur.est_guest,
+            "dette": joueur.dette,
+            "dette_active": joueur.dette_active,
+            "dettes": dettes_par_copain[joueur.copain_id],
         }
-        return payload
+        joueur_db.append(payload)
+    joueurs_tries = sorted(joueur_db, key=itemgetter("copain_nom"), reverse=False)
+
+    return {"nombre_joueurs": len(joueurs_tries), "joueurs": joueurs_tries}
+
+
+def decrire_partie(partie: Partie, rang: int):
+    return {
+        "rang": rang,
+        "contrat_id": partie.contrat_id,
+        "preneur_id": partie.preneur_id,
+        "appel_id": partie.appel_id,
+        "est_fait": partie.est_fait,
+        "points": partie.points,
+        "chelem_realise": partie.chelem_realise,
+        "petit_au_bout": partie.petit_au_bout,
+    }
+
+
+def publier_reunion_active(session: Session):
+    if diffuseur.abonnes:
+        diffuseur.publier({"type": "reunion", **construire_reunion_active(session)})
+
+
+def publier_joueurs(session: Session, reunion_id: int):
+    if diffuseur.abonnes:
+        informations = construire_joueurs(session, reunion_id)
+        diffuseur.publier(
+            {
+                "type": "joueurs",
+                "reunion_id": reunion_id,
+                "nombre_joueurs": informations["nombre_joueurs"],
+                "joueurs": informations["joueurs"],
+            }
+        )
+
+
+def publier_dettes(session: Session):
+    default = session.get(Default, 1)
+    if default:
+        publier_joueurs(session, default.reunion_id)
+
+
+def publier_partie(session: Session, partie: Partie):
+    if diffuseur.abonnes:
+        rang = session.exec(
+            select(func.count(Partie.id)).where(Partie.reunion_id == partie.reunion_id)
+        ).one()
+        diffuseur.publier(
+            {
+                "type": "partie",
+                "reunion_id": partie.reunion_id,
+                "partie": decrire_partie(partie, rang),
+            }
+        )
+
+
+# Tout ce que montre la réunion active : ces compteurs font son ETag et la
+# version de son instantané.
+VERSIONS_ACTIVE = (
+    ("default",),
+    ("reunions",),
+    ("joueurs",),
+    ("parties",),
+    ("copains",),
+    ("cagnottes",),
+)
+
+
+@reunion_router.get("/active/", response_model=ReunionActive)
+@versions.suivre(*VERSIONS_ACTIVE)
+def reunion_active():
+    return ReponseJSON(instantane_reunion_active())
 
 
-@reunion_router.post("/active/{reunion_id}")
+@reunion_router.get("/active/compact", response_model=ReunionActiveCompacte)
+@versions.suivre(*VERSIONS_ACTIVE)
+def reunion_active_compacte():
+    return ReponseJSON(compacter_reunion_active(instantane_reunion_active()))
+
+
+def instantane_reunion_active():
+    if not parametre("instantanes_actifs", True):
+        return calculer_reunion_active()
+    return instantanes.lire(
+        "active", versions.etag(VERSIONS_ACTIVE), calculer_reunion_active
+    )
+
+
+def calculer_reunion_active():
+    with Session(moteur()) as session:
+        return construire_reunion_active(session)
+
+
+def construire_reunion_active(session: Session):
+    default = session.get(Default, 1)
+    if not default:
+        raise HTTPException(
+            status_code=404, detail="Pas de réunion par défault définie."
+        )
+    reunion_db = session.get(Reunion, default.reunion_id)
+    if not reunion_db:
+        raise HTTPException(
+            status_code=404, detail="Pas de réunion par défault définie."
+        )
+    cagnotte = session.get(Cagnotte, reunion_db.cagnotte_id)
+    if not cagnotte:
+        raise HTTPException(status_code=404, detail="Cagnotte introuvable.")
+    informations = construire_joueurs(session, reunion_db.id)
+    nombre_joueurs = 0
+    joueurs = []
+    if informations:
+        nombre_joueurs = informations["nombre_joueurs"]
+        joueurs = informations["joueurs"]
+    parties_db = session.exec(
+        projection(Partie, PartieLecture)
+        .where(Partie.reunion_id == reunion_db.id)
+        .order_by(Partie.id)
+    ).all()
+    parties_result = []
+    nombre_parties = 0
+    for partie in parties_db:
+        nombre_parties += 1
+        parties_result.append(decrire_partie(partie, nombre_parties))
+
+    payload = {
+        "reunion_id": reunion_db.id,
+        "reunion_nom": reunion_db.nom,
+        "cagnotte_id": cagnotte.id,
+        "cagnotte_nom": cagnotte.nom,
+        "nombre_joueurs": nombre_joueurs,
+        "joueurs": joueurs,
+        "nombre_parties": nombre_parties,
+        "parties": parties_result,
+    }
+    return payload
+
+
+@reunion_router.post("/active/{reunion_id}", response_model=Message)
 def definir_reunion_active(reunion_id: int):
-    with Session(engine) as session:
+    with Session(moteur()) as session:
         default_db = session.get(Default, 1)
         if not default_db:
             raise HTTPException(
@@ -173,92 +357,253 @@ def definir_reunion_active(reunion_id: int):
             raise HTTPException(status_code=404, detail="Réunion introuvable")
         default_db.reunion_id = reunion_id
         session.add(default_db)
+        versions.journaliser(session, "default")
         session.commit()
         session.refresh(default_db)
+        versions.incrementer("default")
+        publier_reunion_active(session)
         return {"message": "Réunion activée"}
 
 
-@reunion_router.get("/reunions/{cagnotte_id}")
-def liste_reunions(cagnotte_id: int):
-    with Session(engine) as session:
+@reunion_router.get("/reunions/{cagnotte_id}", response_model=List[ReunionLecture])
+@versions.suivre(("reunions", "{cagnotte_id}"))
+def liste_reunions(
+    cagnotte_id: int,
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    with Session(moteur()) as session:
         cagnotte = session.get(Cagnotte, cagnotte_id)
         if not cagnotte:
             raise HTTPException(status_code=404, detail="Cagnotte introuvable")
-        reunions_db = session.exec(
-            select(Reunion)
-            .where(Reunion.cagnotte_id == cagnotte_id)
-            .order_by(Reunion.nom.desc())
-        ).all()
-        return reunions_db
+    archive = archives.archive(cagnotte_id)
+    if archive is not None:
+        return lister_lignes(
+            archive.lignes(Reunion.__tablename__, list(ReunionLecture.__fields__)),
+            [Reunion.nom, Reunion.id],
+            apres,
+            limit,
+            format,
+            descendant=True,
+        )
+    return lister(
+        moteur(),
+        projection(Reunion, ReunionLecture).where(Reunion.cagnotte_id == cagnotte_id),
+        [Reunion.nom, Reunion.id],
+        apres,
+        limit,
+        format,
+        descendant=True,
+    )
+
 
+def verifier_modifiable(cagnotte_id: int):
+    if archives.archive(cagnotte_id) is not None:
+        raise HTTPException(
+            status_code=409, detail="Cagnotte archivée : la réactiver d'abord"
+        )
 
-@reunion_router.post("/reunions/{cagnotte_id}")
+
+@reunion_router.post("/reunions/{cagnotte_id}", response_model=Message)
 def ajout_reunion(cagnotte_id: int, reunion: ReunionCreation):
-    with Session(engine) as session:
+    verifier_modifiable(cagnotte_id)
+    with Session(moteur()) as session:
         cagnotte = session.get(Cagnotte, cagnotte_id)
         if not cagnotte:
             raise HTTPException(status_code=404, detail="Cagnotte introuvable")
         reunion_db = Reunion.from_orm(reunion)
         reunion_db.cagnotte_id = cagnotte.id
         session.add(reunion_db)
+        versions.journaliser(session, "reunions", cagnotte.id)
         session.commit()
         session.refresh(reunion_db)
+        versions.incrementer("reunions", cagnotte.id)
 
         definir_reunion_active(reunion_db.id)
 
         return {"message": "Réunion créée"}
 
 
-@reunion_router.post("/reunions/{reunion_id}/joueurs/")
-def ajout_joueur(reunion_id: int, joueur: JoueurAjout):
-    with Session(engine) as session:
-        joueur_db = Joueur.from_orm(joueur)
-        joueur_db.reunion_id = reunion_id
-        session.add(joueur_db)
+@reunion_router.post("/reunions/{cagnotte_id}/setup", response_model=ReunionActive)
+def preparation_reunion(cagnotte_id: int, preparation: ReunionPreparation):
+    with Session(moteur()) as session:
+        payload = preparer_reunion(session, cagnotte_id, preparation)
         session.commit()
-        session.refresh(joueur_db)
-        return {"message": "Joueur ajouté"}
+    publier_preparation(cagnotte_id, payload)
+    return ReponseJSON(payload)
 
 
-@reunion_router.patch("/reunions/{reunion_id}/joueurs/{copain_id}")
-def mise_a_jour_joueur(reunion_id: int, copain_id: int, joueur: JoueurUpdate):
-    with Session(engine) as session:
-        db_joueur = session.exec(
-            select(Joueur)
-            .where(Joueur.reunion_id == reunion_id)
-            .where(Joueur.copain_id == copain_id)
-        ).one_or_none()
-        if not db_joueur:
-            raise HTTPException(status_code=404, detail="Joueur introuvable")
-        joueur_data = joueur.dict(exclude_unset=True)
-        for key, value in joueur_data.items():
-            setattr(db_joueur, key, value)
-        session.add(db_joueur)
+def preparer_reunion(
+    session: Session, cagnotte_id: int, preparation: ReunionPreparation
+):
+    copain_ids = [joueur.copain_id for joueur in preparation.joueurs]
+    if len(set(copain_ids)) != len(copain_ids):
+        raise HTTPException(status_code=422, detail="Copain présent deux fois")
+    if not session.get(Cagnotte, cagnotte_id):
+        raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    verifier_modifiable(cagnotte_id)
+    connus = session.exec(select(Copain.id).where(Copain.id.in_(copain_ids))).all()
+    if len(connus) != len(copain_ids):
+        raise HTTPException(status_code=404, detail="Copain introuvable")
+    default_db = session.get(Default, 1)
+    if not default_db:
+        raise HTTPException(
+            status_code=404, detail="Pas de paramètres par défault définis."
+        )
+    reunion_db = Reunion(nom=preparation.nom, cagnotte_id=cagnotte_id)
+    session.add(reunion_db)
+    session.flush()
+    session.add_all(
+        Joueur(reunion_id=reunion_db.id, **joueur.dict())
+        for joueur in preparation.joueurs
+    )
+    default_db.reunion_id = reunion_db.id
+    session.add(default_db)
+    session.flush()
+    for joueur in preparation.joueurs:
+        if joueur.dette_active:
+            enregistrer_dettes(session, joueur.copain_id)
+    versions.journaliser(session, "reunions", cagnotte_id)
+    versions.journaliser(session, "joueurs", reunion_db.id)
+    versions.journaliser(session, "default")
+    return construire_reunion_active(session)
+
+
+def publier_preparation(cagnotte_id: int, payload: dict):
+    versions.incrementer("reunions", cagnotte_id)
+    versions.incrementer("joueurs", payload["reunion_id"])
+    versions.incrementer("default")
+    if diffuseur.abonnes:
+        diffuseur.publier({"type": "reunion", **payload})
+
+
+# Écritures des routes chaudes : une opération reçoit la session, ne valide
+# pas et rend des valeurs utilisables une fois la session fermée. Avec
+# ecritures_groupees, elles passent par la file d'un seul fil écrivain.
+def ecrire(operation, *args):
+    if parametre("ecritures_groupees", False):
+        return ecritures.soumettre(operation, *args)
+    with Session(moteur()) as session:
+        resultat = operation(session, *args)
         session.commit()
-        session.refresh(db_joueur)
-        return {"message": "Joueur mis à jour"}
+        return resultat
 
 
-@copain_router.get("/copains/")
-def liste_copains():
-    with Session(engine) as session:
-        copains_db = session.exec(select(Copain)).all()
-        return copains_db
+def inserer_joueur(session: Session, reunion_id: int, joueur: JoueurAjout):
+    # Contrôlé avant l'écriture : la réponse ne dépend pas d'un abonné au
+    # direct qui relirait les joueurs après coup.
+    if not session.get(Reunion, reunion_id):
+        raise HTTPException(status_code=404, detail="Réunion introuvable")
+    if not session.get(Copain, joueur.copain_id):
+        raise HTTPException(status_code=404, detail="Copain introuvable")
+    joueur_db = Joueur.from_orm(joueur)
+    joueur_db.reunion_id = reunion_id
+    joueur_db.partie_arrivee = (
+        session.exec(
+            select(func.max(Partie.id)).where(Partie.reunion_id == reunion_id)
+        ).one()
+        or 0
+    )
+    session.add(joueur_db)
+    enregistrer_dettes(session, joueur_db.copain_id)
+    versions.journaliser(session, "joueurs", reunion_id)
+    session.flush()
+
+
+def modifier_joueur(
+    session: Session, reunion_id: int, copain_id: int, joueur: JoueurUpdate
+):
+    db_joueur = session.get(Joueur, (reunion_id, copain_id))
+    if not db_joueur:
+        raise HTTPException(status_code=404, detail="Joueur introuvable")
+    for key, value in joueur.dict(exclude_unset=True).items():
+        setattr(db_joueur, key, value)
+    session.add(db_joueur)
+    enregistrer_dettes(session, copain_id)
+    versions.journaliser(session, "joueurs", reunion_id)
+    session.flush()
 
 
-@copain_router.post("/copains/")
+@reunion_router.post("/reunions/{reunion_id}/joueurs/", response_model=Message)
+def ajout_joueur(reunion_id: int, joueur: JoueurAjout):
+    ecrire(inserer_joueur, reunion_id, joueur)
+    versions.incrementer("joueurs", reunion_id)
+    with Session(moteur()) as session:
+        publier_joueurs(session, reunion_id)
+    return {"message": "Joueur ajouté"}
+
+
+@reunion_router.patch(
+    "/reunions/{reunion_id}/joueurs/{copain_id}", response_model=Message
+)
+def mise_a_jour_joueur(reunion_id: int, copain_id: int, joueur: JoueurUpdate):
+    ecrire(modifier_joueur, reunion_id, copain_id, joueur)
+    versions.incrementer("joueurs", reunion_id)
+    with Session(moteur()) as session:
+        publier_dettes(session)
+    return {"message": "Joueur mis à jour"}
+
+
+@copain_router.get("/copains/", response_model=List[CopainLecture])
+@versions.suivre(("copains",))
+def liste_copains(
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    if limit is None and apres is None and format == "json":
+        return lire_copains()
+    return lister(
+        moteur(), projection(Copain, CopainLecture), [Copain.id], apres, limit, format
+    )
+
+
+@cache.memoriser("copains")
+def lire_copains():
+    with Session(moteur()) as session:
+        copains_db = session.exec(
+            projection(Copain, CopainLecture).order_by(Copain.id)
+        ).all()
+        return [en_dict(copain) for copain in copains_db]
+
+
+@copain_router.get("/copains/{copain_id}/dettes", response_model=DettesCopain)
+@versions.suivre(("joueurs",))
+def dettes_copain(copain_id: int):
+    with Session(moteur()) as session:
+        return lire_dettes_copain(session, copain_id)
+
+
+def lire_dettes_copain(session: Session, copain_id: int):
+    dette = session.get(DetteCopain, copain_id)
+    if dette:
+        return {
+            "copain_id": copain_id,
+            "total": dette.total,
+            "reunions": dette.reunions,
+        }
+    if not session.get(Copain, copain_id):
+        raise HTTPException(status_code=404, detail="Copain introuvable")
+    return {"copain_id": copain_id, "total": 0, "reunions": []}
+
+
+@copain_router.post("/copains/", response_model=CopainLecture)
 def creation_copain(copain: CopainCreation):
-    with Session(engine) as session:
+    with Session(moteur()) as session:
         copain_db = Copain.from_orm(copain)
         session.add(copain_db)
+        versions.journaliser(session, "copains")
         session.commit()
+        cache.invalider("copains")
+        versions.incrementer("copains")
         session.refresh(copain_db)
         return copain_db
 
 
-@copain_router.patch("/copains/{copain_id}")
+@copain_router.patch("/copains/{copain_id}", response_model=Message)
 def mise_a_jour_copain(copain_id: int, copain: CopainCreation):
-    with Session(engine) as session:
+    with Session(moteur()) as session:
         db_copain = session.get(Copain, copain_id)
         if not db_copain:
             raise HTTPException(status_code=404, detail="Copain introuvable")
@@ -266,44 +611,75 @@ def mise_a_jour_copain(copain_id: int, copain: CopainCreation):
         for key, value in copain_data.items():
             setattr(db_copain, key, value)
         session.add(db_copain)
+        versions.journaliser(session, "copains")
         session.commit()
+        cache.invalider("copains")
+        versions.incrementer("copains")
         session.refresh(db_copain)
         return {"message": "Copain mis à jour"}
 
 
-@cagnotte_router.get("/cagnottes/")
-def liste_cagnottes():
-    with Session(engine) as session:
-        cagnottes_db = session.exec(
-            select(Cagnotte).where(Cagnotte.est_favori).order_by(Cagnotte.nom.desc())
-        ).all()
-        return cagnottes_db
+@cagnotte_router.get("/cagnottes/", response_model=List[CagnotteLecture])
+@versions.suivre(("cagnottes",))
+def liste_cagnottes(
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    return lister_cagnottes(True, limit, apres, format)
 
 
-@cagnotte_router.get("/cagnottes/archives/")
-def liste_cagnottes_archivees():
-    with Session(engine) as session:
+@cagnotte_router.get("/cagnottes/archives/", response_model=List[CagnotteLecture])
+@versions.suivre(("cagnottes",))
+def liste_cagnottes_archivees(
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    return lister_cagnottes(False, limit, apres, format)
+
+
+def lister_cagnottes(est_favori: bool, limit, apres, format):
+    if limit is None and apres is None and format == "json":
+        return lire_cagnottes(est_favori)
+    return lister(
+        moteur(),
+        projection(Cagnotte, CagnotteLecture).where(Cagnotte.est_favori == est_favori),
+        [Cagnotte.nom, Cagnotte.id],
+        apres,
+        limit,
+        format,
+        descendant=True,
+    )
+
+
+@cache.memoriser("cagnottes")
+def lire_cagnottes(est_favori: bool):
+    with Session(moteur()) as session:
         cagnottes_db = session.exec(
-            select(Cagnotte)
-            .where(Cagnotte.est_favori == 0)
-            .order_by(Cagnotte.nom.desc())
+            projection(Cagnotte, CagnotteLecture)
+            .where(Cagnotte.est_favori == est_favori)
+            .order_by(Cagnotte.nom.desc(), Cagnotte.id.desc())
         ).all()
-        return cagnottes_db
+        return [en_dict(cagnotte) for cagnotte in cagnottes_db]
 
 
-@cagnotte_router.post("/cagnottes/")
+@cagnotte_router.post("/cagnottes/", response_model=CagnotteLecture)
 def creation_cagnotte(cagnotte: CagnotteCreation):
-    with Session(engine) as session:
+    with Session(moteur()) as session:
         cagnotte_db = Cagnotte.from_orm(cagnotte)
         session.add(cagnotte_db)
+        versions.journaliser(session, "cagnottes")
         session.commit()
+        cache.invalider("cagnottes")
+        versions.incrementer("cagnottes")
         session.refresh(cagnotte_db)
         return cagnotte_db
 
 
-@cagnotte_router.patch("/cagnottes/{cagnotte_id}")
+@cagnotte_router.patch("/cagnottes/{cagnotte_id}", response_model=Message)
 def mise_a_jour_cagnotte(cagnotte_id: int, cagnotte: CagnotteCreation):
-    with Session(engine) as session:
+    with Session(moteur()) as session:
         db_cagnotte = session.get(Cagnotte, cagnotte_id)
         if not db_cagnotte:
             raise HTTPException(status_code=404, detail="Cagnotte introuvable")
@@ -311,77 +687,520 @@ def mise_a_jour_cagnotte(cagnotte_id: int, cagnotte: CagnotteCreation):
         for key, value in cagnotte_data.items():
             setattr(db_cagnotte, key, value)
         session.add(db_cagnotte)
+        versions.journaliser(session, "cagnottes")
         session.commit()
+        cache.invalider("cagnottes")
+        versions.incrementer("cagnottes")
         session.refresh(db_cagnotte)
         return {"message": "Cagnotte mise à jour"}
 
 
-@cagnotte_router.post("/cagnottes/{cagnotte_id}/archive")
-def archive_cagnotte(cagnotte_id: int):
-    with Session(engine) as session:
+@cagnotte_router.post("/cagnottes/{cagnotte_id}/archive", response_model=Message)
+def archive_cagnotte(cagnotte_id: int, stockage_froid: bool = False):
+    with Session(moteur()) as session:
         db_cagnotte = session.get(Cagnotte, cagnotte_id)
         if not db_cagnotte:
             raise HTTPException(status_code=404, detail="Cagnotte introuvable")
         db_cagnotte.est_favori = False
         session.add(db_cagnotte)
-        session.commit()
+        versions.journaliser(session, "cagnottes")
+        if stockage_froid and archives.archive(cagnotte_id) is None:
+            verifier_stockage_froid(session, cagnotte_id)
+            archives.archiver(session, cagnotte_id)
+        else:
+            session.commit()
+        cache.invalider("cagnottes")
+        versions.incrementer("cagnottes")
         return {"message": "Cagnotte archivée"}
 
 
-@cagnotte_router.post("/cagnottes/{cagnotte_id}/active")
+@cagnotte_router.post("/cagnottes/{cagnotte_id}/active", response_model=Message)
 def active_cagnotte(cagnotte_id: int):
-    with Session(engine) as session:
+    with Session(moteur()) as session:
         db_cagnotte = session.get(Cagnotte, cagnotte_id)
         if not db_cagnotte:
             raise HTTPException(status_code=404, detail="Cagnotte introuvable")
         db_cagnotte.est_favori = True
         session.add(db_cagnotte)
-        session.commit()
+        versions.journaliser(session, "cagnottes")
+        if archives.archive(cagnotte_id) is not None:
+            archives.restaurer(session, cagnotte_id)
+        else:
+            session.commit()
+        cache.invalider("cagnottes")
+        versions.incrementer("cagnottes")
         return {"message": "Cagnotte activée"}
 
 
-@contrat_router.get("/contrats/")
+def verifier_stockage_froid(session: Session, cagnotte_id: int):
+    default_db = session.get(Default, 1)
+    reunion = session.get(Reunion, default_db.reunion_id) if default_db else None
+    if reunion and reunion.cagnotte_id == cagnotte_id:
+        raise HTTPException(
+            status_code=409, detail="La réunion active appartient à cette cagnotte"
+        )
+    dette = session.exec(
+        select(Joueur.copain_id)
+        .join(Reunion, Reunion.id == Joueur.reunion_id)
+        .where(Reunion.cagnotte_id == cagnotte_id, Joueur.dette_active)
+        .limit(1)
+    ).first()
+    if dette is not None:
+        raise HTTPException(
+            status_code=409, detail="Dettes actives dans cette cagnotte"
+        )
+
+
+@cagnotte_router.get(
+    "/cagnottes/{cagnotte_id}/stats", response_model=StatistiquesCagnotte
+)
+def statistiques_cagnotte(cagnotte_id: int):
+    with Session(moteur()) as session:
+        cagnotte = session.get(Cagnotte, cagnotte_id)
+        if not cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    archive = archives.archive(cagnotte_id)
+    if archive is not None:
+        return resumer(archive.parties())
+    with moteur().connect() as connection:
+        return statistiques(connection, cagnotte_id)
+
+
+# Ce dont dépend une projection : elle reste servie jusqu'à la prochaine
+# partie de la cagnotte.
+VERSIONS_PROJECTIONS = (
+    ("parties_cagnotte", "{cagnotte_id}"),
+    ("cagnottes",),
+    ("copains",),
+)
+
+
+@cagnotte_router.get(
+    "/cagnottes/{cagnotte_id}/projections", response_model=ProjectionsCagnotte
+)
+@versions.suivre(*VERSIONS_PROJECTIONS)
+async def projections_cagnotte(
+    cagnotte_id: int, reunions: int = 10, simulations: int = 20000, graine: int = 0
+):
+    verifier_projection(reunions, simulations, graine)
+    return await projections.lire_async(
+        cagnotte_id,
+        (version_projection(cagnotte_id), reunions, simulations, graine),
+        lambda: projeter(cagnotte_id, reunions, simulations, graine),
+    )
+
+
+async def projeter(cagnotte_id: int, reunions: int, simulations: int, graine: int):
+    modele = await run_in_threadpool(lire_modele_projection, cagnotte_id)
+    return await simulateur.projeter(modele, reunions, simulations, graine)
+
+
+def lire_modele_projection(cagnotte_id: int):
+    with Session(moteur()) as session:
+        if not session.get(Cagnotte, cagnotte_id):
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    with moteur().connect() as connection:
+        return modele_projection(connection, cagnotte_id)
+
+
+def modele_projection(connection, cagnotte_id: int):
+    if archives.archive(cagnotte_id) is not None:
+        raise HTTPException(status_code=409, detail="Cagnotte archivée")
+    modele = lire_modele(connection, cagnotte_id)
+    if modele is None:
+        raise HTTPException(
+            status_code=409, detail="Aucune partie jouée dans cette cagnotte"
+        )
+    return modele
+
+
+def version_projection(cagnotte_id: int) -> str:
+    return versions.etag(
+        tuple(partie.format(cagnotte_id=cagnotte_id) for partie in modele)
+        for modele in VERSIONS_PROJECTIONS
+    )
+
+
+def verifier_projection(reunions: int, simulations: int, graine: int):
+    if not 1 <= reunions <= parametre("projections_reunions_max", 100):
+        raise HTTPException(status_code=422, detail="reunions hors limites")
+    if not 1 <= simulations <= parametre("projections_simulations_max", 1000000):
+        raise HTTPException(status_code=422, detail="simulations hors limites")
+    if graine < 0:
+        raise HTTPException(status_code=422, detail="graine doit être positive")
+
+
+@contrat_router.get("/contrats/", response_model=List[ContratLecture])
+@versions.suivre(("contrats",))
+@cache.memoriser("contrats")
 def liste_contrats():
-    with Session(engine) as session:
-        contrats_db = session.exec(select(Contrat)).all()
-        return contrats_db
+    with Session(moteur()) as session:
+        contrats_db = session.exec(projection(Contrat, ContratLecture)).all()
+        return [en_dict(contrat) for contrat in contrats_db]
 
 
-@partie_router.get("/parties/{reunion_id}")
-def liste_parties_par_reunion(reunion_id: int):
-    with Session(engine) as session:
-        parties_db = session.exec(
-            select(Partie).where(Partie.reunion_id == reunion_id)
-        ).all()
-        return parties_db
+@partie_router.get("/parties/{reunion_id}", response_model=List[PartieLecture])
+@versions.suivre(("parties", "{reunion_id}"))
+def liste_parties_par_reunion(
+    reunion_id: int,
+    limit: Optional[int] = None,
+    apres: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    archive = archives.archive_reunion(reunion_id)
+    if archive is not None:
+        return lister_lignes(
+            archive.lignes(
+                Partie.__tablename__,
+                list(PartieLecture.__fields__),
+                *archive.tranche(Partie.__tablename__, reunion_id),
+            ),
+            [Partie.id],
+            apres,
+            limit,
+            format,
+        )
+    return lister(
+        moteur(),
+        projection(Partie, PartieLecture).where(Partie.reunion_id == reunion_id),
+        [Partie.id],
+        apres,
+        limit,
+        format,
+    )
+
+
+def inserer_partie(session: Session, reunion_id: int, partie: PartieCreation):
+    reunion = session.get(Reunion, reunion_id)
+    if not reunion:
+        raise HTTPException(status_code=404, detail="Réunion introuvable")
+    verifier_references_partie(session, partie)
+    partie_db = Partie.from_orm(partie)
+    partie_db.reunion_id = reunion_id
+    session.add(partie_db)
+    gains = enregistrer_partie(session, partie_db, reunion)
+    versions.journaliser(session, "parties", reunion_id)
+    versions.journaliser(session, "parties_cagnotte", reunion.cagnotte_id)
+    session.flush()
+    return Partie(**partie_db.dict()), reunion.cagnotte_id, list(gains)
+
+
+# Mêmes contrôles que importation.verifier pour une partie seule : un
+# contrat ou un copain inconnu n'entre ni dans la table ni dans les scores.
+def verifier_references_partie(session: Session, partie: PartieCreation):
+    if not session.get(Contrat, partie.contrat_id):
+        raise HTTPException(status_code=404, detail="Contrat introuvable")
+    copain_ids = {
+        copain_id
+        for copain_id in (partie.preneur_id, partie.appel_id, partie.petit_au_bout)
+        if copain_id is not None
+    }
+    connus = session.exec(select(Copain.id).where(Copain.id.in_(copain_ids))).all()
+    if len(connus) != len(copain_ids):
+        raise HTTPException(status_code=404, detail="Copain introuvable")
 
 
-@partie_router.post("/parties/{reunion_id}")
+@partie_router.post("/parties/{reunion_id}", response_model=Message)
 def ajout_partie(reunion_id: int, partie: PartieCreation):
-    with Session(engine) as session:
-        partie_db = Partie.from_orm(partie)
-        partie_db.reunion_id = reunion_id
-        session.add(partie_db)
-        session.commit()
-        session.refresh(partie_db)
-        return {"message": "Partie ajoutée"}
+    partie_db, cagnotte_id, gains = ecrire(inserer_partie, reunion_id, partie)
+    with Session(moteur()) as session:
+        classements.actualiser(session, cagnotte_id, gains)
+        versions.incrementer("parties", reunion_id)
+        versions.incrementer("parties_cagnotte", cagnotte_id)
+        publier_partie(session, partie_db)
+    return {"message": "Partie ajoutée"}
+
+
+# Trace de l'import dans chaque lot validé, comme pour une partie seule.
+def journaliser_parties(reunion: Reunion, connection):
+    versions.journaliser(connection, "parties", reunion.id)
+    versions.journaliser(connection, "parties_cagnotte", reunion.cagnotte_id)
 
 
-app.include_router(copain_router)
-app.include_router(cagnotte_router)
-app.include_router(reunion_router)
-app.include_router(partie_router)
-app.include_router(contrat_router)
+@partie_router.post("/parties/{reunion_id}/bulk")
+def ajout_parties(reunion_id: int, parties: List[PartieCreation]):
+    with Session(moteur()) as session:
+        reunion = session.get(Reunion, reunion_id)
+        if not reunion:
+            raise HTTPException(status_code=404, detail="Réunion introuvable")
+    with moteur().connect() as connection:
+        rapport = importer(
+            connection,
+            enumerate(parties),
+            reunion_id,
+            journal=partial(journaliser_parties, reunion),
+        )
+    if rapport["importees"]:
+        versions.incrementer("parties", reunion_id)
+        versions.incrementer("parties_cagnotte", reunion.cagnotte_id)
+        with Session(moteur()) as session:
+            classements.actualiser(session, reunion.cagnotte_id)
+            publier_reunion_active(session)
+    return rapport
+
+
+@partie_router.get("/reunions/{reunion_id}/scores", response_model=List[ScoreLecture])
+@versions.suivre(("parties", "{reunion_id}"), ("copains",))
+def scores_reunion(reunion_id: int):
+    archive = archives.archive_reunion(reunion_id)
+    with Session(moteur()) as session:
+        if archive is not None:
+            return lire_scores_archives(session, archive, reunion_id)
+        reunion = session.get(Reunion, reunion_id)
+        if not reunion:
+            raise HTTPException(status_code=404, detail="Réunion introuvable")
+        scores_db = session.exec(
+            select(
+                ScoreReunion.copain_id,
+                Copain.nom.label("copain_nom"),
+                ScoreReunion.total,
+                ScoreReunion.nombre_parties,
+            )
+            .join(Copain)
+            .where(ScoreReunion.reunion_id == reunion_id)
+            .order_by(ScoreReunion.total.desc(), Copain.nom)
+        ).all()
+        return [en_dict(score) for score in scores_db]
+
+
+def lire_scores_archives(session: Session, archive, reunion_id: int):
+    scores = archive.lignes(
+        ScoreReunion.__tablename__,
+        ["copain_id", "total", "nombre_parties"],
+        *archive.tranche(ScoreReunion.__tablename__, reunion_id),
+    )
+    noms = dict(
+        session.exec(
+            select(Copain.id, Copain.nom).where(
+                Copain.id.in_([score["copain_id"] for score in scores])
+            )
+        ).all()
+    )
+    return sorted(
+        (
+            {
+                "copain_id": score["copain_id"],
+                "copain_nom": noms[score["copain_id"]],
+                "total": score["total"],
+                "nombre_parties": score["nombre_parties"],
+            }
+            for score in scores
+            if score["copain_id"] in noms
+        ),
+        key=lambda score: (-score["total"], score["copain_nom"]),
+    )
+
+
+@partie_router.get("/cagnottes/{cagnotte_id}/scores", response_model=List[ScoreLecture])
+@versions.suivre(("parties",), ("copains",))
+def scores_cagnotte(cagnotte_id: int):
+    with Session(moteur()) as session:
+        cagnotte = session.get(Cagnotte, cagnotte_id)
+        if not cagnotte:
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+        scores_db = session.exec(
+            select(
+                ScoreCagnotte.copain_id,
+                Copain.nom.label("copain_nom"),
+                ScoreCagnotte.total,
+                ScoreCagnotte.nombre_parties,
+            )
+            .join(Copain)
+            .where(ScoreCagnotte.cagnotte_id == cagnotte_id)
+            .order_by(ScoreCagnotte.total.desc(), Copain.nom)
+        ).all()
+        return [en_dict(score) for score in scores_db]
+
+
+def lire_classement(session: Session, cagnotte_id: int, lecture):
+    if not session.get(Cagnotte, cagnotte_id):
+        raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+    return classements.lire(session, cagnotte_id, lecture)
+
+
+def verifier_voisinage(rang: int, rayon: int):
+    if rang < 1 or rayon < 0:
+        raise HTTPException(
+            status_code=422, detail="rang doit être positif et rayon positif ou nul"
+        )
+    verifier_limite(2 * rayon + 1)
+
+
+@partie_router.get(
+    "/cagnottes/{cagnotte_id}/classement", response_model=List[PlaceClassement]
+)
+@versions.suivre(("parties",), ("copains",))
+def classement_cagnotte(cagnotte_id: int, limit: int = 10):
+    verifier_limite(limit)
+    with Session(moteur()) as session:
+        return ReponseJSON(
+            lire_classement(session, cagnotte_id, lambda c: c.premiers(limit))
+        )
+
+
+@partie_router.get(
+    "/cagnottes/{cagnotte_id}/classement/voisins",
+    response_model=List[PlaceClassement],
+)
+@versions.suivre(("parties",), ("copains",))
+def voisins_classement(cagnotte_id: int, rang: int, rayon: int = 2):
+    verifier_voisinage(rang, rayon)
+    with Session(moteur()) as session:
+        return ReponseJSON(
+            lire_classement(session, cagnotte_id, lambda c: c.voisins(rang, rayon))
+        )
+
+
+@partie_router.get(
+    "/cagnottes/{cagnotte_id}/classement/{copain_id}", response_model=PlaceClassement
+)
+@versions.suivre(("parties",), ("copains",))
+def place_classement(cagnotte_id: int, copain_id: int):
+    with Session(moteur()) as session:
+        places = lire_classement(session, cagnotte_id, lambda c: c.place(copain_id))
+    if not places:
+        raise HTTPException(status_code=404, detail="Copain absent du classement")
+    return ReponseJSON(places[0])
+
+
+@partie_router.post(
+    "/cagnottes/{cagnotte_id}/classement/reconstruire", response_model=Message
+)
+def reconstruction_classement(cagnotte_id: int):
+    with Session(moteur()) as session:
+        if not session.get(Cagnotte, cagnotte_id):
+            raise HTTPException(status_code=404, detail="Cagnotte introuvable")
+        classements.reconstruire(session, cagnotte_id)
+    return {"message": "Classement reconstruit"}
+
+
+@direct_router.websocket("/active/direct")
+async def direct_reunion_active(websocket: WebSocket):
+    await websocket.accept()
+    file = diffuseur.abonner()
+    deconnexion = asyncio.create_task(attendre_deconnexion(websocket))
+    try:
+        message = RESYNCHRONISER
+        while True:
+            if message is RESYNCHRONISER:
+                try:
+                    instantane = await run_in_threadpool(instantane_reunion_active)
+                except HTTPException as exception:
+                    await websocket.close(code=4000 + exception.status_code)
+                    return
+                message = {"type": "reunion", **instantane}
+            await websocket.send_json(message)
+            attente = asyncio.create_task(file.get())
+            await asyncio.wait(
+                {attente, deconnexion}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if deconnexion.done():
+                attente.cancel()
+                return
+            message = attente.result()
+    finally:
+        deconnexion.cancel()
+        diffuseur.desabonner(file)
+
+
+async def attendre_deconnexion(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@cache_router.get("/cache/")
+def statistiques_cache():
+    return cache.statistiques()
+
+
+@metriques_router.get("/metrics", response_class=PlainTextResponse)
+def metriques():
+    texte = mesures.exposer()
+    if parametre("ecritures_groupees", False):
+        texte += ecritures.exposer()
+    if parametre("instantanes_actifs", True):
+        texte += instantanes.exposer()
+    return PlainTextResponse(texte, media_type=TYPE_PROMETHEUS)
+
+
+@clubs_router.get("/clubs/")
+def etat_clubs():
+    return registre.etat()
+
+
+def ecouter_club(club):
+    mesures.ecouter(club.engine)
+    if club.moteur_async is not None:
+        mesures.ecouter(club.moteur_async.sync_engine)
+
+
+if parametre("mode_base", "sync") == "async":
+    from asynchrone import fermer, routers
+
+    app.add_event_handler("shutdown", fermer)
+else:
+    routers = [
+        copain_router,
+        cagnotte_router,
+        reunion_router,
+        partie_router,
+        contrat_router,
+    ]
+for router in routers:
+    app.include_router(router)
+app.include_router(cache_router)
+app.include_router(direct_router)
+if parametre("clubs_separes", False):
+    app.include_router(clubs_router)
+    app.add_event_handler("startup", registre.lancer_veille)
+    app.add_event_handler("shutdown", registre.arreter)
+elif parametre("multi_processus", False):
+    app.add_event_handler("startup", coordination.lancer_veille)
+    app.add_event_handler("shutdown", coordination.arreter_veille)
+if parametre("instrumentation", False):
+    app.include_router(metriques_router)
+    registre.ecouteurs.append(ecouter_club)
+if parametre("ecritures_groupees", False):
+    app.add_event_handler("shutdown", ecritures.arreter)
+app.add_event_handler("shutdown", simulateur.arreter)
 
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
-    fixtures()
+    if parametre("clubs_separes", False):
+        print(f"Une base par club dans {registre.dossier}/")
+        return
+    if parametre("multi_processus", False):
+        with verrou_fichier(f"{sqlite_file_name}.lock"):
+            app.state.demarrage = amorcer(
+                engine, sqlite_file_name, parametre("base_modele", None)
+            )
+        coordination.demarrer()
+    else:
+        app.state.demarrage = amorcer(
+            engine, sqlite_file_name, parametre("base_modele", None)
+        )
+    archives.charger()
+    with Session(engine) as session:
+        classements.reconstruire(session)
+        archives.reserver(session)
+    if parametre("ecritures_groupees", False):
+        ecritures.demarrer(engine)
+    print(f"Démarrage en {app.state.demarrage['duree']:.3f} s")
+
+
+@app.get("/demarrage/", tags=["Démarrage"])
+def temps_demarrage():
+    club = club_courant.get()
+    return {
+        "version": parametre("version", None),
+        "processus": os.getpid(),
+        **(app.state.demarrage if club is None else club.demarrage),
+    }
 
 
 @app.on_event("shutdown")
-def on_startup():
+def on_shutdown():
     with Session(engine) as session:
         session.close()
         print("Ciao ciao")
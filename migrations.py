@@ -0,0 +1,116 @@
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlmodel import Session
+
+import dettes
+import scores
+from models import Partie, Reunion
+
+
+def reconstruire_scores(connection: Connection):
+    with Session(bind=connection) as session:
+        scores.reconstruire(session)
+        session.flush()
+
+
+def reconstruire_dettes(connection: Connection):
+    with Session(bind=connection) as session:
+        dettes.reconstruire(session)
+        session.flush()
+
+
+# ALTER TABLE n'a pas de IF NOT EXISTS : une base neuve a déjà la colonne
+# par create_all avant de passer les migrations.
+def ajouter_colonne(table: str, colonne: str, definition: str):
+    def ajouter(connection: Connection):
+        existantes = {
+            ligne[1]
+            for ligne in connection.exec_driver_sql(f"PRAGMA table_info({table})")
+        }
+        if colonne not in existantes:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table} ADD COLUMN {colonne} {definition}"
+            )
+
+    return ajouter
+
+
+# Les reconstructions passent par les modèles d'aujourd'hui : la colonne doit
+# exister avant, même sur une base qui n'a pas encore atteint sa version.
+ajouter_partie_arrivee = ajouter_colonne(
+    "joueur", "partie_arrivee", "INTEGER NOT NULL DEFAULT 0"
+)
+
+
+# SQLite n'ajoute AUTOINCREMENT qu'en recréant la table : copie sous un autre
+# nom, suppression de l'ancienne, renommage. Les clés étrangères des autres
+# tables la désignent par son nom et la retrouvent. sqlite_sequence part du
+# plus grand id copié.
+def autoincrement(table: Table):
+    def recreer(connection: Connection):
+        creation = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table.name,),
+        ).scalar()
+        if "AUTOINCREMENT" in creation.upper():
+            return
+        provisoire = f"{table.name}_autoincrement"
+        existantes = {
+            ligne[1]
+            for ligne in connection.exec_driver_sql(f"PRAGMA table_info({table.name})")
+        }
+        colonnes = ", ".join(c.name for c in table.columns if c.name in existantes)
+        connection.exec_driver_sql(
+            str(CreateTable(table).compile(dialect=connection.dialect)).replace(
+                f"CREATE TABLE {table.name} (", f"CREATE TABLE {provisoire} (", 1
+            )
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO {provisoire} ({colonnes}) "
+            f"SELECT {colonnes} FROM {table.name}"
+        )
+        connection.exec_driver_sql(f"DROP TABLE {table.name}")
+        connection.exec_driver_sql(f"ALTER TABLE {provisoire} RENAME TO {table.name}")
+        for index in table.indexes:
+            connection.execute(CreateIndex(index))
+
+    return recreer
+
+
+# Chaque entrée est une version du schéma : la base est à la version N quand
+# les N premières entrées ont été appliquées (PRAGMA user_version). Une étape
+# est une instruction SQL ou une fonction recevant la connexion.
+migrations = [
+    [
+        "CREATE INDEX IF NOT EXISTS ix_partie_reunion_id ON partie (reunion_id)",
+        "CREATE INDEX IF NOT EXISTS ix_joueur_copain_id_dette_active "
+        "ON joueur (copain_id, dette_active)",
+        "CREATE INDEX IF NOT EXISTS ix_reunion_cagnotte_id_nom "
+        "ON reunion (cagnotte_id, nom)",
+        "CREATE INDEX IF NOT EXISTS ix_cagnotte_est_favori_nom "
+        "ON cagnotte (est_favori, nom)",
+    ],
+    [ajouter_partie_arrivee, reconstruire_scores],
+    [reconstruire_dettes],
+    # Les joueurs existants comptent dès la première partie ; les scores ne
+    # sont pas recalculés, ils restent ceux enregistrés partie par partie.
+    [ajouter_partie_arrivee],
+    [autoincrement(Reunion.__table__), autoincrement(Partie.__table__)],
+]
+
+
+def version_schema(connection: Connection) -> int:
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrer(engine: Engine):
+    with engine.begin() as connection:
+        version = version_schema(connection)
+        for numero, instructions in enumerate(migrations[version:], start=version + 1):
+            for instruction in instructions:
+                if callable(instruction):
+                    instruction(connection)
+                else:
+                    connection.exec_driver_sql(instruction)
+            connection.exec_driver_sql(f"PRAGMA user_version = {numero}")
@@ -1,4 +1,5 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
+from sqlalchemy import JSON, Column, Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -8,6 +9,8 @@ class Default(SQLModel, table=True):
 
 
 class Cagnotte(SQLModel, table=True):
+    __table_args__ = (Index("ix_cagnotte_est_favori_nom", "est_favori", "nom"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     nom: str = Field(index=True)
     est_favori: bool = Field(default=True)
@@ -26,6 +29,10 @@ class Contrat(SQLModel, table=True):
 
 
 class Joueur(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_joueur_copain_id_dette_active", "copain_id", "dette_active"),
+    )
+
     reunion_id: Optional[int] = Field(
         default=None, foreign_key="reunion.id", primary_key=True
     )
@@ -35,6 +42,9 @@ class Joueur(SQLModel, table=True):
     est_guest: bool = Field(default=False)
     dette_active: Optional[bool] = Field(default=False)
     dette: Optional[int] = Field(default=0)
+    # Plus grand id de partie de la réunion à l'arrivée du joueur : il ne
+    # compte que dans les parties d'id supérieur (0 : présent dès le début).
+    partie_arrivee: int = Field(default=0)
 
     reunions: "Reunion" = Relationship(back_populates="liens_copains")
     copains: "Copain" = Relationship(back_populates="liens_reunions")
@@ -50,7 +60,19 @@ class JoueurUpdate(SQLModel):
     dette: int
 
 
+class JoueurPreparation(JoueurAjout):
+    dette_active: bool = False
+    dette: int = 0
+
+
+# AUTOINCREMENT : un id libéré par l'archivage froid n'est jamais repris, la
+# restauration le retrouve libre.
 class Reunion(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_reunion_cagnotte_id_nom", "cagnotte_id", "nom"),
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     nom: str = Field(index=True)
     cagnotte_id: int = Field(default=None, foreign_key="cagnotte.id")
@@ -61,6 +83,10 @@ class ReunionCreation(SQLModel):
     nom: str
 
 
+class ReunionPreparation(ReunionCreation):
+    joueurs: List[JoueurPreparation] = []
+
+
 class Copain(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     nom: str = Field(index=True)
@@ -74,9 +100,12 @@ class CopainCreation(SQLModel):
     image: str
 
 
+# AUTOINCREMENT comme Reunion.
 class Partie(SQLModel, table=True):
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    reunion_id: int = Field(default=None, foreign_key="reunion.id")
+    reunion_id: int = Field(default=None, foreign_key="reunion.id", index=True)
     contrat_id: int = Field(default=None, foreign_key="contrat.id")
     preneur_id: int = Field(default=None, foreign_key="copain.id")
     appel_id: Optional[int] = Field(default=None, foreign_key="copain.id")
@@ -94,3 +123,234 @@ class PartieCreation(SQLModel):
     points: int
     chelem_realise: bool
     petit_au_bout: Optional[int]
+
+
+class ScoreReunion(SQLModel, table=True):
+    reunion_id: Optional[int] = Field(
+        default=None, foreign_key="reunion.id", primary_key=True
+    )
+    copain_id: Optional[int] = Field(
+        default=None, foreign_key="copain.id", primary_key=True
+    )
+    total: int = Field(default=0)
+    nombre_parties: int = Field(default=0)
+
+
+class ScoreCagnotte(SQLModel, table=True):
+    cagnotte_id: Optional[int] = Field(
+        default=None, foreign_key="cagnotte.id", primary_key=True
+    )
+    copain_id: Optional[int] = Field(
+        default=None, foreign_key="copain.id", primary_key=True
+    )
+    total: int = Field(default=0)
+    nombre_parties: int = Field(default=0)
+
+
+class DetteCopain(SQLModel, table=True):
+    copain_id: Optional[int] = Field(
+        default=None, foreign_key="copain.id", primary_key=True
+    )
+    total: int = Field(default=0)
+    reunions: List[dict] = Field(default=[], sa_column=Column(JSON, nullable=False))
+
+
+class Changement(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    origine: str
+    cle: str
+
+
+class CopainLecture(SQLModel):
+    id: int
+    nom: str
+    image: Optional[str]
+
+
+class CagnotteLecture(SQLModel):
+    id: int
+    nom: str
+    est_favori: bool
+
+
+class ContratLecture(SQLModel):
+    id: int
+    nom: str
+    initiale: str
+    points: int
+
+
+class ReunionLecture(SQLModel):
+    id: int
+    nom: str
+    cagnotte_id: int
+
+
+class PartieLecture(SQLModel):
+    id: int
+    reunion_id: int
+    contrat_id: int
+    preneur_id: int
+    appel_id: Optional[int]
+    est_fait: bool
+    points: int
+    chelem_realise: bool
+    petit_au_bout: Optional[int]
+
+
+class DetteLecture(SQLModel):
+    reunion_id: int
+    nom: str
+    dette: Optional[int]
+
+
+class DettesCopain(SQLModel):
+    copain_id: int
+    total: int
+    reunions: List[DetteLecture]
+
+
+class JoueurActif(SQLModel):
+    copain_id: int
+    copain_nom: str
+    copain_image: Optional[str]
+    est_guest: bool
+    dette: Optional[int]
+    dette_active: Optional[bool]
+    dettes: List[DetteLecture]
+
+
+class PartieActive(SQLModel):
+    rang: int
+    contrat_id: int
+    preneur_id: int
+    appel_id: Optional[int]
+    est_fait: bool
+    points: int
+    chelem_realise: bool
+    petit_au_bout: Optional[int]
+
+
+class ReunionActive(SQLModel):
+    reunion_id: int
+    reunion_nom: str
+    cagnotte_id: int
+    cagnotte_nom: str
+    nombre_joueurs: int
+    joueurs: List[JoueurActif]
+    nombre_parties: int
+    parties: List[PartieActive]
+
+
+class JoueursCompacts(SQLModel):
+    id: List[int]
+    nom: List[str]
+    image: List[Optional[str]]
+    invite: List[int]
+    dette: List[Optional[int]]
+    active: List[Optional[int]]
+    dettes: List[List[Optional[int]]]
+
+
+class PartiesCompactes(SQLModel):
+    contrat: List[int]
+    preneur: List[int]
+    appel: List[Optional[int]]
+    fait: List[int]
+    points: List[int]
+    chelem: List[int]
+    petit: List[Optional[int]]
+
+
+class ReunionActiveCompacte(SQLModel):
+    reunion_id: int
+    reunion_nom: str
+    cagnotte_id: int
+    cagnotte_nom: str
+    noms: Dict[str, str]
+    joueurs: JoueursCompacts
+    parties: PartiesCompactes
+
+
+class ScoreLecture(SQLModel):
+    copain_id: int
+    copain_nom: str
+    total: int
+    nombre_parties: int
+
+
+class PlaceClassement(SQLModel):
+    rang: int
+    copain_id: int
+    copain_nom: str
+    total: int
+    nombre_parties: int
+
+
+class StatistiqueContrat(SQLModel):
+    contrat_id: int
+    nombre_parties: int
+    taux_reussite: float
+
+
+class StatistiqueEquipe(SQLModel):
+    preneur_id: int
+    appel_id: int
+    nombre_parties: int
+    taux_reussite: float
+    points_moyens: float
+
+
+class StatistiquePreneur(SQLModel):
+    copain_id: int
+    nombre_prises: int
+    points_moyens: float
+    points_ecart_type: float
+    points_min: int
+    points_mediane: float
+    points_max: int
+
+
+class StatistiquePetitAuBout(SQLModel):
+    copain_id: int
+    nombre: int
+
+
+class StatistiquesCagnotte(SQLModel):
+    nombre_parties: int
+    taux_petit_au_bout: float
+    taux_chelem: float
+    contrats: List[StatistiqueContrat]
+    equipes: List[StatistiqueEquipe]
+    preneurs: List[StatistiquePreneur]
+    petits_au_bout: List[StatistiquePetitAuBout]
+
+
+class ProjectionCopain(SQLModel):
+    copain_id: int
+    copain_nom: str
+    total: int
+    total_projete: float
+    probabilite_premier: float
+    intervalle_bas: float
+    intervalle_haut: float
+
+
+class ConvergenceProjection(SQLModel):
+    simulations: int
+    demi_largeur_max: float
+
+
+class ProjectionsCagnotte(SQLModel):
+    simulations: int
+    reunions_restantes: int
+    parties_par_reunion: int
+    graine: int
+    lots: int
+    demi_largeur_max: float
+    convergence: List[ConvergenceProjection]
+    copains: List[ProjectionCopain]
+
+
+class Message(SQLModel):
+    message: str
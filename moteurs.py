@@ -0,0 +1,62 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel import create_engine
+
+from configuration import parametre
+
+
+def pragmas():
+    return {
+        "journal_mode": parametre("sqlite_journal_mode", "WAL"),
+        "synchronous": parametre("sqlite_synchronous", "NORMAL"),
+        "mmap_size": parametre("sqlite_mmap_size", 256 * 1024 * 1024),
+        "cache_size": parametre("sqlite_cache_size", -64 * 1024),
+        "busy_timeout": parametre("sqlite_busy_timeout", 5000),
+    }
+
+
+def appliquer_pragmas(connexion, _):
+    curseur = connexion.cursor()
+    for nom, valeur in pragmas().items():
+        curseur.execute(f"PRAGMA {nom} = {valeur}")
+    curseur.close()
+
+
+def options_pool(
+    url: str, classe, taille_pool: int = None, debordement_max: int = None
+):
+    if url.endswith(":memory:") or url.endswith("://"):
+        return {}
+    return {
+        "poolclass": classe,
+        "pool_size": taille_pool or parametre("sqlite_pool_size", 5),
+        "max_overflow": (
+            parametre("sqlite_max_overflow", 10)
+            if debordement_max is None
+            else debordement_max
+        ),
+        "pool_pre_ping": False,
+    }
+
+
+def creer_moteur(url: str, taille_pool: int = None, debordement_max: int = None):
+    engine = create_engine(
+        url,
+        echo=False,
+        connect_args={"check_same_thread": False},
+        **options_pool(url, QueuePool, taille_pool, debordement_max),
+    )
+    event.listen(engine, "connect", appliquer_pragmas)
+    return engine
+
+
+def creer_moteur_async(url: str, taille_pool: int = None, debordement_max: int = None):
+    engine = create_async_engine(
+        url,
+        echo=False,
+        connect_args={"check_same_thread": False},
+        **options_pool(url, AsyncAdaptedQueuePool, taille_pool, debordement_max),
+    )
+    event.listen(engine.sync_engine, "connect", appliquer_pragmas)
+    return engine
@@ -0,0 +1,157 @@
+import base64
+import binascii
+import json
+from typing import List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Boolean, Float, Integer, Numeric, tuple_
+from sqlmodel import Session
+
+from reponses import ReponseJSON, en_dict, ligne_ndjson
+
+LIMITE_MAX = 1000
+TAILLE_FLUX = 500
+ENTETE_SUIVANT = "X-Curseur-Suivant"
+TYPE_NDJSON = "application/x-ndjson"
+
+
+def encoder(valeurs: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valeurs).encode()).decode()
+
+
+# Types JSON admis pour chaque clé du curseur : un curseur forgé dont une
+# valeur n'a pas le type de sa colonne est refusé avant d'atteindre SQLite.
+def types_cle(cle) -> tuple:
+    colonne = cle.expression
+    if isinstance(colonne.type, Boolean):
+        types = (bool,)
+    elif isinstance(colonne.type, Integer):
+        types = (int,)
+    elif isinstance(colonne.type, (Float, Numeric)):
+        types = (int, float)
+    else:
+        types = (str,)
+    nullable = colonne.nullable and not colonne.primary_key
+    return types + (type(None),) if nullable else types
+
+
+def decoder(curseur: str, cles: List) -> list:
+    try:
+        valeurs = json.loads(base64.urlsafe_b64decode(curseur.encode()))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    if not isinstance(valeurs, list) or len(valeurs) != len(cles):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    if any(type(v) not in types_cle(cle) for v, cle in zip(valeurs, cles)):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    return valeurs
+
+
+def ordonner(requete, cles: List, apres: Optional[str], descendant: bool):
+    if apres:
+        valeurs = decoder(apres, cles)
+        if descendant:
+            requete = requete.where(tuple_(*cles) < tuple_(*valeurs))
+        else:
+            requete = requete.where(tuple_(*cles) > tuple_(*valeurs))
+    return requete.order_by(*(cle.desc() if descendant else cle for cle in cles))
+
+
+def verifier_limite(limite: Optional[int]):
+    if limite is not None and not 1 <= limite <= LIMITE_MAX:
+        raise HTTPException(
+            status_code=422, detail=f"limit doit être entre 1 et {LIMITE_MAX}"
+        )
+
+
+def lire_page(session: Session, requete, cles: List, limite: Optional[int]):
+    if limite is None:
+        return session.exec(requete).all(), None
+    lignes = session.exec(requete.limit(limite + 1)).all()
+    if len(lignes) <= limite:
+        return lignes, None
+    lignes = lignes[:limite]
+    return lignes, encoder([getattr(lignes[-1], cle.key) for cle in cles])
+
+
+def sonder_suivant(session: Session, requete, cles: List, limite: Optional[int]):
+    if limite is None:
+        return None
+    bornes = session.execute(
+        requete.with_only_columns(*cles).offset(limite - 1).limit(2)
+    ).all()
+    return encoder(list(bornes[0])) if len(bornes) == 2 else None
+
+
+def reponse_page(lignes, suivant: Optional[str]):
+    entetes = {ENTETE_SUIVANT: suivant} if suivant else {}
+    return ReponseJSON([en_dict(ligne) for ligne in lignes], headers=entetes)
+
+
+def lister(
+    engine,
+    requete,
+    cles: List,
+    apres: Optional[str],
+    limite: Optional[int],
+    format: str,
+    descendant: bool = False,
+):
+    verifier_limite(limite)
+    requete = ordonner(requete, cles, apres, descendant)
+    if format == "ndjson":
+        with Session(engine) as session:
+            suivant = sonder_suivant(session, requete, cles, limite)
+        if limite is not None:
+            requete = requete.limit(limite)
+        entetes = {ENTETE_SUIVANT: suivant} if suivant else {}
+        return StreamingResponse(
+            diffuser_ndjson(engine, requete), media_type=TYPE_NDJSON, headers=entetes
+        )
+    with Session(engine) as session:
+        lignes, suivant = lire_page(session, requete, cles, limite)
+    return reponse_page(lignes, suivant)
+
+
+# Même contrat que lister pour des lignes déjà en mémoire (archives froides) :
+# mêmes curseurs, mêmes en-têtes, mêmes formats.
+def lister_lignes(
+    lignes: List[dict],
+    cles: List,
+    apres: Optional[str],
+    limite: Optional[int],
+    format: str,
+    descendant: bool = False,
+):
+    verifier_limite(limite)
+
+    def valeurs(ligne):
+        return [ligne[cle.key] for cle in cles]
+
+    lignes = sorted(lignes, key=valeurs, reverse=descendant)
+    if apres:
+        borne = decoder(apres, cles)
+        lignes = [
+            ligne
+            for ligne in lignes
+            if (valeurs(ligne) < borne if descendant else valeurs(ligne) > borne)
+        ]
+    suivant = None
+    if limite is not None and len(lignes) > limite:
+        lignes = lignes[:limite]
+        suivant = encoder(valeurs(lignes[-1]))
+    entetes = {ENTETE_SUIVANT: suivant} if suivant else {}
+    if format == "ndjson":
+        return StreamingResponse(
+            (ligne_ndjson(ligne) for ligne in lignes),
+            media_type=TYPE_NDJSON,
+            headers=entetes,
+        )
+    return ReponseJSON(lignes, headers=entetes)
+
+
+def diffuser_ndjson(engine, requete):
+    with Session(engine) as session:
+        for ligne in session.exec(requete.execution_options(yield_per=TAILLE_FLUX)):
+            yield ligne_ndjson(en_dict(ligne))
@@ -0,0 +1,262 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+
+from models import Contrat, Copain, Joueur, Reunion, ScoreCagnotte
+from scores import PRIME_CHELEM
+from statistiques import lire_parties
+
+# Parties fictives ajoutées aux taux de chaque preneur, tirées vers ceux de
+# toute la cagnotte : un copain qui n'a pris que deux fois ne garde pas un
+# taux de 0 ou de 1.
+LISSAGE = 5
+Z_95 = 1.959963984540054
+
+
+def lire_modele(connection: Connection, cagnotte_id: int):
+    presences = connection.execute(
+        select(Joueur.copain_id, Copain.nom, func.count())
+        .join(Reunion, Reunion.id == Joueur.reunion_id)
+        .join(Copain, Copain.id == Joueur.copain_id)
+        .where(Reunion.cagnotte_id == cagnotte_id)
+        .group_by(Joueur.copain_id, Copain.nom)
+        .order_by(Joueur.copain_id)
+    ).all()
+    reunions = connection.execute(
+        select(func.count(func.distinct(Joueur.reunion_id)))
+        .select_from(Joueur)
+        .join(Reunion, Reunion.id == Joueur.reunion_id)
+        .where(Reunion.cagnotte_id == cagnotte_id)
+    ).scalar()
+    parties = lire_parties(connection, cagnotte_id)
+    if not presences or not len(parties["contrat_id"]):
+        return None
+    ids = np.array([ligne[0] for ligne in presences], dtype=np.int64)
+    scores = dict(
+        (copain_id, (total, nombre))
+        for copain_id, total, nombre in connection.execute(
+            select(
+                ScoreCagnotte.copain_id,
+                ScoreCagnotte.total,
+                ScoreCagnotte.nombre_parties,
+            ).where(ScoreCagnotte.cagnotte_id == cagnotte_id)
+        )
+    )
+    totaux = np.array([scores.get(i, (0, 0))[0] for i in ids.tolist()], np.int64)
+    jouees = np.array([scores.get(i, (0, 0))[1] for i in ids.tolist()], np.float64)
+
+    # Seuls les contrats déjà joués dans la cagnotte peuvent être tirés.
+    valeurs = dict(connection.execute(select(Contrat.id, Contrat.points)).all())
+    connus = np.isin(parties["preneur_id"], ids) & np.isin(
+        parties["contrat_id"], list(valeurs)
+    )
+    parties = {nom: colonne[connus] for nom, colonne in parties.items()}
+    contrats, contrat = np.unique(parties["contrat_id"], return_inverse=True)
+    preneur = np.searchsorted(ids, parties["preneur_id"])
+    if not len(contrats):
+        return None
+
+    prises = np.zeros((len(ids), len(contrats)))
+    np.add.at(prises, (preneur, contrat), 1)
+    reussies = np.zeros_like(prises)
+    np.add.at(reussies, (preneur, contrat), parties["est_fait"])
+    comptes = prises.sum(axis=0)
+    frequences = comptes / comptes.sum()
+    taux_reussite = reussies.sum(axis=0) / comptes
+    par_preneur = prises.sum(axis=1)
+    table = sum(ligne[2] for ligne in presences) / reunions
+    ordre = np.argsort(contrat, kind="stable")
+    avec_appel = (parties["appel_id"] != 0) & (
+        parties["appel_id"] != parties["preneur_id"]
+    )
+    return {
+        "ids": ids,
+        "noms": [ligne[1] for ligne in presences],
+        "totaux": totaux,
+        "presence": np.array([ligne[2] for ligne in presences]) / reunions,
+        "parties_par_reunion": max(round(len(contrat) / reunions), 1),
+        "taux_prise": (par_preneur + LISSAGE / table) / (jouees + LISSAGE),
+        "contrats_cumules": np.cumsum(
+            (prises + LISSAGE * frequences) / (par_preneur + LISSAGE)[:, None],
+            axis=1,
+        ),
+        "reussite": (reussies + LISSAGE * taux_reussite) / (prises + LISSAGE),
+        "valeur_contrat": np.array([valeurs[c] for c in contrats.tolist()]),
+        "taux_chelem": np.bincount(contrat, weights=parties["chelem_realise"])
+        / comptes,
+        "taux_appel": float(avec_appel.mean()),
+        "points": parties["points"][ordre],
+        "debuts": (np.cumsum(comptes) - comptes).astype(np.int64),
+        "comptes": comptes,
+    }
+
+
+# Une tranche de simulations, jouée dans un processus du pool. Chaque soirée
+# tire les présents, puis pour chacune de ses parties le preneur (parmi les
+# présents, selon son goût pour la prise), l'appelé, le contrat, la réussite
+# et les points (rééchantillonnés parmi ceux déjà marqués sur ce contrat).
+def simuler_lot(modele: dict, graine, nombre: int, reunions: int):
+    hasard = np.random.default_rng(graine)
+    copains = len(modele["ids"])
+    parties = modele["parties_par_reunion"]
+    dernier_contrat = len(modele["valeur_contrat"]) - 1
+    lignes = np.arange(nombre)[:, None] * copains
+    totaux = np.tile(modele["totaux"].astype(np.float64), (nombre, 1))
+    for _ in range(reunions):
+        presents = hasard.random((nombre, copains)) < modele["presence"]
+        table = presents.sum(axis=1)[:, None]
+        rangs = np.cumsum(presents, axis=1)
+
+        cumul = np.cumsum(presents * modele["taux_prise"], axis=1)
+        tirage = hasard.random((nombre, parties)) * cumul[:, -1:]
+        preneur = (tirage[..., None] >= cumul[:, None, :]).sum(axis=2)
+        preneur = np.minimum(preneur, copains - 1)
+
+        # On n'appelle un partenaire qu'à cinq ou plus, comme à la vraie table.
+        avec_appel = (hasard.random((nombre, parties)) < modele["taux_appel"]) & (
+            table >= 5
+        )
+        rang = (hasard.random((nombre, parties)) * (table - 1)).astype(np.int64)
+        rang += rang >= np.take_along_axis(rangs, preneur, axis=1) - 1
+        appel = (rangs[:, None, :] <= rang[..., None]).sum(axis=2)
+        appel = np.minimum(appel, copains - 1)
+
+        contrat = (
+            hasard.random((nombre, parties))[..., None]
+            >= modele["contrats_cumules"][preneur]
+        ).sum(axis=2)
+        contrat = np.minimum(contrat, dernier_contrat)
+        fait = hasard.random((nombre, parties)) < modele["reussite"][preneur, contrat]
+        points = modele["points"][
+            modele["debuts"][contrat]
+            + (hasard.random((nombre, parties)) * modele["comptes"][contrat]).astype(
+                np.int64
+            )
+        ]
+        chelem = fait & (
+            hasard.random((nombre, parties)) < modele["taux_chelem"][contrat]
+        )
+        valeur = modele["valeur_contrat"][contrat] + points + PRIME_CHELEM * chelem
+        valeur = np.where(fait, valeur, -valeur) * (table >= 3)
+
+        # Chaque présent paie la valeur, puis preneur et appelé reprennent la
+        # leur et encaissent leur part, comme dans scores.repartition.
+        defense = table - 1 - avec_appel
+        totaux -= valeur.sum(axis=1)[:, None] * presents
+        totaux += np.bincount(
+            (lignes + preneur).ravel(),
+            weights=((defense - avec_appel + 1) * valeur).ravel(),
+            minlength=nombre * copains,
+        ).reshape(nombre, copains)
+        totaux += np.bincount(
+            (lignes + appel).ravel(),
+            weights=(2 * valeur * avec_appel).ravel(),
+            minlength=nombre * copains,
+        ).reshape(nombre, copains)
+    premiers = np.bincount(totaux.argmax(axis=1), minlength=copains)
+    return premiers, totaux.sum(axis=0)
+
+
+def intervalle(premiers: np.ndarray, simulations: int):
+    # Intervalle de Wilson à 95 %, juste même pour les probabilités proches
+    # de 0 ou de 1.
+    p = premiers / simulations
+    z2 = Z_95**2 / simulations
+    centre = (p + z2 / 2) / (1 + z2)
+    demi = Z_95 * np.sqrt(p * (1 - p) / simulations + z2 / simulations / 4)
+    return centre - demi / (1 + z2), centre + demi / (1 + z2)
+
+
+def resumer_lots(modele: dict, lots: list, reunions: int, graine: int):
+    premiers = np.zeros(len(modele["ids"]), dtype=np.int64)
+    sommes = np.zeros(len(modele["ids"]))
+    simulations = 0
+    convergence = []
+    for (premiers_lot, sommes_lot), nombre in lots:
+        premiers += premiers_lot
+        sommes += sommes_lot
+        simulations += nombre
+        bas, haut = intervalle(premiers, simulations)
+        convergence.append(
+            {
+                "simulations": simulations,
+                "demi_largeur_max": float((haut - bas).max() / 2),
+            }
+        )
+    bas, haut = intervalle(premiers, simulations)
+    copains = [
+        {
+            "copain_id": copain_id,
+            "copain_nom": nom,
+            "total": total,
+            "total_projete": somme / simulations,
+            "probabilite_premier": nombre / simulations,
+            "intervalle_bas": max(b, 0.0),
+            "intervalle_haut": min(h, 1.0),
+        }
+        for copain_id, nom, total, somme, nombre, b, h in zip(
+            modele["ids"].tolist(),
+            modele["noms"],
+            modele["totaux"].tolist(),
+            sommes.tolist(),
+            premiers.tolist(),
+            bas.tolist(),
+            haut.tolist(),
+        )
+    ]
+    copains.sort(key=lambda c: (-c["probabilite_premier"], -c["total_projete"]))
+    return {
+        "simulations": simulations,
+        "reunions_restantes": reunions,
+        "parties_par_reunion": modele["parties_par_reunion"],
+        "graine": graine,
+        "lots": len(lots),
+        "demi_largeur_max": convergence[-1]["demi_largeur_max"],
+        "convergence": convergence,
+        "copains": copains,
+    }
+
+
+# Répartit les simulations en lots de taille fixe sur un pool de processus,
+# hors de la boucle d'événements et du pool de fils des requêtes. Chaque lot
+# reçoit une graine dérivée de la graine demandée et de son rang : le
+# résultat ne dépend pas du nombre de processus.
+class Simulateur:
+    def __init__(self, processus=None, taille_lot: int = 4096):
+        self.processus = processus
+        self.taille_lot = taille_lot
+        self._pool = None
+
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.processus, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def arreter(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def projeter(self, modele: dict, reunions: int, simulations: int, graine):
+        tailles = [self.taille_lot] * (simulations // self.taille_lot)
+        if simulations % self.taille_lot:
+            tailles.append(simulations % self.taille_lot)
+        graines = np.random.SeedSequence(graine).spawn(len(tailles))
+        boucle = asyncio.get_running_loop()
+        simulation = {cle: valeur for cle, valeur in modele.items() if cle != "noms"}
+        resultats = await asyncio.gather(
+            *(
+                boucle.run_in_executor(
+                    self.pool(), simuler_lot, simulation, sous_graine, nombre, reunions
+                )
+                for sous_graine, nombre in zip(graines, tailles)
+            )
+        )
+        return resumer_lots(modele, list(zip(resultats, tailles)), reunions, graine)
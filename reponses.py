@@ -0,0 +1,82 @@
+import json
+
+from fastapi.responses import JSONResponse
+from sqlmodel import select
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as ReponseJSON
+except ImportError:
+    orjson = None
+    ReponseJSON = JSONResponse
+
+
+def projection(modele, schema):
+    return select(*(getattr(modele, champ) for champ in schema.__fields__))
+
+
+def en_dict(ligne) -> dict:
+    if hasattr(ligne, "_asdict"):
+        return ligne._asdict()
+    return ligne.dict()
+
+
+# Clés courtes de la vue compacte : une liste par colonne, dans l'ordre des
+# joueurs ou des parties (le rang d'une partie est son indice + 1).
+COLONNES_JOUEURS = (
+    ("id", "copain_id"),
+    ("nom", "copain_nom"),
+    ("image", "copain_image"),
+    ("invite", "est_guest"),
+    ("dette", "dette"),
+    ("active", "dette_active"),
+)
+COLONNES_PARTIES = (
+    ("contrat", "contrat_id"),
+    ("preneur", "preneur_id"),
+    ("appel", "appel_id"),
+    ("fait", "est_fait"),
+    ("points", "points"),
+    ("chelem", "chelem_realise"),
+    ("petit", "petit_au_bout"),
+)
+
+
+def entier(valeur):
+    return int(valeur) if isinstance(valeur, bool) else valeur
+
+
+def colonnes(lignes: list, correspondances) -> dict:
+    return {
+        cle: [entier(ligne[champ]) for ligne in lignes]
+        for cle, champ in correspondances
+    }
+
+
+def compacter_reunion_active(payload: dict) -> dict:
+    noms = {}
+    dettes = []
+    for joueur in payload["joueurs"]:
+        paires = []
+        for dette in joueur["dettes"]:
+            noms[str(dette["reunion_id"])] = dette["nom"]
+            paires += [dette["reunion_id"], dette["dette"]]
+        dettes.append(paires)
+    return {
+        "reunion_id": payload["reunion_id"],
+        "reunion_nom": payload["reunion_nom"],
+        "cagnotte_id": payload["cagnotte_id"],
+        "cagnotte_nom": payload["cagnotte_nom"],
+        "noms": noms,
+        "joueurs": {
+            **colonnes(payload["joueurs"], COLONNES_JOUEURS),
+            "dettes": dettes,
+        },
+        "parties": colonnes(payload["parties"], COLONNES_PARTIES),
+    }
+
+
+def ligne_ndjson(donnees: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(donnees) + b"\n"
+    return (json.dumps(donnees) + "\n").encode()
@@ -0,0 +1,172 @@
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from models import Contrat, Joueur, Partie, Reunion, ScoreCagnotte, ScoreReunion
+
+# Valeur d'une partie pour l'attaque : points du contrat + points faits, plus
+# la prime de chelem, négative si le contrat chute. La prime du petit au bout
+# va au camp qui l'a mené. Chaque défenseur paie la valeur, le preneur encaisse
+# le reste (l'appelé encaisse une part comme un défenseur inversé).
+PRIME_CHELEM = 200
+PRIME_PETIT_AU_BOUT = 10
+
+
+def repartition(partie: Partie, contrat: Contrat, joueurs: List[int]) -> Dict[int, int]:
+    attaque = {partie.preneur_id}
+    if partie.appel_id is not None:
+        attaque.add(partie.appel_id)
+    defense = [copain_id for copain_id in joueurs if copain_id not in attaque]
+
+    valeur = contrat.points + partie.points
+    if partie.chelem_realise:
+        valeur += PRIME_CHELEM
+    if not partie.est_fait:
+        valeur = -valeur
+    if partie.petit_au_bout is not None:
+        if partie.petit_au_bout in attaque:
+            valeur += PRIME_PETIT_AU_BOUT
+        else:
+            valeur -= PRIME_PETIT_AU_BOUT
+
+    gains = {copain_id: -valeur for copain_id in defense}
+    if len(attaque) == 2:
+        gains[partie.appel_id] = valeur
+        gains[partie.preneur_id] = (len(defense) - 1) * valeur
+    else:
+        gains[partie.preneur_id] = len(defense) * valeur
+    return gains
+
+
+# Cumul d'un score par upsert : une instruction par table quel que soit le
+# nombre de joueurs, pour une partie comme pour un lot importé.
+cumul_score = (
+    "INSERT INTO {table} ({colonne}, copain_id, total, nombre_parties)"
+    " VALUES (?, ?, ?, ?) ON CONFLICT ({colonne}, copain_id) DO UPDATE SET"
+    " total = total + excluded.total,"
+    " nombre_parties = nombre_parties + excluded.nombre_parties"
+)
+
+
+def enregistrer_partie(session: Session, partie: Partie, reunion: Reunion):
+    contrat = session.get(Contrat, partie.contrat_id)
+    joueurs = session.exec(
+        select(Joueur.copain_id).where(Joueur.reunion_id == reunion.id)
+    ).all()
+    gains = repartition(partie, contrat, joueurs)
+    if gains:
+        connection = session.connection()
+        for table, colonne, cle in (
+            ("scorereunion", "reunion_id", reunion.id),
+            ("scorecagnotte", "cagnotte_id", reunion.cagnotte_id),
+        ):
+            connection.exec_driver_sql(
+                cumul_score.format(table=table, colonne=colonne),
+                [(cle, copain_id, gain, 1) for copain_id, gain in gains.items()],
+            )
+    return gains
+
+
+# Les parties des archives froides comptent dans le total de leur cagnotte,
+# resté en base ; leurs ScoreReunion sont dans l'archive et n'y sont pas
+# recalculés.
+def calculer(session: Session, archives: Iterable = ()):
+    contrats = {contrat.id: contrat for contrat in session.exec(select(Contrat))}
+    cagnottes = dict(session.exec(select(Reunion.id, Reunion.cagnotte_id)).all())
+    joueurs = defaultdict(list)
+    for reunion_id, copain_id, partie_arrivee in session.exec(
+        select(Joueur.reunion_id, Joueur.copain_id, Joueur.partie_arrivee)
+    ):
+        joueurs[reunion_id].append((copain_id, partie_arrivee))
+    parties = session.exec(select(Partie).order_by(Partie.id)).all()
+
+    froides = set()
+    for archive in archives:
+        for reunion_id in archive.colonne(Reunion.__tablename__, "id").tolist():
+            cagnottes[reunion_id] = archive.cagnotte_id
+            froides.add(reunion_id)
+        for ligne in archive.lignes(
+            Joueur.__tablename__, archive.champs(Joueur.__table__)
+        ):
+            joueurs[ligne["reunion_id"]].append(
+                (ligne["copain_id"], ligne.get("partie_arrivee", 0))
+            )
+        parties.extend(
+            Partie(**ligne)
+            for ligne in archive.lignes(
+                Partie.__tablename__, archive.champs(Partie.__table__)
+            )
+        )
+
+    par_reunion = defaultdict(lambda: [0, 0])
+    par_cagnotte = defaultdict(lambda: [0, 0])
+    for partie in parties:
+        presents = [
+            copain_id
+            for copain_id, partie_arrivee in joueurs[partie.reunion_id]
+            if partie_arrivee < partie.id
+        ]
+        gains = repartition(partie, contrats[partie.contrat_id], presents)
+        for copain_id, gain in gains.items():
+            cumuls = [par_cagnotte[(cagnottes[partie.reunion_id], copain_id)]]
+            if partie.reunion_id not in froides:
+                cumuls.append(par_reunion[(partie.reunion_id, copain_id)])
+            for cumul in cumuls:
+                cumul[0] += gain
+                cumul[1] += 1
+    return par_reunion, par_cagnotte
+
+
+def reconstruire(session: Session, archives: Iterable = ()):
+    par_reunion, par_cagnotte = calculer(session, archives)
+    session.execute(delete(ScoreReunion))
+    session.execute(delete(ScoreCagnotte))
+    session.add_all(
+        ScoreReunion(reunion_id=r, copain_id=c, total=t, nombre_parties=n)
+        for (r, c), (t, n) in par_reunion.items()
+    )
+    session.add_all(
+        ScoreCagnotte(cagnotte_id=g, copain_id=c, total=t, nombre_parties=n)
+        for (g, c), (t, n) in par_cagnotte.items()
+    )
+
+
+def verifier(session: Session, archives: Iterable = ()):
+    attendus = calculer(session, archives)
+    enregistres = (
+        {
+            (s.reunion_id, s.copain_id): [s.total, s.nombre_parties]
+            for s in session.exec(select(ScoreReunion))
+        },
+        {
+            (s.cagnotte_id, s.copain_id): [s.total, s.nombre_parties]
+            for s in session.exec(select(ScoreCagnotte))
+        },
+    )
+    ecarts = []
+    for nom, attendu, enregistre in zip(("reunion", "cagnotte"), attendus, enregistres):
+        for cle in set(attendu) | set(enregistre):
+            if attendu.get(cle, [0, 0]) != enregistre.get(cle, [0, 0]):
+                ecarts.append((nom, cle, attendu.get(cle), enregistre.get(cle)))
+    return ecarts
+
+
+if __name__ == "__main__":
+    from amorcage import creer_schema
+    from main import archives, engine
+
+    creer_schema(engine)
+    archives.charger()
+    commande = sys.argv[1] if len(sys.argv) > 1 else "verifier"
+    with Session(engine) as session:
+        if commande == "reconstruire":
+            reconstruire(session, archives.toutes())
+            session.commit()
+        ecarts = verifier(session, archives.toutes())
+    for ecart in ecarts:
+        print(*ecart)
+    print(f"{len(ecarts)} écart(s)")
+    sys.exit(1 if ecarts else 0)
@@ -0,0 +1,146 @@
+from itertools import chain
+
+import numpy as np
+from sqlalchemy.engine import Connection
+
+colonnes = (
+    "contrat_id",
+    "preneur_id",
+    "appel_id",
+    "est_fait",
+    "points",
+    "chelem_realise",
+    "petit_au_bout",
+)
+
+
+def lire_parties(connection: Connection, cagnotte_id: int):
+    curseur = connection.connection.cursor()
+    try:
+        curseur.execute(
+            "SELECT p.contrat_id, p.preneur_id, coalesce(p.appel_id, 0), p.est_fait,"
+            " p.points, p.chelem_realise, coalesce(p.petit_au_bout, 0)"
+            " FROM partie p JOIN reunion r ON r.id = p.reunion_id"
+            " WHERE r.cagnotte_id = ?",
+            (cagnotte_id,),
+        )
+        donnees = np.fromiter(chain.from_iterable(curseur), dtype=np.int64)
+    finally:
+        curseur.close()
+    donnees = donnees.reshape(-1, len(colonnes))
+    parties = {nom: donnees[:, i] for i, nom in enumerate(colonnes)}
+    for nom in ("est_fait", "chelem_realise"):
+        parties[nom] = parties[nom].astype(bool)
+    return parties
+
+
+def _par_contrat(parties):
+    contrat = parties["contrat_id"]
+    nombre = np.bincount(contrat)
+    reussies = np.bincount(contrat, weights=parties["est_fait"])
+    ids = np.flatnonzero(nombre)
+    return [
+        {
+            "contrat_id": contrat_id,
+            "nombre_parties": n,
+            "taux_reussite": r / n,
+        }
+        for contrat_id, n, r in zip(
+            ids.tolist(), nombre[ids].tolist(), reussies[ids].tolist()
+        )
+    ]
+
+
+def _par_equipe(parties):
+    preneur, appel = parties["preneur_id"], parties["appel_id"]
+    avec_appel = (appel != 0) & (appel != preneur)
+    if not avec_appel.any():
+        return []
+    base = appel.max() + 1
+    equipes = preneur[avec_appel] * base + appel[avec_appel]
+    cles, groupe, nombre = np.unique(equipes, return_inverse=True, return_counts=True)
+    paires = zip((cles // base).tolist(), (cles % base).tolist())
+    reussies = np.bincount(groupe, weights=parties["est_fait"][avec_appel])
+    points = np.bincount(groupe, weights=parties["points"][avec_appel])
+    return [
+        {
+            "preneur_id": p,
+            "appel_id": a,
+            "nombre_parties": n,
+            "taux_reussite": r / n,
+            "points_moyens": s / n,
+        }
+        for (p, a), n, r, s in zip(
+            paires, nombre.tolist(), reussies.tolist(), points.tolist()
+        )
+    ]
+
+
+def _par_preneur(parties):
+    preneur, points = parties["preneur_id"], parties["points"]
+    ordre = np.lexsort((points, preneur))
+    preneur, points = preneur[ordre], points[ordre]
+    ids, debuts, nombre = np.unique(preneur, return_index=True, return_counts=True)
+    somme = np.add.reduceat(points, debuts)
+    carres = np.add.reduceat(points.astype(np.float64) ** 2, debuts)
+    moyenne = somme / nombre
+    ecart_type = np.sqrt(np.maximum(carres / nombre - moyenne**2, 0))
+    milieu_bas = debuts + (nombre - 1) // 2
+    milieu_haut = debuts + nombre // 2
+    mediane = (points[milieu_bas] + points[milieu_haut]) / 2
+    return [
+        {
+            "copain_id": copain_id,
+            "nombre_prises": n,
+            "points_moyens": m,
+            "points_ecart_type": e,
+            "points_min": mini,
+            "points_mediane": med,
+            "points_max": maxi,
+        }
+        for copain_id, n, m, e, mini, med, maxi in zip(
+            ids.tolist(),
+            nombre.tolist(),
+            moyenne.tolist(),
+            ecart_type.tolist(),
+            points[debuts].tolist(),
+            mediane.tolist(),
+            points[debuts + nombre - 1].tolist(),
+        )
+    ]
+
+
+def _petits_au_bout(parties):
+    petits = np.bincount(parties["petit_au_bout"])
+    ids = np.flatnonzero(petits[1:]) + 1
+    return [
+        {"copain_id": copain_id, "nombre": n}
+        for copain_id, n in zip(ids.tolist(), petits[ids].tolist())
+    ]
+
+
+def statistiques(connection: Connection, cagnotte_id: int):
+    return resumer(lire_parties(connection, cagnotte_id))
+
+
+def resumer(parties):
+    nombre_parties = len(parties["contrat_id"])
+    if not nombre_parties:
+        return {
+            "nombre_parties": 0,
+            "taux_petit_au_bout": 0.0,
+            "taux_chelem": 0.0,
+            "contrats": [],
+            "equipes": [],
+            "preneurs": [],
+            "petits_au_bout": [],
+        }
+    return {
+        "nombre_parties": nombre_parties,
+        "taux_petit_au_bout": float((parties["petit_au_bout"] != 0).mean()),
+        "taux_chelem": float(parties["chelem_realise"].mean()),
+        "contrats": _par_contrat(parties),
+        "equipes": _par_equipe(parties),
+        "preneurs": _par_preneur(parties),
+        "petits_au_bout": _petits_au_bout(parties),
+    }
@@ -0,0 +1,71 @@
+from collections import defaultdict
+from threading import Lock
+from uuid import uuid4
+
+from starlette.routing import Match
+
+
+class Versions:
+    def __init__(self):
+        self.generation = uuid4().hex[:8]
+        self._compteurs = defaultdict(int)
+        self._verrou = Lock()
+        self.ecouteurs = []
+
+    # Une écriture note ses clés dans sa propre transaction (session ou
+    # connexion) : les écouteurs y ajoutent leur trace, validée ou annulée
+    # avec elle. incrementer, après la validation et les invalidations
+    # locales, ne touche que les compteurs de ce processus.
+    def journaliser(self, transaction, *cle):
+        cle = tuple(str(partie) for partie in cle)
+        for ecouteur in self.ecouteurs:
+            ecouteur(transaction, cle)
+
+    def incrementer(self, *cle):
+        self.appliquer(tuple(str(partie) for partie in cle))
+
+    def appliquer(self, cle: tuple):
+        with self._verrou:
+            for longueur in range(1, len(cle) + 1):
+                self._compteurs[cle[:longueur]] += 1
+
+    def renouveler(self):
+        with self._verrou:
+            self.generation = uuid4().hex[:8]
+            self._compteurs.clear()
+
+    def etag(self, cles) -> str:
+        with self._verrou:
+            valeurs = [str(self._compteurs[cle]) for cle in cles]
+        return f'"{self.generation}-{"-".join(valeurs)}"'
+
+    def suivre(self, *modeles):
+        def decorateur(fonction):
+            fonction.versions = modeles
+            return fonction
+
+        return decorateur
+
+    def etag_requete(self, app, scope):
+        for route in app.router.routes:
+            correspondance, portee = route.matches(scope)
+            if correspondance == Match.FULL:
+                modeles = getattr(route.endpoint, "versions", None)
+                if modeles is None:
+                    return None
+                parametres = portee.get("path_params", {})
+                return self.etag(
+                    tuple(str(partie).format(**parametres) for partie in modele)
+                    for modele in modeles
+                )
+        return None
+
+
+def faible(etiquette: str) -> str:
+    etiquette = etiquette.strip()
+    return etiquette[2:] if etiquette.startswith("W/") else etiquette
+
+
+def correspond(etag: str, if_none_match: str) -> bool:
+    etiquettes = [faible(etiquette) for etiquette in if_none_match.split(",")]
+    return "*" in etiquettes or faible(etag) in etiquettes